@@ -72,7 +72,7 @@ if not exist model\ai_tutor_model.pkl (
         )
     ) else (
         echo Creating enhanced large AI Tutor model...
-        python download_large_dataset.py
+        python build_model.py
         if !errorlevel! neq 0 (
             echo Failed to create enhanced large model.
             pause
@@ -89,15 +89,8 @@ if not exist model\ai_tutor_model.pkl (
     set /p enhance_choice="Recreate all subject datasets? (Y/N) [default: N]: "
     
     if /i "!enhance_choice!"=="Y" (
-        echo Enhancing all subject datasets...
-        echo Creating enhanced math dataset...
-        python create_math_dataset.py
-        echo Creating enhanced science dataset...
-        python create_science_dataset.py
-        echo Creating enhanced history dataset...
-        python create_history_dataset.py
-        echo Creating enhanced programming dataset...
-        python create_programming_dataset.py
+        echo Enhancing all subject datasets in parallel...
+        python build_model.py --skip-download
         echo All subject datasets have been enhanced.
     )
 )
@@ -1,10 +1,17 @@
 import os
 import pickle
 import random
-import re
 import logging
 from datetime import datetime
 from collections import defaultdict
+from text_normalizer import clean_text, content_words, word_set
+from exact_index import ExactMatchIndex, exact_match_stats
+from keyword_index import KeywordIndex
+from token_postings import TokenSetIndex
+from entity_index import BIOGRAPHICAL, DEFINITIONAL, EntityIndex
+from answer_graph import load_answer_graph
+from qa_store import qa_dictionaries
+from repetition_tracker import ANONYMOUS_USER, RepetitionTracker
 
 # Set up logging
 logging.basicConfig(
@@ -19,9 +26,10 @@ class AITutor:
     def __init__(self, model_path='model/ai_tutor_model.pkl'):
         self.model_path = model_path
         self.data = self.load_model()
+        self._prepare_lookups()
         self.chat_history = {}
         self.current_context = {}
-        self.recent_responses = {}  # Track recent responses to avoid repetition
+        self.recent_responses = RepetitionTracker()  # Track each user's recent responses to avoid repetition
         logger.info("AI Tutor initialized")
         
     def load_model(self):
@@ -29,7 +37,12 @@ class AITutor:
         try:
             if os.path.exists(self.model_path):
                 with open(self.model_path, 'rb') as f:
-                    data = pickle.load(f)
+                    model_data = pickle.load(f)
+                # The lookups need subject -> {question: answer}, which the dataset scripts' vectorizer tuples are converted to
+                data = qa_dictionaries(model_data)
+                if data is None:
+                    logger.warning(f"Model at {self.model_path} is a {type(model_data).__name__}, not a subject dictionary or saved model. Using default data.")
+                    return self._create_default_data()
                 logger.info(f"Model loaded successfully from {self.model_path}")
                 logger.info(f"Model data contains {len(data)} entries")
                 return data
@@ -41,6 +54,46 @@ class AITutor:
             logger.error(f"Error loading model: {str(e)}")
             return self._create_default_data()
     
+    def _prepare_lookups(self):
+        """Precompute the subject key map and stored question word sets once per load"""
+        # Lowercase subject name -> actual key, first key wins like the old per-query scan
+        self.subject_keys = {}
+        for key in self.data.keys():
+            self.subject_keys.setdefault(key.lower(), key)
+        
+        # Word sets of every stored question for the overlap scores
+        self.question_words = {subject: {q: frozenset(q.split()) for q in qa_pairs} for subject, qa_pairs in self.data.items()}
+        
+        # The same word sets as integer id arrays with postings, so fuzzy matching only scores questions sharing words
+        self.question_token_sets = {subject: TokenSetIndex(qa_pairs) for subject, qa_pairs in self.data.items()}
+        
+        # Hash lookup of every stored question, exact and punctuation/whitespace-insensitive
+        self.question_keys = {subject: list(qa_pairs) for subject, qa_pairs in self.data.items()}
+        self.exact_indexes = {subject: ExactMatchIndex(questions) for subject, questions in self.question_keys.items()}
+        
+        # Token postings over questions and answers for keyword-based generation
+        self.keyword_indexes = {subject: KeywordIndex(qa_pairs.items()) for subject, qa_pairs in self.data.items()}
+        
+        # People and concepts named by the stored questions and answers, for "who is" and "what is" questions
+        self.entity_index = EntityIndex(self.data)
+        
+        # Near-duplicate answers of every answer for repetition avoidance, built offline by answer_graph.py (None until then)
+        self.subject_answers = {subject: list(qa_pairs.values()) for subject, qa_pairs in self.data.items()}
+        self.answer_ids = {}
+        for subject, answers in self.subject_answers.items():
+            ids = self.answer_ids[subject] = {}
+            for answer_id, answer in enumerate(answers):
+                ids.setdefault(answer, answer_id)
+        self.answer_graph = load_answer_graph(self.model_path, self.data)
+    
+    def repetition_stats(self):
+        """Report the size and eviction rate of the per-user repetition tracker"""
+        return self.recent_responses.stats()
+    
+    def exact_match_stats(self):
+        """Report how many exact-match lookups the hash indexes answered, across all subjects"""
+        return exact_match_stats(self.exact_indexes.values())
+    
     def _create_default_data(self):
         """Create basic data if model is missing"""
         logger.info("Creating default data")
@@ -63,7 +116,7 @@ class AITutor:
             }
         }
     
-    def get_response(self, question, subject):
+    def get_response(self, question, subject, user=ANONYMOUS_USER):
         """Generate a response to a user question about a specific subject."""
         try:
             # Log the incoming question and subject
@@ -73,7 +126,7 @@ class AITutor:
             cleaned_question = self._clean_text(question)
             
             # Check if there's exact subject data
-            if subject.lower() not in self.data and subject.lower() not in [s.lower() for s in self.data.keys()]:
+            if subject.lower() not in self.subject_keys:
                 logger.warning(f"Subject '{subject}' not found in model data. Using general knowledge.")
                 # If subject not found, search across all subjects
                 found_response = self._search_across_subjects(cleaned_question)
@@ -81,29 +134,24 @@ class AITutor:
                     return found_response
                 return self._generate_fallback_response(cleaned_question, subject)
             
-            # Convert to lowercase for case-insensitive matching
-            subject_key = subject.lower()
-            
-            # Ensure subject key exists (handling case sensitivity)
-            for key in self.data.keys():
-                if key.lower() == subject_key:
-                    subject_key = key
-                    break
+            # Resolve the actual subject key (handling case sensitivity)
+            subject_key = self.subject_keys[subject.lower()]
             
             # First, try for exact match
-            if cleaned_question in self.data[subject_key]:
+            exact_id = self.exact_indexes[subject_key].lookup(cleaned_question)
+            if exact_id is not None:
+                matched_question = self.question_keys[subject_key][exact_id]
                 logger.info(f"Found exact match for question in {subject_key}")
-                response = self.data[subject_key][cleaned_question]
+                response = self.data[subject_key][matched_question]
                 
                 # Check if this is a repeat of the most recent response
-                recent_key = f"{subject_key}:{cleaned_question}"
-                if recent_key in self.recent_responses:
+                if self.recent_responses.get(user, subject_key, matched_question) is not None:
                     logger.info(f"Avoiding repetition of exact response")
                     # Try to find alternative or add disclaimer
-                    return self._find_alternative_response(self.data[subject_key][cleaned_question], subject_key)
+                    return self._find_alternative_response(response, subject_key)
                 
                 # Record this response as recently used
-                self.recent_responses[recent_key] = response
+                self.recent_responses.record(user, subject_key, matched_question, response)
                 return response
             
             # Check for special "who" questions about people
@@ -129,14 +177,14 @@ class AITutor:
                     return entity_response
             
             # Try fuzzy matching if no exact match found
-            response = self._fuzzy_match(cleaned_question, subject_key)
+            response = self._fuzzy_match(cleaned_question, subject_key, user)
             if response:
                 logger.info(f"Found fuzzy match for question in {subject_key}")
                 return response
             
             # If no match found, try to generate based on similar questions
             logger.info(f"No match found, trying to generate response")
-            return self._generate_response(cleaned_question, subject_key)
+            return self._generate_response(cleaned_question, subject_key, user)
         
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
@@ -144,25 +192,24 @@ class AITutor:
     
     def _clean_text(self, text):
         """Clean text by removing punctuation and converting to lowercase."""
-        text = text.lower()
-        # Remove question marks, periods, etc.
-        text = re.sub(r'[^\w\s]', '', text).strip()
-        return text
+        return clean_text(text)
     
     def _search_across_subjects(self, question):
         """Search for an answer across all subjects."""
         logger.info(f"Searching across all subjects for: '{question}'")
         
+        question_words = word_set(question)
+        
         for subject, qa_pairs in self.data.items():
             if question in qa_pairs:
                 logger.info(f"Found match in {subject}")
                 return qa_pairs[question]
             
             # Try keyword matching for non-exact matches
+            stored_words = self.question_words[subject]
             for q, a in qa_pairs.items():
                 # Check if all words in the question are in the stored question
-                question_words = set(question.split())
-                stored_question_words = set(q.split())
+                stored_question_words = stored_words[q]
                 
                 # If at least 70% of words match
                 intersection = question_words.intersection(stored_question_words)
@@ -175,106 +222,57 @@ class AITutor:
     
     def _search_for_person(self, person_name, subject_key):
         """Search for information about a person in the data."""
-        person_name = person_name.lower()
-        
-        # Look across all QA pairs in the subject
-        for question, answer in self.data[subject_key].items():
-            # Check if person's name is in the question
-            if person_name in question.lower():
-                return answer
-            
-            # Also check if the person's name is in the answer
-            if person_name in answer.lower():
-                # Check that this is biographical information
-                biographical_indicators = ["born", "was a", "is a", "died", "lived", "known for"]
-                if any(indicator in answer.lower() for indicator in biographical_indicators):
-                    return answer
-        
-        # If not found in specific subject, try across all subjects
-        for subj, qa_pairs in self.data.items():
-            if subj == subject_key:
-                continue  # Already checked
-                
-            for question, answer in qa_pairs.items():
-                if person_name in question.lower() or person_name in answer.lower():
-                    # Check that this is biographical information
-                    biographical_indicators = ["born", "was a", "is a", "died", "lived", "known for"]
-                    if any(indicator in answer.lower() for indicator in biographical_indicators):
-                        return f"While this is not strictly {subject_key}, I can tell you that: {answer}"
-        
-        return None
+        return self._entity_answer(self.entity_index.lookup(person_name, BIOGRAPHICAL, subject_key), subject_key)
     
     def _search_for_entity(self, entity, subject_key):
         """Search for information about an entity (concept, thing) in the data."""
-        entity = entity.lower()
-        
-        # Look across all QA pairs in the subject
-        for question, answer in self.data[subject_key].items():
-            # Check if entity is in the question
-            if entity in question.lower() and ("what is" in question.lower() or "what are" in question.lower()):
-                return answer
-            
-            # Also check if the entity is prominently in the answer
-            if entity in answer.lower().split()[:10]:  # Check if entity is in the first few words
-                definitional_indicators = ["is a", "are a", "refers to", "defined as"]
-                if any(indicator in answer.lower() for indicator in definitional_indicators):
-                    return answer
-        
-        # If not found in specific subject, try across all subjects
-        for subj, qa_pairs in self.data.items():
-            if subj == subject_key:
-                continue  # Already checked
-                
-            for question, answer in qa_pairs.items():
-                if entity in question.lower() and ("what is" in question.lower() or "what are" in question.lower()):
-                    return f"While this is not strictly {subject_key}, I can tell you that: {answer}"
-        
-        return None
+        return self._entity_answer(self.entity_index.lookup(entity, DEFINITIONAL, subject_key), subject_key)
     
-    def _fuzzy_match(self, question, subject_key):
+    def _entity_answer(self, pair_id, subject_key):
+        """Answer for an entity index hit, noting when it comes from another subject."""
+        if pair_id is None:
+            return None
+        
+        subject = self.entity_index.subjects[pair_id]
+        answer = self.data[subject][self.entity_index.questions[pair_id]]
+        if subject != subject_key:
+            return f"While this is not strictly {subject_key}, I can tell you that: {answer}"
+        return answer
+    
+    def _fuzzy_match(self, question, subject_key, user=ANONYMOUS_USER):
         """Find a response using fuzzy matching."""
         best_match = None
         highest_score = 0
         
-        for q in self.data[subject_key]:
-            # Simple word overlap score
-            q_words = set(q.split())
-            question_words = set(question.split())
-            common_words = q_words.intersection(question_words)
-            
-            # Skip if no common meaningful words
-            if len(common_words) < 2:
-                continue
-            
-            # Calculate score: ratio of common words to total unique words
-            score = len(common_words) / len(q_words.union(question_words))
-            
-            if score > highest_score and score > 0.5:  # Threshold of 50% similarity
-                highest_score = score
-                best_match = q
+        # Questions sharing fewer than 2 words are never scored; above a 50% overlap, the first best question wins
+        match = self.question_token_sets[subject_key].best_jaccard(question.split(), min_common=2, min_score=0.5)
+        if match is not None:
+            question_id, highest_score = match
+            best_match = self.question_keys[subject_key][question_id]
         
         if best_match:
             logger.info(f"Fuzzy match found with score {highest_score}: {best_match}")
             
             # Check if we've recently used this response
-            recent_key = f"{subject_key}:{best_match}"
-            if recent_key in self.recent_responses:
+            if self.recent_responses.get(user, subject_key, best_match) is not None:
                 logger.info(f"Avoiding repetition of fuzzy match response")
                 # Try to find alternative or add disclaimer
                 return self._find_alternative_response(self.data[subject_key][best_match], subject_key)
             
             # Record this response as recently used
-            self.recent_responses[recent_key] = self.data[subject_key][best_match]
+            self.recent_responses.record(user, subject_key, best_match, self.data[subject_key][best_match])
             return self.data[subject_key][best_match]
         
         return None
     
     def _find_alternative_response(self, original_response, subject_key):
         """Find an alternative response or modify the original to avoid repetition."""
-        # Try to find a different response with similar content
-        for q, a in self.data[subject_key].items():
-            if a != original_response and self._similarity_score(a, original_response) > 0.3:
-                return f"Another perspective on this: {a}"
+        # Offer the most similar different answer, looked up in the precomputed answer graph
+        answer_id = self.answer_ids[subject_key].get(original_response)
+        if answer_id is not None and self.answer_graph is not None:
+            alternatives = self.answer_graph.alternatives(subject_key, answer_id)
+            if alternatives:
+                return f"Another perspective on this: {self.subject_answers[subject_key][alternatives[0]]}"
         
         # If no alternative found, add a note to the original response
         variations = [
@@ -286,74 +284,39 @@ class AITutor:
         prefix = random.choice(variations)
         return f"{prefix}{original_response}"
     
-    def _similarity_score(self, text1, text2):
-        """Calculate a simple similarity score between two texts."""
-        words1 = set(text1.lower().split())
-        words2 = set(text2.lower().split())
-        
-        intersection = words1.intersection(words2)
-        union = words1.union(words2)
-        
-        return len(intersection) / len(union)
-    
-    def _generate_response(self, question, subject_key):
+    def _generate_response(self, question, subject_key, user=ANONYMOUS_USER):
         """Generate a response based on the question and available data."""
         # Parse the question to identify the topic
-        question_words = question.split()
-        content_words = [w for w in question_words if w not in ['what', 'is', 'are', 'how', 'why', 'when', 'where', 'who', 'which', 'the', 'a', 'an', 'in', 'on', 'at', 'to', 'for', 'with']]
+        keywords = content_words(question)
         
-        if not content_words:
+        if not keywords:
             return self._generate_fallback_response(question, subject_key)
         
-        # Search for related answers based on content words
-        potential_answers = []
-        
-        for q, a in self.data[subject_key].items():
-            for word in content_words:
-                if word in q or word in a:
-                    potential_answers.append((q, a, self._calculate_relevance(word, q, a)))
-        
-        # Sort by relevance score
-        potential_answers.sort(key=lambda x: x[2], reverse=True)
+        # Search for related answers based on content words, touching only their postings
+        keyword_index = self.keyword_indexes[subject_key]
+        potential_answers = keyword_index.rank(keywords, limit=2)
         
         if potential_answers:
-            logger.info(f"Generated response based on keywords: {content_words}")
+            logger.info(f"Generated response based on keywords: {list(keywords)}")
             
             # Take the most relevant answer
-            most_relevant = potential_answers[0][1]
+            most_relevant = keyword_index.answers[potential_answers[0][0]]
             
             # Check if we've recently used this response
-            recent_key = f"{subject_key}:generated_{' '.join(content_words)}"
-            if recent_key in self.recent_responses and self.recent_responses[recent_key] == most_relevant:
+            recent_key = f"generated_{' '.join(keywords)}"
+            if self.recent_responses.get(user, subject_key, recent_key) == most_relevant:
                 # If it's a repeat, try the second most relevant if available
                 if len(potential_answers) > 1:
                     logger.info(f"Using alternative response to avoid repetition")
-                    most_relevant = potential_answers[1][1]
+                    most_relevant = keyword_index.answers[potential_answers[1][0]]
             
             # Record this response as recently used
-            self.recent_responses[recent_key] = most_relevant
+            self.recent_responses.record(user, subject_key, recent_key, most_relevant)
             return most_relevant
         
         # If no related answers found, provide a fallback response
         return self._generate_fallback_response(question, subject_key)
     
-    def _calculate_relevance(self, keyword, question, answer):
-        """Calculate the relevance score of a question-answer pair to a keyword."""
-        score = 0
-        
-        # Check keyword in question
-        if keyword in question:
-            score += 3  # Higher weight for question match
-        
-        # Check keyword in answer
-        if keyword in answer:
-            score += 2  # Lower weight for answer match
-        
-        # Add weight based on answer length (prefer more detailed answers)
-        score += min(len(answer.split()) / 50, 1)  # Normalize by max length
-        
-        return score
-    
     def _generate_fallback_response(self, question, subject):
         """Generate a fallback response when no good match is found."""
         logger.info(f"Using fallback response for '{question}' in {subject}")
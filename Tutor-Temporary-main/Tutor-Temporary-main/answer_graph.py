@@ -0,0 +1,190 @@
+import argparse
+import logging
+import os
+import pickle
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from qa_store import qa_dictionaries
+from response_cache import model_file_version
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Similar answers kept per answer
+ANSWER_NEIGHBORS = 8
+
+# Minimum word-set Jaccard for an answer to be offered as "another perspective"
+ALTERNATIVE_THRESHOLD = 0.3
+
+# Cells of the dense rows x subject Jaccard block scored at a time; fewer rows per block as the subject grows
+BLOCK_CELLS = 1 << 22
+
+
+def answer_graph_path(model_path):
+    """Where the neighbor graph of a model file lives: next to it, same name, .neighbors.npz"""
+    return os.path.splitext(model_path)[0] + '.neighbors.npz'
+
+
+def word_matrix(texts):
+    """Binary documents x words matrix of the lowercase whitespace-separated words of each text"""
+    vocabulary = {}
+    indices, indptr = [], [0]
+    for text in texts:
+        ids = {vocabulary.setdefault(word, len(vocabulary)) for word in text.lower().split()}
+        indices.extend(sorted(ids))
+        indptr.append(len(indices))
+    data = np.ones(len(indices), dtype=np.float32)
+    return csr_matrix((data, indices, indptr), shape=(len(texts), max(len(vocabulary), 1)))
+
+
+def top_neighbors(answers, k=ANSWER_NEIGHBORS):
+    """Return (neighbors, scores), the k answers with the highest word Jaccard to each answer
+
+    Rows are padded with -1 and score 0. An answer is never its own neighbor, nor is another
+    copy of the same text. Ties go to the earlier answer.
+    """
+    n = len(answers)
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if n < 2 or k <= 0:
+        return neighbors, scores
+
+    # Identical texts share a label so they can be masked out together
+    labels = {}
+    text_ids = np.array([labels.setdefault(answer, len(labels)) for answer in answers])
+
+    words = word_matrix(answers)
+    sizes = np.asarray(words.sum(axis=1)).ravel()
+    words_t = words.T.tocsr()
+    keep = min(k, n - 1)
+
+    # About six float32 copies of a block are alive at once, so the peak stays near 100MB whatever n is
+    block_rows = max(1, BLOCK_CELLS // n)
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        common = (words[start:stop] @ words_t).toarray()
+        union = sizes[start:stop, None] + sizes[None, :] - common
+        jaccard = np.divide(common, union, out=np.zeros_like(common), where=union > 0)
+        jaccard[text_ids[start:stop, None] == text_ids[None, :]] = -1
+
+        # Score of each row's keep-th best answer; everything above it is in, ties fill up by id
+        kth_scores = -np.partition(-jaccard, keep - 1, axis=1)[:, keep - 1]
+        for row, kth_score in enumerate(kth_scores):
+            row_scores = jaccard[row]
+            above = np.flatnonzero(row_scores > kth_score)
+            tied = np.flatnonzero(row_scores == kth_score)[:keep - len(above)]
+            chosen = np.concatenate([above, tied])
+            chosen = chosen[np.lexsort((chosen, -row_scores[chosen]))]
+            chosen = chosen[row_scores[chosen] >= 0]
+            neighbors[start + row, :len(chosen)] = chosen
+            scores[start + row, :len(chosen)] = row_scores[chosen]
+
+    return neighbors, scores
+
+
+class AnswerGraph:
+    """Top-k near-duplicate answers of every answer, per subject, in the model's question order"""
+
+    def __init__(self, subjects, offsets, neighbors, scores, model_version=None):
+        self.subjects = list(subjects)
+        # Row where each subject's answers start; neighbor ids are local to their subject
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.scores = scores
+        self.model_version = model_version
+
+    def __len__(self):
+        return self.neighbors.shape[0]
+
+    @classmethod
+    def build(cls, data, k=ANSWER_NEIGHBORS):
+        """Build the graph from aimodel data (subject -> {question: answer})"""
+        subjects = list(data)
+        offsets = [0]
+        neighbors, scores = [], []
+        for subject in subjects:
+            subject_neighbors, subject_scores = top_neighbors(list(data[subject].values()), k)
+            neighbors.append(subject_neighbors)
+            scores.append(subject_scores)
+            offsets.append(offsets[-1] + len(subject_neighbors))
+        neighbors = np.vstack(neighbors) if neighbors else np.empty((0, k), dtype=np.int32)
+        scores = np.vstack(scores) if scores else np.empty((0, k), dtype=np.float32)
+        return cls(subjects, np.array(offsets, dtype=np.int64), neighbors, scores)
+
+    def save(self, path, model_version=None):
+        """Write the graph as one small .npz of int32 ids and float32 scores"""
+        np.savez(path, subjects=np.array(self.subjects, dtype=str), offsets=self.offsets,
+                 neighbors=self.neighbors, scores=self.scores,
+                 model_version=np.array(model_version or '', dtype=str))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(f['subjects'].tolist(), f['offsets'], f['neighbors'], f['scores'], str(f['model_version']) or None)
+
+    def matches(self, data):
+        """Whether the graph was built for data's subjects and answer counts"""
+        if self.subjects != list(data):
+            return False
+        counts = np.diff(self.offsets)
+        return all(count == len(data[subject]) for count, subject in zip(counts, self.subjects))
+
+    def alternatives(self, subject, answer_id, threshold=ALTERNATIVE_THRESHOLD):
+        """Ids of the answers in subject above threshold similarity to answer_id, most similar first"""
+        row = self.offsets[self.subjects.index(subject)] + answer_id
+        keep = self.scores[row] > threshold
+        return self.neighbors[row][keep].tolist()
+
+
+def load_answer_graph(model_path, data):
+    """Load the graph saved next to model_path, or None when it is missing or stale
+
+    The graph is never built here: at full size that is minutes of CPU at startup, so it
+    is left to answer_graph.py and repeated answers are only reworded until it has run.
+    """
+    path = answer_graph_path(model_path) if model_path else None
+    if not path or not os.path.exists(path):
+        logger.info(f"No answer graph for {model_path}; run answer_graph.py to offer alternative answers")
+        return None
+    try:
+        graph = AnswerGraph.load(path)
+    except Exception as e:
+        logger.warning(f"Could not load answer graph from {path}: {str(e)}")
+        return None
+    if graph.model_version != model_file_version(model_path) or not graph.matches(data):
+        logger.warning(f"Answer graph {path} was built from a different model file; rebuild it with answer_graph.py")
+        return None
+    return graph
+
+
+def write_answer_graph(model_path, data, k=ANSWER_NEIGHBORS):
+    """Build the graph of aimodel data (subject -> {question: answer}) loaded from model_path and save it next to the file"""
+    graph = AnswerGraph.build(data, k)
+    graph.save(answer_graph_path(model_path), model_file_version(model_path))
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the near-duplicate answer graph for the model file aimodel.py loads")
+    parser.add_argument("--model", default="model/ai_tutor_model.pkl", help="saved subject -> {question: answer} data or (vectorizer, X, training_data) model")
+    parser.add_argument("--neighbors", type=int, default=ANSWER_NEIGHBORS, help="similar answers kept per answer")
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        model_data = pickle.load(f)
+
+    # Built over the same subject -> {question: answer} form aimodel.py turns the file into
+    data = qa_dictionaries(model_data)
+    if data is None:
+        parser.error(f"{args.model} is neither a subject dictionary nor a (vectorizer, X, training_data) model")
+
+    start = time.perf_counter()
+    graph = write_answer_graph(args.model, data, args.neighbors)
+    path = answer_graph_path(args.model)
+    print(f"Linked {len(graph)} answers to {args.neighbors} neighbors each in "
+          f"{time.perf_counter() - start:.1f}s, saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
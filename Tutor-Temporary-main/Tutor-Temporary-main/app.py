@@ -12,6 +12,19 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 import json
 import streamlit.components.v1 as components
 import re
+import threading
+from subject_index import build_subject_indexes
+from qa_store import QAStore
+from response_cache import ResponseCache, model_file_version
+from text_normalizer import normalize_question, normalize_corpus
+from keyword_rules import SPECIAL_CASE_MATCHERS, KEYWORD_MATCHERS
+from exact_index import ExactMatchIndex, exact_match_stats
+from substring_index import SubstringIndex
+from fuzzy_index import FUZZY_THRESHOLD
+from semantic_index import load_semantic_index, SEMANTIC_THRESHOLD
+from cascade import Stage, RetrievalCascade
+from model_artifact import artifact_path, load_model_artifact, read_subject_indexes
+from model_shards import load_sharded_model
 
 # Configure logging
 logging.basicConfig(filename='logs/ai_tutor.log', level=logging.DEBUG,
@@ -31,6 +44,30 @@ def debug_log(message):
     """Write debug messages to log file"""
     debug_logger.debug(message)
 
+# Model the app's shared AITutor loads, falling back to the built-in QA pairs when it is missing
+LARGE_MODEL_PATH = 'model/large_ai_tutor_model.pkl'
+
+# Retrieval cascade used by AITutor: (stage, expected cost in ms, confidence).
+# Stages run cheapest first; an answer at or above CASCADE_EXIT_CONFIDENCE ends the request.
+CASCADE_STAGES = [
+    ("special_case", 0.02, 1.0),
+    ("arithmetic", 0.05, 1.0),
+    ("keyword", 0.05, 1.0),
+    ("exact", 0.05, 1.0),
+    ("substring", 0.1, 1.0),
+    ("topic", 0.2, 1.0),
+    ("tfidf", 1.0, 1.0),
+    ("fuzzy", 2.0, 0.8),
+    ("semantic", 3.0, 0.6),
+]
+CASCADE_EXIT_CONFIDENCE = 0.5
+
+# Per request time budget in ms; once an answer was found, a stage that would overrun it is skipped and the best answer so far used
+CASCADE_BUDGET_MS = 250
+
+# Stages that read the search indexes; a failure there skips the stage instead of failing the request
+INDEX_STAGES = {"tfidf", "fuzzy", "semantic"}
+
 # Function to get progress data for a user
 def get_progress(username):
     """Load progress data for the given username"""
@@ -142,117 +179,47 @@ def update_progress(username, subject, question, progress_value=5):
         debug_log(f"Error updating progress: {str(e)}")
         return False
 
-# Add this function close to the top of the file, after other imports
-def generate_ai_response(subject, question, model, vectorizer, questions, answers):
-    """Generate AI response with improved context handling and caching prevention"""
-    
-    debug_log(f"Generating response for: '{question}' in subject: {subject}")
-    
-    # Clean and process the user question
-    cleaned_question = question.strip().lower()
-    
-    # Generate a unique request ID to prevent response caching
-    request_id = str(uuid.uuid4())[:8]
-    debug_log(f"Request ID: {request_id}")
-    
-    # Check for empty question
-    if not cleaned_question:
-        debug_log("Empty question detected")
-        return "Please ask me a question about " + subject
-    
-    try:
-        # Convert the question to vector
-        question_vector = vectorizer.transform([cleaned_question])
-        
-        # Get all training vectors for comparison
-        train_vectors = vectorizer.transform(questions)
-        
-        # Calculate similarity scores between the question and training data
-        similarity_scores = cosine_similarity(question_vector, train_vectors)[0]
-        
-        # Get the index with the highest similarity
-        most_similar_idx = np.argmax(similarity_scores)
-        similarity_value = similarity_scores[most_similar_idx]
-        
-        debug_log(f"Most similar question: '{questions[most_similar_idx]}' with score: {similarity_value}")
-        
-        # Check if there's a good match
-        if similarity_value > 0.5:  # A reasonable threshold
-            answer = answers[most_similar_idx]
-            debug_log(f"Using matched answer: '{answer[:50]}...'")
-            return answer
-        else:
-            # If no good match, generate a response based on the subject
-            # This ensures we don't always return a default response
-            
-            debug_log("No good match found, using subject-specific response")
-            
-            # Subject-specific responses for low-match cases
-            subject_responses = {
-                "Mathematics": [
-                    f"Request {request_id}: That's an interesting math question. While I don't have an exact match in my knowledge base, I can tell you that mathematics involves numbers, quantities, and logical reasoning. Could you provide more details or rephrase your question?",
-                    f"Request {request_id}: In mathematics, we often approach problems step-by-step. Your question seems to be about a math concept I'm not fully trained on yet. Could you try a simpler version or a different topic in mathematics?",
-                    f"Request {request_id}: Mathematics has many branches like algebra, geometry, calculus, and statistics. To better answer your question, could you specify which area of math you're asking about?"
-                ],
-                "Science": [
-                    f"Request {request_id}: That's a fascinating science question. While I don't have a specific answer in my database, science is about understanding the natural world through observation and experimentation. Could you clarify or rephrase your question?",
-                    f"Request {request_id}: Science includes fields like biology, chemistry, physics, and earth science. To give you a better answer, could you specify which scientific field your question relates to?",
-                    f"Request {request_id}: Scientific knowledge evolves through research and discovery. Your question touches on concepts I don't have complete information about. Could you provide more context or ask about a related topic?"
-                ],
-                "History": [
-                    f"Request {request_id}: History helps us understand the past and its influence on our present. While I don't have specific information about your question in my database, could you provide more details about the time period or region you're interested in?",
-                    f"Request {request_id}: Historical events are connected through cause and effect relationships. To better answer your question about history, could you specify the era, civilization, or historical figure you're asking about?",
-                    f"Request {request_id}: Understanding history requires examining multiple perspectives and sources. Your question seems to be about a historical topic I don't have complete information on. Could you try a different historical question?"
-                ],
-                "Programming": [
-                    f"Request {request_id}: Programming involves writing instructions for computers to follow. While I don't have a specific answer to your programming question in my database, could you specify which programming language or concept you're asking about?",
-                    f"Request {request_id}: In programming, problems can be solved in multiple ways. Your question seems to be about a programming concept I don't have complete information on. Could you provide code examples or more context?",
-                    f"Request {request_id}: Programming languages have their own syntax and best practices. To better help with your programming question, could you specify if you're asking about algorithms, syntax, debugging, or another aspect of coding?"
-                ]
-            }
-            
-            # Default fallback if subject not in predefined list
-            default_responses = [
-                f"Request {request_id}: That's an interesting question. While I don't have a specific answer in my knowledge base, I'm designed to help with educational topics. Could you provide more details or try a different question?",
-                f"Request {request_id}: I'm still learning about various educational topics. Your question seems to be about something I don't have complete information on yet. Could you try rephrasing or asking about something else?",
-                f"Request {request_id}: I aim to provide helpful educational information. To better assist you, could you provide more context or details about what you're trying to learn?"
-            ]
-            
-            # Get responses for the current subject or use default
-            response_options = subject_responses.get(subject, default_responses)
-            
-            # Randomly select one to add variety
-            import random
-            response = random.choice(response_options)
-            
-            debug_log(f"Generated fallback response: '{response[:50]}...'")
-            return response
-    
-    except Exception as e:
-        debug_log(f"Error generating response: {str(e)}")
-        return f"I encountered an error while processing your question (Error ID: {request_id}). Please try asking again or try a different question."
-
 # Define the AITutor class properly
 class AITutor:
-    def __init__(self, vectorizer=None, X=None, training_data=None, model_path=None):
+    def __init__(self, vectorizer=None, X=None, training_data=None, model_path=None, source_path=None):
+        # Repeated questions are answered from this cache until the model file changes
+        self.response_cache = ResponseCache()
+        # File the model was read from, used to detect model changes
+        self.source_path = model_path or source_path
+        # Version of that file, taken before reading it; responses are cached under the version actually loaded
+        self.model_version = model_file_version(self.source_path)
+        # Per-subject shards opened on first use, when the model was split by model_shards.py
+        self.shards = None
+        self._shard_lock = threading.Lock()
+        # Subject -> (vectorizer, rows, postings) mapped from a model artifact, searched instead of fitting
+        self.stored_indexes = {}
+        
         try:
             debug_log("Initializing AITutor")
-            if model_path:
-                with open(model_path, 'rb') as f:
-                    debug_log(f"Loading model from {model_path}")
-                    data = pickle.load(f)
-                    
-                    # Check if new format model with all components
-                    if isinstance(data, tuple) and len(data) == 3:
-                        self.vectorizer, self.X, self.training_data = data
-                        debug_log(f"Loaded model in expanded format with {sum(len(v)//2 for v in self.training_data.values() if isinstance(v, list))} QA pairs")
-                    else:
-                        # Old format - just Q&A pairs
-                        self.vectorizer = TfidfVectorizer()
-                        self.training_data = data
-                        questions = [q for q, _ in data]
-                        self.X = self.vectorizer.fit_transform(questions)
-                        debug_log("Loaded model in legacy format")
+            if model_path and self._open_shards(model_path):
+                return
+            elif model_path:
+                # Prefer the memory-mapped artifact converted from this pickle when there is a current one
+                data = load_model_artifact(model_path)
+                if data is not None:
+                    debug_log(f"Opened memory-mapped artifact of {model_path}")
+                    self.stored_indexes = self._read_stored_indexes(artifact_path(model_path))
+                else:
+                    with open(model_path, 'rb') as f:
+                        debug_log(f"Loading model from {model_path}")
+                        data = pickle.load(f)
+                
+                # Check if new format model with all components
+                if isinstance(data, tuple) and len(data) == 3:
+                    self.vectorizer, self.X, self.training_data = data
+                    debug_log(f"Loaded model in expanded format with {sum(len(v)//2 for v in self.training_data.values() if not isinstance(v, str))} QA pairs")
+                else:
+                    # Old format - just Q&A pairs
+                    self.vectorizer = TfidfVectorizer()
+                    self.training_data = data
+                    questions = [q for q, _ in data]
+                    self.X = self.vectorizer.fit_transform(questions)
+                    debug_log("Loaded model in legacy format")
             elif vectorizer is not None and X is not None and training_data is not None:
                 self.vectorizer = vectorizer
                 self.X = X
@@ -262,26 +229,27 @@ class AITutor:
                 debug_log("No model provided, creating comprehensive model with external datasets if available")
                 # Try loading from external datasets first
                 try:
-                    large_dataset_path = 'model/large_ai_tutor_model.pkl'
-                    if os.path.exists(large_dataset_path):
+                    large_dataset_path = LARGE_MODEL_PATH
+                    large_version = model_file_version(large_dataset_path)
+                    if self._open_shards(large_dataset_path):
+                        self.model_version = large_version
+                        return
+                    # The memory-mapped artifact opens without unpickling anything; the pickle is the fallback
+                    large_data = load_model_artifact(large_dataset_path)
+                    if large_data is not None:
+                        debug_log(f"Opened memory-mapped artifact of {large_dataset_path}")
+                        self.stored_indexes = self._read_stored_indexes(artifact_path(large_dataset_path))
+                    elif os.path.exists(large_dataset_path):
                         debug_log(f"Loading large dataset from {large_dataset_path}")
                         with open(large_dataset_path, 'rb') as f:
                             large_data = pickle.load(f)
-                            if isinstance(large_data, tuple) and len(large_data) == 3:
-                                self.vectorizer, self.X, self.training_data = large_data
-                                debug_log(f"Loaded large dataset with {sum(len(v)//2 for v in self.training_data.values() if isinstance(v, list))} QA pairs")
-                                
-                                # Create subject lookup dictionary
-                                self.training_data_dict = {}
-                                for subject, qa_list in self.training_data.items():
-                                    pairs = []
-                                    for i in range(0, len(qa_list), 2):
-                                        if i+1 < len(qa_list):
-                                            pairs.append((qa_list[i], qa_list[i+1]))
-                                    self.training_data_dict[subject] = pairs
-                                
-                                debug_log(f"Created structured QA dictionary with {sum(len(pairs) for pairs in self.training_data_dict.values())} total pairs")
-                                return
+                    if isinstance(large_data, tuple) and len(large_data) == 3:
+                        self.vectorizer, self.X, self.training_data = large_data
+                        self.source_path = large_dataset_path
+                        self.model_version = large_version
+                        debug_log(f"Loaded large dataset with {sum(len(v)//2 for v in self.training_data.values())} QA pairs")
+                        self._build_indexes()
+                        return
                 except Exception as e:
                     debug_log(f"Error loading large dataset: {str(e)}")
                 
@@ -331,28 +299,117 @@ class AITutor:
                 
                 self.training_data = minimal_qa_by_subject
                 
-                # Create a structured dictionary for subject-specific lookups
-                self.training_data_dict = {
-                    "Mathematics": [(q, a) for q, a in minimal_qa[:8]],  # First 8 items are Mathematics
-                    "Science": [(q, a) for q, a in minimal_qa[8:16]],    # Next 8 items are Science
-                    "History": [(q, a) for q, a in minimal_qa[16:24]],   # Next 8 items are History
-                    "Programming": [(q, a) for q, a in minimal_qa[24:]]  # Remaining items are Programming
-                }
-                
                 # Prepare vectorizer with all questions
-                all_questions = [q for subj in self.training_data_dict.keys() for q, _ in self.training_data_dict[subj]]
+                all_questions = [q for q, _ in minimal_qa]
                 self.X = self.vectorizer.fit_transform(all_questions)
                 
                 debug_log(f"Created comprehensive model with {len(all_questions)} QA pairs")
                 # Log the number of QA pairs for each subject
-                for subject, qa_pairs in self.training_data_dict.items():
+                for subject, qa_pairs in minimal_qa_by_subject.items():
                     debug_log(f"Subject {subject} has {len(qa_pairs)} QA pairs")
             
+            self._build_indexes()
             debug_log(f"AITutor initialized successfully")
         except Exception as e:
             debug_log(f"Error in AITutor.__init__: {str(e)}")
             raise
 
+    def _read_stored_indexes(self, directory):
+        """The subject search indexes saved in an artifact directory, or none when they can't be read"""
+        try:
+            stored_indexes = read_subject_indexes(directory)
+            debug_log(f"Mapped stored search indexes for {len(stored_indexes)} subjects from {directory}")
+            return stored_indexes
+        except Exception as e:
+            debug_log(f"Could not read stored search indexes from {directory}: {str(e)}")
+            return {}
+
+    def _open_shards(self, model_path):
+        """Use the sharded form of model_path if there is a current one; subjects load on first use"""
+        shards = load_sharded_model(model_path)
+        if shards is None:
+            return False
+        
+        self.shards = shards
+        self.source_path = model_path
+        self.vectorizer, self.X, self.training_data = None, None, {}
+        self.qa_store = QAStore.empty()
+        debug_log(f"Opened sharded model with {len(shards.subjects())} subjects (content hash {shards.content_hash[:12]})")
+        self._build_indexes()
+        return True
+
+    def _build_indexes(self):
+        """Fit one TF-IDF index per subject so queries only need a transform and a dot product"""
+        # Every stage reads QA pairs through one columnar store, whatever layout the model was saved in
+        if getattr(self, 'qa_store', None) is None:
+            self.qa_store = QAStore.from_training_data(self.training_data)
+            # The store holds its own copy of the strings, so the per-layout lists can go
+            self.training_data = None
+            debug_log(f"Stored {len(self.qa_store)} QA pairs in {self.qa_store.nbytes / 1e6:.1f}MB of columns")
+        
+        self.questions_lower = {}
+        self.exact_indexes = {}
+        self.substring_indexes = {}
+        self.subject_indexes = {}
+        self._index_subjects(self.qa_store, self.qa_store.subjects())
+        debug_log(f"Built TF-IDF indexes for {len(self.subject_indexes)} subjects")
+        
+        # Row where each subject starts in the model file's question order, which the semantic index uses
+        if self.shards is not None:
+            question_counts = self.shards.question_counts()
+        else:
+            question_counts = {subject: len(self.qa_store.questions(subject)) for subject in self.qa_store.subjects()}
+        self.subject_offsets = dict(zip(question_counts, np.cumsum([0] + list(question_counts.values()))[:-1].tolist()))
+        
+        # Optional LSA index built offline by semantic_index.py from the same model file
+        self.semantic_index = load_semantic_index(self.source_path)
+        total_questions = sum(question_counts.values())
+        if self.semantic_index is not None and len(self.semantic_index) != total_questions:
+            debug_log(f"Ignoring semantic index with {len(self.semantic_index)} questions for a model with {total_questions}")
+            self.semantic_index = None
+        if self.semantic_index is not None:
+            debug_log(f"Loaded semantic index over {len(self.semantic_index)} questions")
+        
+        # The stages read the indexes above, so the cascade is rebuilt along with them
+        self.cascade = self._build_cascade()
+
+    def _index_subjects(self, store, subjects):
+        """Build the per-subject lookup structures for the given subjects of a QAStore"""
+        # Lowercase every stored question once instead of on every request
+        questions_lower = {subject: normalize_corpus(store.questions(subject), str.lower) for subject in subjects}
+        self.questions_lower.update(questions_lower)
+        
+        # Hash lookups for the exact-match stage
+        self.exact_indexes.update({subject: ExactMatchIndex(questions) for subject, questions in questions_lower.items()})
+        
+        # Trigram postings for the substring and topic stages
+        self.substring_indexes.update({subject: SubstringIndex(questions) for subject, questions in questions_lower.items()})
+        
+        self.subject_indexes.update(build_subject_indexes({subject: store.pairs(subject) for subject in subjects}, stored=self.stored_indexes))
+
+    def _ensure_subject(self, subject):
+        """Open a sharded model's subject and index it the first time a question arrives for it"""
+        if self.shards is None or subject in self.qa_store or subject not in self.shards:
+            return
+        
+        with self._shard_lock:
+            if subject in self.qa_store:
+                return
+            _, _, qa_list = self.shards.load(subject)
+            # The shard carries the subject's fitted search indexes, so they are mapped rather than refitted here
+            stored = self.shards.stored_index(subject)
+            if stored is not None:
+                self.stored_indexes[subject] = stored
+            store = self.qa_store.extended(QAStore.from_training_data({subject: qa_list}))
+            self._index_subjects(store, [subject])
+            # Published last: other sessions treat the subject as ready once the store lists it
+            self.qa_store = store
+            debug_log(f"Indexed subject {subject} on first use; loaded subjects: {self.shards.loaded_subjects()}")
+
+    def exact_match_stats(self):
+        """Report how many exact-stage lookups the hash indexes answered, across all subjects"""
+        return exact_match_stats(self.exact_indexes.values())
+
     def handle_arithmetic(self, question):
         """
         Process math questions and calculate results
@@ -374,7 +431,7 @@ class AITutor:
             }
             
             # Clean the question text
-            cleaned = question.strip().lower()
+            cleaned = normalize_question(question)
             
             # Convert words to symbols
             for word, symbol in math_words.items():
@@ -423,187 +480,256 @@ class AITutor:
             return None
 
     def get_response(self, question, subject):
+        # Serve repeated questions from the cache
+        cache_key = self._cache_key(question, subject)
+        cached_response = self.response_cache.get(cache_key)
+        if cached_response is not None:
+            debug_log(f"Response cache hit for question: '{cache_key[0]}' in subject: {subject}")
+            return cached_response
+        
+        response, cacheable = self._answer(question, subject)
+        if cacheable:
+            self.response_cache.put(cache_key, response)
+        return response
+
+    def _cache_key(self, question, subject):
+        """Build the response cache key under the version of the model this tutor loaded"""
+        self.response_cache.check_model_version(self.model_version)
+        return (normalize_question(question), subject, self.model_version)
+
+    def _build_cascade(self):
+        """Wire the configured stages to their methods"""
+        stages = [Stage(name, getattr(self, f"_{name}_stage"), cost_ms, confidence, skip_on_error=name in INDEX_STAGES)
+                  for name, cost_ms, confidence in CASCADE_STAGES]
+        return RetrievalCascade(stages, exit_confidence=CASCADE_EXIT_CONFIDENCE, budget_ms=CASCADE_BUDGET_MS)
+
+    def _new_query(self, question, subject):
+        """Per request state shared by the cascade stages"""
+        return {"question": normalize_question(question), "subject": subject, "request_id": str(uuid.uuid4())[:8]}
+
+    def _run_cascade(self, query):
+        """Run the retrieval cascade for one query, returning (the answer or the subject fallback, cacheable)"""
+        best, trace, over_budget = self.cascade.run(query)
+        debug_log(f"[{query['request_id']}] Cascade: " + ", ".join(f"{name} {ms:.2f}ms {outcome}" for name, ms, outcome in trace))
+        response = best.answer if best is not None else self._fallback_response(query["subject"])
+        # An answer from a cascade the budget cut short is not cached, so a less loaded request can find a better one
+        return response, not over_budget
+
+    def _answer(self, question, subject):
+        """Answer one question, returning (response, cacheable)"""
         try:
-            # Clean the input and generate a unique request ID for this query
-            cleaned_question = question.strip().lower()
-            request_id = str(uuid.uuid4())[:8]
-            
-            debug_log(f"[{request_id}] Getting response for question: '{cleaned_question}' in subject: {subject}")
-            
-            # SPECIAL CASE: Handle specific formulas directly
-            if subject == "Mathematics":
-                # Check for quadratic formula specifically
-                if "quadratic" in cleaned_question and ("formula" in cleaned_question or "equation" in cleaned_question):
-                    debug_log(f"[{request_id}] Direct match for quadratic formula")
-                    return "The quadratic formula is used to solve equations in the form ax² + bx + c = 0. The formula is: x = (-b ± √(b² - 4ac)) / 2a, where a, b, and c are coefficients in the quadratic equation. The discriminant (b² - 4ac) determines the number of solutions: if positive, there are two real solutions; if zero, there is one real solution; if negative, there are two complex solutions."
-                
-                # Handle general formula questions
-                if ("formula" in cleaned_question or "fromula" in cleaned_question):
-                    debug_log(f"[{request_id}] General formula query detected")
-                    return "A formula in mathematics is a fact or rule written with mathematical symbols. It typically uses an equals sign (=) to show that two expressions have the same value. Formulas express relationships between various quantities and provide a concise way to solve problems. Common mathematical formulas include the quadratic formula (x = (-b ± √(b² - 4ac)) / 2a), the area of a circle (A = πr²), the Pythagorean theorem (a² + b² = c²), and many others specific to different branches of mathematics."
-            
-            # SPECIAL CASE: Handle arithmetic operations if the subject is Mathematics
-            if subject == "Mathematics":
-                arithmetic_result = self.handle_arithmetic(cleaned_question)
-                if arithmetic_result:
-                    debug_log(f"[{request_id}] Handled as arithmetic operation: '{cleaned_question}'")
-                    return arithmetic_result
-                
-                # Handle graph-related questions
-                if "graph" in cleaned_question:
-                    return "In mathematics, a graph is a structure used to model pairwise relations between objects. Graphs consist of vertices (also called nodes or points) which are connected by edges (also called links or lines). Graphs can be used to model many types of relations and processes in physical, biological, social, and information systems. In mathematics, graphs are used in the study of graph theory."
-            
-            # SPECIAL CASE HANDLING: Check for direct keyword matches first
-            # This is a more reliable approach for common questions
-            
-            # Keywords specific to each subject
-            subject_keywords = {
-                "Mathematics": {
-                    "pythagorean": "The Pythagorean theorem states that in a right-angled triangle, the square of the length of the hypotenuse is equal to the sum of the squares of the other two sides. It is represented by the equation: a² + b² = c², where c is the length of the hypotenuse and a and b are the lengths of the other two sides.",
-                    "quadratic": "Quadratic equations can be solved using the quadratic formula: x = (-b ± √(b² - 4ac)) / 2a, where ax² + bx + c = 0. Alternatively, you can solve by factoring, completing the square, or graphing, depending on the specific equation.",
-                    "matrices": "Matrices are rectangular arrays of numbers, symbols, or expressions arranged in rows and columns. They are used in linear algebra for representing linear transformations and solving systems of linear equations.",
-                    "matrix": "Matrices are rectangular arrays of numbers, symbols, or expressions arranged in rows and columns. They are used in linear algebra for representing linear transformations and solving systems of linear equations.",
-                    "calculus": "Calculus is a branch of mathematics that focuses on the study of continuous change. It has two main branches: differential calculus (concerning rates of change and slopes of curves) and integral calculus (concerning accumulation of quantities and areas under curves).",
-                    "algebra": "Algebra is a branch of mathematics that uses symbols and letters to represent numbers and quantities in formulas and equations. It introduces the concept of variables and provides tools for solving equations.",
-                    "equation": "Equations are mathematical statements that assert the equality of two expressions. They typically contain variables and state that the expressions on either side of the equals sign have the same value.",
-                    "trigonometry": "Trigonometry is a branch of mathematics that studies the relationships between the sides and angles of triangles. It defines trigonometric functions such as sine, cosine, and tangent, which relate the angles of a triangle to the lengths of its sides.",
-                    "geometry": "Geometry is a branch of mathematics concerned with questions of shape, size, relative position of figures, and the properties of space. It includes the study of points, lines, angles, surfaces, and solids.",
-                },
-                "Science": {
-                    "photosynthesis": "Photosynthesis is the process by which green plants, algae, and some bacteria convert light energy, usually from the sun, into chemical energy in the form of glucose or other sugars. Plants take in carbon dioxide and water, and with the energy from sunlight, convert them into glucose and oxygen.",
-                    "states of matter": "The four primary states of matter are solid, liquid, gas, and plasma. Each state has unique properties based on the arrangement and energy of their particles. Solids have fixed shape and volume, liquids have fixed volume but take the shape of their container, gases expand to fill their container, and plasma is an ionized gas that conducts electricity.",
-                    "scientific method": "The scientific method is a systematic approach to research that involves making observations, formulating a hypothesis, testing the hypothesis through experiments, analyzing data, and drawing conclusions. It is the foundation of scientific inquiry and ensures that findings are based on evidence rather than assumptions.",
-                    "cellular respiration": "Cellular respiration is the process by which cells convert nutrients into energy in the form of ATP. It involves three main stages: glycolysis, the Krebs cycle (citric acid cycle), and the electron transport chain. This process requires oxygen and produces carbon dioxide as a waste product.",
-                    "biology": "Biology is the scientific study of living organisms and their interactions with each other and their environments. It encompasses various specialized fields such as molecular biology, cellular biology, genetics, ecology, evolutionary biology, and physiology.",
-                    "chemistry": "Chemistry is the scientific discipline that studies the composition, structure, properties, and changes of matter. It examines atoms, the elements, how they bond to form molecules and compounds, and how substances interact with energy.",
-                    "physics": "Physics is the natural science that studies matter, its motion and behavior through space and time, and the related entities of energy and force. It is one of the most fundamental scientific disciplines, with its main goal being to understand how the universe behaves.",
-                    "ecology": "Ecology is the branch of biology that studies the relationships between living organisms, including humans, and their physical environment. It examines how organisms interact with each other and with their environment, including the distribution and abundance of organisms.",
-                }
-            }
-            
-            # Check for direct keyword matches in the current subject
-            if subject in subject_keywords:
-                for keyword, answer in subject_keywords[subject].items():
-                    if keyword in cleaned_question:
-                        debug_log(f"[{request_id}] Found direct keyword match: '{keyword}' in subject: {subject}")
-                        return answer
-            
-            # Use the subject-specific QA pairs dictionary if available
-            if hasattr(self, 'training_data_dict') and isinstance(self.training_data_dict, dict):
-                # Make sure we're only looking at QA pairs for the current subject
-                subject_qa_pairs = self.training_data_dict.get(subject, [])
-                if not subject_qa_pairs:
-                    debug_log(f"[{request_id}] No QA pairs found for subject: {subject}")
-                else:
-                    debug_log(f"[{request_id}] Found {len(subject_qa_pairs)} QA pairs for subject {subject}")
-                    
-                    questions = [q for q, _ in subject_qa_pairs]
-                    answers = [a for _, a in subject_qa_pairs]
-                    
-                    # Check for exact matches first (case insensitive)
-                    for i, q in enumerate(questions):
-                        q_lower = q.lower()
-                        if cleaned_question == q_lower:
-                            debug_log(f"[{request_id}] Found exact match with: '{q}'")
-                            return answers[i]
-                    
-                    # Check for substring matches
-                    for i, q in enumerate(questions):
-                        q_lower = q.lower()
-                        if cleaned_question in q_lower:
-                            debug_log(f"[{request_id}] Found question contains user query: '{q}'")
-                            return answers[i]
-                            
-                    # Try the reverse - if the question contains important keywords from our database
-                    # For "what is/are X" questions, extract the X and match
-                    if cleaned_question.startswith("what is") or cleaned_question.startswith("what are"):
-                        topic = cleaned_question.replace("what is", "").replace("what are", "").strip()
-                        debug_log(f"[{request_id}] Extracted topic: '{topic}'")
-                        
-                        for i, q in enumerate(questions):
-                            q_lower = q.lower()
-                            if topic in q_lower:
-                                debug_log(f"[{request_id}] Found topic match with: '{q}'")
-                                return answers[i]
-                    
-                    # Similarly handle who/when/where/why/how questions
-                    question_starters = ["who", "when", "where", "why", "how"]
-                    for starter in question_starters:
-                        if cleaned_question.startswith(starter):
-                            topic = cleaned_question[len(starter):].strip()
-                            if topic:
-                                debug_log(f"[{request_id}] Extracted topic from {starter} question: '{topic}'")
-                                for i, q in enumerate(questions):
-                                    q_lower = q.lower()
-                                    if topic in q_lower:
-                                        debug_log(f"[{request_id}] Found topic match with: '{q}'")
-                                        return answers[i]
-                    
-                    # Use vectorization for semantic matching only within this subject
-                    try:
-                        # Create a new vectorizer just for this subject's questions
-                        subject_vectorizer = TfidfVectorizer(stop_words='english')
-                        subject_vectors = subject_vectorizer.fit_transform(questions)
-                        user_vector = subject_vectorizer.transform([cleaned_question])
-                        
-                        similarities = cosine_similarity(user_vector, subject_vectors)[0]
-                        best_idx = similarities.argmax()
-                        best_score = similarities[best_idx]
-                        
-                        debug_log(f"[{request_id}] Best match: '{questions[best_idx]}' with score {best_score:.4f}")
-                        
-                        # Only return if the match is reasonably good
-                        if best_score > 0.3:
-                            return answers[best_idx]
-                    except Exception as e:
-                        debug_log(f"[{request_id}] Error in vectorization: {str(e)}")
-                        # Continue to fallback responses
-            
-            # Try using the global vectorizer with all questions but filter by subject
+            self._ensure_subject(subject)
+            query = self._new_query(question, subject)
+            debug_log(f"[{query['request_id']}] Getting response for question: '{query['question']}' in subject: {subject}")
+            return self._run_cascade(query)
+        
+        except Exception as e:
+            debug_log(f"Error in get_response: {str(e)}")
+            # Errors are never cached so the next attempt runs the full cascade again
+            return f"An error occurred while processing your question: {str(e)}", False
+
+    def get_responses(self, queries):
+        """Answer a list of (question, subject) pairs, scoring each subject's questions in one batch"""
+        responses = [None] * len(queries)
+        cache_keys = [None] * len(queries)
+        pending_by_subject = {}
+        
+        for position, (question, subject) in enumerate(queries):
+            cache_keys[position] = self._cache_key(question, subject)
+            cached_response = self.response_cache.get(cache_keys[position])
+            if cached_response is not None:
+                responses[position] = cached_response
+            else:
+                pending_by_subject.setdefault(subject, []).append((position, self._new_query(question, subject)))
+        
+        for subject, pending in pending_by_subject.items():
             try:
-                if hasattr(self, 'training_data') and isinstance(self.training_data, dict) and hasattr(self, 'vectorizer'):
-                    all_subject_questions = []
-                    all_subject_answers = []
-                    subject_indices = []
-                    
-                    # Rebuild a list of all questions and answers with subject tracking
-                    for subj, qa_pairs in self.training_data_dict.items():
-                        if subj == subject:  # Only include the current subject
-                            for q, a in qa_pairs:
-                                all_subject_questions.append(q)
-                                all_subject_answers.append(a)
-                                subject_indices.append(subj)
-                    
-                    if all_subject_questions:
-                        # Create new vectors for just this subject's questions
-                        subject_only_vectorizer = TfidfVectorizer(stop_words='english')
-                        subject_only_vectors = subject_only_vectorizer.fit_transform(all_subject_questions)
-                        user_vector = subject_only_vectorizer.transform([cleaned_question])
-                        
-                        subject_similarities = cosine_similarity(user_vector, subject_only_vectors)[0]
-                        subject_best_idx = subject_similarities.argmax()
-                        subject_best_score = subject_similarities[subject_best_idx]
-                        
-                        debug_log(f"[{request_id}] Subject-only best match: '{all_subject_questions[subject_best_idx]}' with score {subject_best_score:.4f}")
-                        
-                        if subject_best_score > 0.3:
-                            return all_subject_answers[subject_best_idx]
+                self._ensure_subject(subject)
             except Exception as e:
-                debug_log(f"[{request_id}] Error in global vectorization: {str(e)}")
+                debug_log(f"Error opening shard for {subject}: {str(e)}")
             
-            # Fallback responses by subject
-            fallback_responses = {
-                "Mathematics": "I don't have specific information about that mathematical concept. Please try asking about the Pythagorean theorem, quadratic equations, matrices, calculus, algebra, equations, trigonometry, or geometry.",
-                "Science": "I don't have specific information about that scientific concept. Please try asking about photosynthesis, states of matter, the scientific method, cellular respiration, biology, chemistry, physics, or ecology.",
-                "History": "I don't have specific information about that historical topic. Please try asking about Albert Einstein, World War II, Rana Pratap Singh, the Renaissance, the Industrial Revolution, Mahatma Gandhi, the Cold War, or the Crusades.",
-                "Programming": "I don't have specific information about that programming concept. Please try asking about variables, object-oriented programming, functions, data structures, Python, algorithms, debugging, or databases."
-            }
+            # One transform and one sparse product per subject; the index stages read these instead of searching again
+            subject_index = getattr(self, 'subject_indexes', {}).get(subject)
+            if subject_index is not None:
+                try:
+                    matches = subject_index.best_matches([query["question"] for _, query in pending])
+                    for (_, query), match in zip(pending, matches):
+                        query["tfidf_match"] = match
+                    debug_log(f"Scored {len(pending)} batched questions for subject {subject}")
+                    
+                    # Word-level misses get one more batch against the character n-gram index
+                    misses = [query for _, query in pending if query["tfidf_match"][1] <= 0.3]
+                    if misses:
+                        for query, match in zip(misses, subject_index.fuzzy_matches([query["question"] for query in misses])):
+                            query["fuzzy_match"] = match
+                except Exception as e:
+                    debug_log(f"Error in batched vectorization for {subject}: {str(e)}")
             
-            return fallback_responses.get(subject, f"I don't have enough information about that in {subject}. Could you try asking something else?")
+            for position, query in pending:
+                try:
+                    debug_log(f"[{query['request_id']}] Getting batched response for question: '{query['question']}' in subject: {subject}")
+                    responses[position], cacheable = self._run_cascade(query)
+                    if cacheable:
+                        self.response_cache.put(cache_keys[position], responses[position])
+                except Exception as e:
+                    debug_log(f"Error in get_responses: {str(e)}")
+                    responses[position] = f"An error occurred while processing your question: {str(e)}"
         
-        except Exception as e:
-            debug_log(f"Error in get_response: {str(e)}")
-            return f"An error occurred while processing your question: {str(e)}"
+        return responses
+
+    def _special_case_stage(self, query):
+        """Handle specific formulas directly (compiled rules from keyword_rules.py)"""
+        subject = query["subject"]
+        if subject in SPECIAL_CASE_MATCHERS:
+            special_case = SPECIAL_CASE_MATCHERS[subject].match(query["question"])
+            if special_case:
+                rule_id, answer = special_case
+                debug_log(f"[{query['request_id']}] Special case rule {rule_id} ('{SPECIAL_CASE_MATCHERS[subject].first_term(rule_id)}') matched")
+                return answer
+        return None
+
+    def _arithmetic_stage(self, query):
+        """Handle arithmetic operations if the subject is Mathematics"""
+        if query["subject"] == "Mathematics":
+            arithmetic_result = self.handle_arithmetic(query["question"])
+            if arithmetic_result:
+                debug_log(f"[{query['request_id']}] Handled as arithmetic operation: '{query['question']}'")
+                return arithmetic_result
+        return None
+
+    def _keyword_stage(self, query):
+        """Direct keyword answers: one automaton pass over the question, however many keywords the subject has"""
+        subject = query["subject"]
+        if subject in KEYWORD_MATCHERS:
+            keyword_match = KEYWORD_MATCHERS[subject].match(query["question"])
+            if keyword_match:
+                rule_id, answer = keyword_match
+                debug_log(f"[{query['request_id']}] Found direct keyword match: '{KEYWORD_MATCHERS[subject].first_term(rule_id)}' in subject: {subject}")
+                return answer
+        return None
+
+    def _exact_stage(self, query):
+        """Exact matches (case insensitive, then ignoring punctuation and spacing)"""
+        subject_qa_pairs = self.qa_store.pairs(query["subject"])
+        if not subject_qa_pairs:
+            debug_log(f"[{query['request_id']}] No QA pairs found for subject: {query['subject']}")
+            return None
+        
+        exact_id = self.exact_indexes[query["subject"]].lookup(query["question"])
+        if exact_id is not None:
+            debug_log(f"[{query['request_id']}] Found exact match with: '{subject_qa_pairs[exact_id][0]}'")
+            return subject_qa_pairs[exact_id][1]
+        return None
+
+    def _substring_stage(self, query):
+        """Stored questions that contain the whole user query"""
+        subject_qa_pairs = self.qa_store.pairs(query["subject"])
+        if not subject_qa_pairs:
+            return None
+        
+        match_id = self.substring_indexes[query["subject"]].first_containing(query["question"])
+        if match_id is not None:
+            debug_log(f"[{query['request_id']}] Found question contains user query: '{subject_qa_pairs[match_id][0]}'")
+            return subject_qa_pairs[match_id][1]
+        return None
+
+    def _topic_stage(self, query):
+        """Stored questions that contain the topic of a what/who/when/where/why/how question"""
+        subject_qa_pairs = self.qa_store.pairs(query["subject"])
+        if not subject_qa_pairs:
+            return None
+        
+        cleaned_question = query["question"]
+        request_id = query["request_id"]
+        substring_index = self.substring_indexes[query["subject"]]
+        
+        # For "what is/are X" questions, extract the X and match
+        if cleaned_question.startswith("what is") or cleaned_question.startswith("what are"):
+            topic = cleaned_question.replace("what is", "").replace("what are", "").strip()
+            debug_log(f"[{request_id}] Extracted topic: '{topic}'")
+            
+            match_id = substring_index.first_containing(topic)
+            if match_id is not None:
+                debug_log(f"[{request_id}] Found topic match with: '{subject_qa_pairs[match_id][0]}'")
+                return subject_qa_pairs[match_id][1]
+        
+        # Similarly handle who/when/where/why/how questions
+        question_starters = ["who", "when", "where", "why", "how"]
+        for starter in question_starters:
+            if cleaned_question.startswith(starter):
+                topic = cleaned_question[len(starter):].strip()
+                if topic:
+                    debug_log(f"[{request_id}] Extracted topic from {starter} question: '{topic}'")
+                    match_id = substring_index.first_containing(topic)
+                    if match_id is not None:
+                        debug_log(f"[{request_id}] Found topic match with: '{subject_qa_pairs[match_id][0]}'")
+                        return subject_qa_pairs[match_id][1]
+        return None
+
+    def _tfidf_stage(self, query):
+        """Prebuilt subject index, so matching stays within this subject"""
+        subject_index = getattr(self, 'subject_indexes', {}).get(query["subject"])
+        if subject_index is None:
+            return None
+        
+        best_idx, best_score = query.get("tfidf_match") or subject_index.best_match(query["question"])
+        debug_log(f"[{query['request_id']}] Best match: '{subject_index.questions[best_idx]}' with score {best_score:.4f}")
+        
+        # Only return if the match is reasonably good
+        if best_score > 0.3:
+            return subject_index.answers[best_idx]
+        return None
+
+    def _fuzzy_stage(self, query):
+        """Character n-grams still match misspelled words"""
+        subject_index = getattr(self, 'subject_indexes', {}).get(query["subject"])
+        if subject_index is None:
+            return None
+        
+        fuzzy_idx, fuzzy_score = query.get("fuzzy_match") or subject_index.fuzzy_matches([query["question"]])[0]
+        if fuzzy_score > FUZZY_THRESHOLD:
+            debug_log(f"[{query['request_id']}] Fuzzy match: '{subject_index.questions[fuzzy_idx]}' with score {fuzzy_score:.4f}")
+            return subject_index.answers[fuzzy_idx]
+        return None
+
+    def _semantic_stage(self, query):
+        """Match paraphrases that share no words with a stored question, if a semantic index is loaded"""
+        if getattr(self, 'semantic_index', None) is None:
+            return None
+        
+        matches = self.semantic_index.search(query["question"], k=1, subject=query["subject"])
+        if matches and matches[0][1] > SEMANTIC_THRESHOLD:
+            debug_log(f"[{query['request_id']}] Semantic match with score {matches[0][1]:.4f}")
+            subject_qa_pairs = self.qa_store.pairs(query["subject"])
+            return subject_qa_pairs[matches[0][0] - self.subject_offsets[query["subject"]]][1]
+        return None
+
+    def _fallback_response(self, subject):
+        """Return the canned response used when nothing matched"""
+        # Fallback responses by subject
+        fallback_responses = {
+            "Mathematics": "I don't have specific information about that mathematical concept. Please try asking about the Pythagorean theorem, quadratic equations, matrices, calculus, algebra, equations, trigonometry, or geometry.",
+            "Science": "I don't have specific information about that scientific concept. Please try asking about photosynthesis, states of matter, the scientific method, cellular respiration, biology, chemistry, physics, or ecology.",
+            "History": "I don't have specific information about that historical topic. Please try asking about Albert Einstein, World War II, Rana Pratap Singh, the Renaissance, the Industrial Revolution, Mahatma Gandhi, the Cold War, or the Crusades.",
+            "Programming": "I don't have specific information about that programming concept. Please try asking about variables, object-oriented programming, functions, data structures, Python, algorithms, debugging, or databases."
+        }
+        
+        return fallback_responses.get(subject, f"I don't have enough information about that in {subject}. Could you try asking something else?")
+
+@st.cache_resource(show_spinner="Loading the AI Tutor model...", max_entries=1)
+def shared_tutor(model_version):
+    """The process-wide AITutor every session answers from; its indexes are read-only after construction
+
+    Keyed on the model file's version, so a rebuilt model replaces the tutor instead of being
+    answered by one loaded from the old file.
+    """
+    debug_log(f"Building the shared AI Tutor model for this process (model version {model_version})")
+    return AITutor()
+
+
+def current_tutor():
+    """The shared AITutor for the model file as it is now"""
+    return shared_tutor(model_file_version(LARGE_MODEL_PATH))
 
 # Main app
 def main():
@@ -653,15 +779,13 @@ def main():
     if 'debug_logs' not in st.session_state:
         st.session_state.debug_logs = []
     
-    # Initialize AITutor model once and properly
-    if 'ai_tutor_model' not in st.session_state:
-        try:
-            debug_log("Initializing AI Tutor model")
-            st.session_state.ai_tutor_model = AITutor()
-            debug_log("AI Tutor model initialized successfully")
-        except Exception as e:
-            debug_log(f"Error initializing AI Tutor model: {str(e)}")
-            st.session_state.ai_tutor_model = None
+    # Point the session at the process-wide model; sessions share it instead of each loading a copy.
+    # Attached again on every rerun (a cache hit), so sessions move to the new tutor once the model file is rebuilt
+    try:
+        st.session_state.ai_tutor_model = current_tutor()
+    except Exception as e:
+        debug_log(f"Error initializing AI Tutor model: {str(e)}")
+        st.session_state.ai_tutor_model = None
 
     # Fix issue with chat submission by renaming the function to submit_chat
     def submit_chat(user_question, subject):
@@ -833,10 +957,10 @@ def main():
 
         # Use existing model from session state or create new one if needed
         if 'ai_tutor_model' not in st.session_state or st.session_state.ai_tutor_model is None:
-            debug_log("Creating new AITutor instance in main content")
+            debug_log("Attaching shared AITutor instance in main content")
             try:
-                st.session_state.ai_tutor_model = AITutor()
-                debug_log("Successfully created new AITutor instance")
+                st.session_state.ai_tutor_model = current_tutor()
+                debug_log("Successfully attached shared AITutor instance")
             except Exception as e:
                 debug_log(f"Error creating AITutor instance: {str(e)}")
                 st.error("Error initializing AI Tutor. Some features may not work correctly.")
@@ -1791,7 +1915,7 @@ def load_model():
                 if isinstance(model_data, tuple) and len(model_data) == 3:
                     vectorizer, X, training_data = model_data
                     debug_log(f"Found expanded large model format with {sum(len(v)//2 for v in training_data.values() if isinstance(v, list))} QA pairs")
-                    return AITutor(vectorizer=vectorizer, X=X, training_data=training_data)
+                    return AITutor(vectorizer=vectorizer, X=X, training_data=training_data, source_path=large_model_path)
                 else:
                     debug_log("Found legacy model format")
                     return AITutor(model_path=large_model_path)
@@ -1807,7 +1931,7 @@ def load_model():
                 if isinstance(model_data, tuple) and len(model_data) == 3:
                     vectorizer, X, training_data = model_data
                     debug_log(f"Found expanded model format with {sum(len(v)//2 for v in training_data.values() if isinstance(v, list))} QA pairs")
-                    return AITutor(vectorizer=vectorizer, X=X, training_data=training_data)
+                    return AITutor(vectorizer=vectorizer, X=X, training_data=training_data, source_path=standard_model_path)
                 else:
                     debug_log("Found legacy model format")
                     return AITutor(model_path=standard_model_path)
@@ -1836,14 +1960,10 @@ def better_submit_chat(user_question, subject):
         
         # Get AI response with additional error handling
         try:
-            ai_response = None
-            if 'ai_tutor_model' in st.session_state and st.session_state.ai_tutor_model:
-                debug_log("Using session state AI model")
-                ai_response = st.session_state.ai_tutor_model.get_response(user_question, subject)
-            else:
-                debug_log("Creating new AI model instance")
-                temp_model = AITutor()
-                ai_response = temp_model.get_response(user_question, subject)
+            if 'ai_tutor_model' not in st.session_state or not st.session_state.ai_tutor_model:
+                debug_log("Attaching session to the shared AI model")
+                st.session_state.ai_tutor_model = current_tutor()
+            ai_response = st.session_state.ai_tutor_model.get_response(user_question, subject)
             
             debug_log(f"Received AI response: {ai_response[:50]}...")
             
@@ -1888,7 +2008,7 @@ def subject_specific_get_response(self, question, subject):
     """An improved response method with more precise question matching and diverse answers"""
     try:
         debug_log(f"Using enhanced subject_specific_get_response for question: '{question}' in subject: {subject}")
-        cleaned_question = question.strip().lower()
+        cleaned_question = normalize_question(question)
         request_id = str(uuid.uuid4())[:8]
         
         # Create a more comprehensive QA database for each subject
@@ -0,0 +1,143 @@
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from dataset_fetch import Fetcher, PER_HOST_LIMIT
+
+
+class StandInServer:
+    """Local HTTP server standing in for a dataset host, with set latency and failure modes
+
+    /ok/<name> answers 200 with a small JSON dataset, /flaky/<name> answers 503 for its first
+    `flaky_failures` requests and then 200, /down/<name> always answers 503 and /reset/<name>
+    drops the connection without answering.
+    """
+
+    def __init__(self, latency=0.2, flaky_failures=1):
+        self.latency = latency
+        self.flaky_failures = flaky_failures
+        self.requests = 0
+        self.connections = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._seen = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, so clients that pool connections can reuse them
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    server.in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                    seen = server._seen[self.path] = server._seen.get(self.path, 0) + 1
+                try:
+                    time.sleep(server.latency)
+                    mode = self.path.strip('/').split('/')[0]
+                    if mode == 'reset':
+                        self.close_connection = True
+                        return
+                    if mode == 'down' or (mode == 'flaky' and seen <= server.flaky_failures):
+                        self._send(503, b'{"error": "unavailable"}')
+                    else:
+                        body = json.dumps([{"question": f"What is {self.path}?", "answer": f"{self.path} is a stand-in dataset entry."}])
+                        self._send(200, body.encode('utf-8'))
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _send(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def benchmark_throughput(count, latency, per_host):
+    """Time count downloads fetched one by one with requests.get against the pooled Fetcher, over two hosts"""
+    with StandInServer(latency) as first, StandInServer(latency) as second:
+        urls = [f"{server.url}/ok/{i}" for i in range(count) for server in (first, second)]
+
+        start = time.perf_counter()
+        for url in urls:
+            requests.get(url, timeout=10)
+        sequential = time.perf_counter() - start
+        sequential_connections = first.connections + second.connections
+
+        for server in (first, second):
+            server.connections = server.max_in_flight = 0
+        fetcher = Fetcher(per_host=per_host)
+        start = time.perf_counter()
+        responses = [future.result() for future in fetcher.fetch_all(urls).values()]
+        pooled = time.perf_counter() - start
+        fetcher.close()
+
+        assert all(response.status_code == 200 for response in responses)
+        print(f"{len(urls)} downloads at {latency * 1000:.0f}ms each over 2 hosts")
+        print(f"  requests.get one by one: {sequential:.2f}s, {sequential_connections} connections")
+        print(f"  Fetcher:                 {pooled:.2f}s, {first.connections + second.connections} connections, "
+              f"at most {max(first.max_in_flight, second.max_in_flight)} in flight per host (cap {per_host})")
+
+
+def check_failures(latency):
+    """Show how the Fetcher handles a flaky host, a host that stays down and one that drops connections"""
+    with StandInServer(latency, flaky_failures=1) as server:
+        fetcher = Fetcher(backoff=0.05)
+        futures = fetcher.fetch_all([f"{server.url}/flaky/a", f"{server.url}/down/b", f"{server.url}/reset/c"])
+        for url, future in futures.items():
+            try:
+                outcome = f"status {future.result().status_code}"
+            except requests.RequestException as e:
+                outcome = f"raised {type(e).__name__}"
+            print(f"  {url.replace(server.url, ''):<10} {outcome}")
+        fetcher.close()
+        print(f"  {fetcher.stats()}, {server.requests} requests reached the server")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dataset fetch layer against a local stand-in server")
+    parser.add_argument("--downloads", type=int, default=20, help="downloads per host")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds the stand-in server takes per request")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_LIMIT, help="requests in flight per host")
+    args = parser.parse_args()
+
+    benchmark_throughput(args.downloads, args.latency, args.per_host)
+    print("Failure handling:")
+    check_failures(args.latency / 4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import argparse
+import os
+import pickle
+import random
+import time
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from inverted_index import InvertedIndex, model_rows
+from cluster_index import ClusterIndex
+from bm25 import BM25Index
+from fuzzy_index import CharNgramIndex, FUZZY_MEMORY_RATIO
+
+
+def load_questions(model_path):
+    """Load (questions, answers) from a saved (vectorizer, X, training_data) model"""
+    with open(model_path, 'rb') as f:
+        _, _, training_data = pickle.load(f)
+
+    questions, answers, _ = model_rows(training_data)
+    return questions, answers
+
+
+def synthetic_questions(count, vocabulary_size=40000, seed=42):
+    """Generate Zipf-distributed word salad questions to benchmark corpus sizes we don't have yet"""
+    rng = np.random.default_rng(seed)
+    weights = 1.0 / np.arange(1, vocabulary_size + 1) ** 1.05
+    weights /= weights.sum()
+
+    questions = []
+    for _ in range(count):
+        words = rng.choice(vocabulary_size, size=rng.integers(4, 12), p=weights)
+        questions.append(" ".join(f"term{w}" for w in words))
+    return questions, [f"Answer {i}" for i in range(count)]
+
+
+def labelled_queries(questions, count, seed=42):
+    """Sample stored questions and drop one word, returning (queries, id of the source question)"""
+    rng = random.Random(seed)
+    queries, labels = [], []
+    for question_id in rng.sample(range(len(questions)), min(count, len(questions))):
+        words = questions[question_id].split()
+        if len(words) > 2:
+            words.pop(rng.randrange(len(words)))
+        queries.append(" ".join(words))
+        labels.append(question_id)
+    return queries, labels
+
+
+def add_typo(word, rng):
+    """Apply one random deletion, transposition, substitution or insertion to a word"""
+    position = rng.randrange(len(word) - 1)
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    edit = rng.randrange(4)
+    if edit == 0:
+        return word[:position] + word[position + 1:]
+    if edit == 1:
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    if edit == 2:
+        return word[:position] + letter + word[position + 1:]
+    return word[:position] + letter + word[position:]
+
+
+def typo_queries(questions, count, typos=2, seed=42):
+    """Sample stored questions and misspell up to `typos` of their longer words, returning (queries, labels)"""
+    rng = random.Random(seed)
+    queries, labels = [], []
+    for question_id in rng.sample(range(len(questions)), min(count, len(questions))):
+        words = questions[question_id].split()
+        long_words = [i for i, word in enumerate(words) if len(word) >= 4]
+        for i in rng.sample(long_words, min(typos, len(long_words))):
+            words[i] = add_typo(words[i], rng)
+        queries.append(" ".join(words))
+        labels.append(question_id)
+    return queries, labels
+
+
+def make_queries(questions, count, seed=42):
+    """Sample stored questions and drop one word so queries are near, not exact, matches"""
+    return labelled_queries(questions, count, seed)[0]
+
+
+def timed(search, queries):
+    """Run search over every query, returning (results, mean milliseconds per query)"""
+    start = time.perf_counter()
+    results = [search(query) for query in queries]
+    elapsed = time.perf_counter() - start
+    return results, elapsed / len(queries) * 1000
+
+
+def top1(matches):
+    return matches[0][0] if matches else None
+
+
+def benchmark_clusters(questions, queries, nprobes, n_clusters=None):
+    """Report recall@1 and latency of the cluster index against exact postings search"""
+    vectorizer = TfidfVectorizer(stop_words='english')
+    X = vectorizer.fit_transform(questions)
+
+    exact = InvertedIndex(vectorizer, X, questions)
+    exact_results, exact_ms = timed(lambda q: exact.search(q, 1), queries)
+    print(f"Exact search: {exact_ms:.3f} ms/query")
+
+    start = time.perf_counter()
+    clusters = ClusterIndex(vectorizer, X, n_clusters=n_clusters)
+    print(f"Built {clusters.n_clusters} clusters in {time.perf_counter() - start:.1f}s")
+
+    expected = [top1(r) for r in exact_results]
+    for nprobe in nprobes:
+        touched = []
+
+        def search(query):
+            matches, scored = clusters.search(query, 1, nprobe=nprobe, return_touched=True)
+            touched.append(scored)
+            return matches
+
+        results, ms = timed(search, queries)
+        hits = sum(1 for got, want in zip(results, expected) if top1(got) == want)
+        print(f"nprobe={nprobe:4d}  recall@1={hits / len(queries):.3f}  {ms:.3f} ms/query  "
+              f"scored {np.mean(touched) / len(questions):.2%} of questions")
+
+
+def benchmark_bm25(questions, queries, labels):
+    """Report top-1 accuracy and latency of BM25 against TF-IDF cosine on labelled queries"""
+    vectorizer = TfidfVectorizer(stop_words='english')
+    X = vectorizer.fit_transform(questions)
+
+    for name, index_class in [("tfidf", InvertedIndex), ("bm25", BM25Index)]:
+        start = time.perf_counter()
+        index = index_class(vectorizer, X, questions)
+        build_seconds = time.perf_counter() - start
+
+        results, ms = timed(lambda q: index.search(q, 1), queries)
+        # Duplicate questions count as correct: the label only fixes the question text
+        hits = sum(1 for got, label in zip(results, labels) if top1(got) is not None and questions[top1(got)] == questions[label])
+        print(f"{name:6s}  top-1 accuracy={hits / len(queries):.3f}  {ms:.3f} ms/query  built in {build_seconds:.2f}s")
+
+
+def benchmark_typos(questions, count, typos, thresholds, word_threshold=0.3):
+    """Report top-1 accuracy on misspelled questions for word TF-IDF, character n-grams and the two-stage cascade"""
+    queries, labels = typo_queries(questions, count, typos)
+
+    vectorizer = TfidfVectorizer(stop_words='english')
+    X = vectorizer.fit_transform(questions)
+    words = InvertedIndex(vectorizer, X, questions)
+
+    start = time.perf_counter()
+    fuzzy = CharNgramIndex(questions, max_nnz=int(FUZZY_MEMORY_RATIO * X.nnz))
+    print(f"Built character n-gram index in {time.perf_counter() - start:.1f}s: "
+          f"{fuzzy.nnz} weights, {fuzzy.nnz / X.nnz:.2f}x the word index")
+
+    def correct(match, label):
+        return match is not None and questions[match[0]] == questions[label]
+
+    word_results, word_ms = timed(lambda q: words.search(q, 1), queries)
+    fuzzy_results, fuzzy_ms = timed(lambda q: fuzzy.best_matches([q])[0], queries)
+    word_top = [r[0] if r else None for r in word_results]
+    # best_matches reports a rejected or missing match as a zero score
+    fuzzy_top = [r if r[1] > 0 else None for r in fuzzy_results]
+
+    word_hits = sum(1 for match, label in zip(word_top, labels) if correct(match, label) and match[1] > word_threshold)
+    print(f"word    accuracy={word_hits / len(queries):.3f}  {word_ms:.3f} ms/query")
+    print(f"ngrams  accuracy={sum(1 for m, l in zip(fuzzy_top, labels) if correct(m, l)) / len(queries):.3f}  {fuzzy_ms:.3f} ms/query")
+
+    # The cascade only consults the n-gram index when the word score is at or below its threshold
+    second_stage = sum(1 for match in word_top if match is None or match[1] <= word_threshold)
+    for threshold in thresholds:
+        hits = wrong = 0
+        for word_match, fuzzy_match, label in zip(word_top, fuzzy_top, labels):
+            match = word_match if word_match is not None and word_match[1] > word_threshold else None
+            if match is None and fuzzy_match is not None and fuzzy_match[1] > threshold:
+                match = fuzzy_match
+            hits += correct(match, label)
+            wrong += match is not None and not correct(match, label)
+        print(f"cascade threshold={threshold:.2f}  accuracy={hits / len(queries):.3f}  wrong answers={wrong / len(queries):.3f}  "
+              f"second stage ran for {second_stage / len(queries):.1%} of queries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the AI Tutor search indexes")
+    parser.add_argument("--model", default="model/large_ai_tutor_model.pkl", help="saved (vectorizer, X, training_data) model")
+    parser.add_argument("--synthetic", type=int, default=0, help="benchmark on this many generated questions instead of a model")
+    parser.add_argument("--queries", type=int, default=500, help="number of queries to run")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    clusters_parser = subparsers.add_parser("clusters", help="approximate cluster search recall@1 vs exact search")
+    clusters_parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    clusters_parser.add_argument("--clusters", type=int, default=None, help="number of clusters (default sqrt of the corpus size)")
+
+    subparsers.add_parser("bm25", help="BM25 vs TF-IDF top-1 accuracy on queries labelled with their source question")
+
+    typos_parser = subparsers.add_parser("typos", help="character n-gram second stage on misspelled questions")
+    typos_parser.add_argument("--typos", type=int, default=2, help="misspelled words per query")
+    typos_parser.add_argument("--threshold", type=float, nargs="+", default=[0.3, 0.4, 0.5, 0.6])
+
+    args = parser.parse_args()
+
+    if args.synthetic:
+        questions, answers = synthetic_questions(args.synthetic)
+    elif os.path.exists(args.model):
+        questions, answers = load_questions(args.model)
+    else:
+        parser.error(f"Model not found at {args.model}; pass --synthetic N to use generated questions")
+
+    print(f"Benchmarking over {len(questions)} questions")
+    queries, labels = labelled_queries(questions, args.queries)
+
+    if args.benchmark == "clusters":
+        benchmark_clusters(questions, queries, args.nprobe, args.clusters)
+    elif args.benchmark == "bm25":
+        benchmark_bm25(questions, queries, labels)
+    elif args.benchmark == "typos":
+        benchmark_typos(questions, args.queries, args.typos, args.threshold)
+
+
+if __name__ == "__main__":
+    main()
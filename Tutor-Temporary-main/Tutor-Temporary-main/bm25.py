@@ -0,0 +1,59 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.preprocessing import normalize
+from inverted_index import InvertedIndex
+
+# Term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def bm25_idf(counts):
+    """Per term BM25 inverse document frequency (the non-negative Lucene variant)"""
+    num_docs = counts.shape[0]
+    df = np.bincount(counts.indices, minlength=counts.shape[1])
+    return np.log1p((num_docs - df + 0.5) / (df + 0.5))
+
+
+class BM25Index(InvertedIndex):
+    """BM25 ranking over the same postings layout as InvertedIndex
+
+    Postings hold the saturated, length-normalized term frequency of each question and the query
+    row holds the IDF of each query term, so one sparse product still scores a whole batch. Scores
+    are divided by the query's total IDF: a question holding every query term once at average length
+    scores 1, which keeps the cosine thresholds meaningful.
+    """
+
+    def __init__(self, vectorizer, X, questions, answers=None, subjects=None, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+
+        # BM25 needs raw term counts, so recount the questions with the vectorizer's own analyzer and vocabulary
+        self.counter = CountVectorizer(analyzer=vectorizer.build_analyzer(), vocabulary=vectorizer.vocabulary_)
+        counts = self.counter.transform(questions).tocsr()
+        if counts.shape[0] != X.shape[0]:
+            raise ValueError(f"Model matrix has {X.shape[0]} rows but {counts.shape[0]} questions were given")
+
+        # Precomputed once: question lengths in terms and per term IDF
+        self.doc_lengths = np.asarray(counts.sum(axis=1)).ravel().astype(np.float32)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+        self.idf = bm25_idf(counts).astype(np.float32)
+
+        super().__init__(vectorizer, counts, questions, answers, subjects)
+
+    def _posting_weights(self, counts):
+        """Saturated, length-normalized term frequencies, with the same sparsity as the counts"""
+        counts = counts.astype(np.float32)
+        row_lengths = np.repeat(self.doc_lengths, np.diff(counts.indptr))
+        length_norm = 1 - self.b + self.b * row_lengths / (self.avg_doc_length or 1.0)
+        tf = counts.data
+        weights = counts.copy()
+        weights.data = tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+        return weights
+
+    def query_matrix(self, texts):
+        """One row per query with the IDF of each distinct query term, scaled to sum to 1"""
+        present = self.counter.transform(texts)
+        present.data[:] = 1
+        return normalize(present.astype(np.float32) @ sp.diags(self.idf), norm='l1')
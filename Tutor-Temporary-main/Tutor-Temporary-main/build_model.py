@@ -0,0 +1,132 @@
+import argparse
+import importlib
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+from download_large_dataset import download_large_datasets
+from answer_graph import write_answer_graph
+from incremental_model import IncrementalTfidf, counts_path, load_counts, write_model_atomically
+from qa_store import qa_dictionaries
+from response_cache import model_file_version
+
+# Subject -> (dataset script, function collecting its QA pairs, function fitting its subject-only model, where that model is saved)
+SUBJECT_BUILDERS = {
+    "Mathematics": ('create_math_dataset', 'collect_math_pairs', 'build_math_model', 'model/math_model.pkl'),
+    "Science": ('create_science_dataset', 'collect_science_pairs', 'build_science_model', 'model/science_model.pkl'),
+    "History": ('create_history_dataset', 'collect_history_pairs', 'build_history_model', 'model/history_model.pkl'),
+    "Programming": ('create_programming_dataset', 'collect_programming_pairs', 'build_programming_model', 'model/programming_model.pkl'),
+}
+
+BASE_MODEL_PATH = 'model/ai_tutor_model.pkl'
+LARGE_MODEL_PATH = 'model/large_ai_tutor_model.pkl'
+
+
+def save_model(path, counts, training_data):
+    """Write the model weighted from counts, plus the counts that later incremental updates start from"""
+    write_model_atomically(path, counts.vectorizer(), counts.matrix(), training_data)
+    # Tied to the new file's version, so counts left over from an interrupted build are never used
+    counts.save(counts_path(path), model_file_version(path))
+
+
+def download_stage():
+    """Download the base dataset for every subject and count its terms; runs in a worker process"""
+    start = time.perf_counter()
+    training_data = download_large_datasets()
+    collected = time.perf_counter()
+    counts = IncrementalTfidf.fit(training_data)
+    return training_data, counts, None, {"collect": collected - start, "vectorize": time.perf_counter() - collected}
+
+
+def existing_base_stage(model_path):
+    """Use a saved model as the base instead of downloading one; runs in a worker process"""
+    start = time.perf_counter()
+    with open(model_path, 'rb') as f:
+        vectorizer, _, training_data = pickle.load(f)
+    collected = time.perf_counter()
+    counts = load_counts(model_path) or IncrementalTfidf.fit(training_data, vectorizer)
+    return training_data, counts, None, {"collect": collected - start, "vectorize": time.perf_counter() - collected}
+
+
+def subject_stage(subject):
+    """Collect one subject's QA pairs, fit its subject-only model and count its terms; runs in a worker process
+
+    Nothing is written here; main() saves the subject-only model once every stage has succeeded.
+    """
+    module_name, collect_name, build_name, _ = SUBJECT_BUILDERS[subject]
+    module = importlib.import_module(module_name)
+
+    start = time.perf_counter()
+    qa_pairs = getattr(module, collect_name)()
+    collected = time.perf_counter()
+    subject_model = getattr(module, build_name)(qa_pairs)
+    training_data = subject_model[2]
+    counts = IncrementalTfidf.fit(training_data)
+    return training_data, counts, subject_model, {"collect": collected - start, "vectorize": time.perf_counter() - collected}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the combined model, collecting and vectorizing every subject in parallel")
+    parser.add_argument("--subjects", nargs='+', choices=list(SUBJECT_BUILDERS), default=list(SUBJECT_BUILDERS), help="subjects to rebuild")
+    parser.add_argument("--skip-download", action="store_true", help="start from the saved combined (or base) model instead of downloading the base again")
+    parser.add_argument("--base", default=BASE_MODEL_PATH, help="where the downloaded base (vectorizer, X, training_data) model is written")
+    parser.add_argument("--output", default=LARGE_MODEL_PATH, help="where to write the combined model")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per stage, since collecting mostly waits on downloads)")
+    args = parser.parse_args()
+
+    os.makedirs("model", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+
+    # The base stage runs alongside the subjects; results are merged in this order whatever finishes first
+    if args.skip_download:
+        # Rebuilding a few subjects keeps the rest of the combined model, as running their create_* scripts would
+        existing_path = args.output if os.path.exists(args.output) else args.base
+        if not os.path.exists(existing_path):
+            parser.error(f"--skip-download needs an existing model at {args.output} or {args.base}")
+        stages = [("existing", existing_base_stage, (existing_path,))]
+    else:
+        stages = [("download", download_stage, ())]
+    stages += [(subject, subject_stage, (subject,)) for subject in args.subjects]
+    workers = args.workers or len(stages)
+
+    start = time.perf_counter()
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: pool.submit(function, *function_args) for name, function, function_args in stages}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                # Nothing has been written yet, so the old models stay in place
+                raise SystemExit(f"Stage {name} failed: {str(e)}; no model was written")
+    stages_done = time.perf_counter()
+
+    # Merge once: subjects replace their part of the base in place, new subjects go at the end
+    base_data, base_counts, _, _ = results[stages[0][0]]
+    training_data = dict(base_data)
+    for subject in args.subjects:
+        training_data[subject] = results[subject][0][subject]
+    counts = IncrementalTfidf.combine([base_counts] + [results[subject][1] for subject in args.subjects])
+    merged = time.perf_counter()
+
+    for subject in args.subjects:
+        write_model_atomically(SUBJECT_BUILDERS[subject][3], *results[subject][2])
+    if not args.skip_download:
+        save_model(args.base, base_counts, base_data)
+        # aimodel.py reads the base model; its answer graph is tied to the file just written
+        write_answer_graph(args.base, qa_dictionaries(base_data))
+    save_model(args.output, counts, training_data)
+    written = time.perf_counter()
+
+    print(f"\n{'stage':<14}{'collect':>10}{'vectorize':>11}")
+    for name, _, _ in stages:
+        timings = results[name][3]
+        print(f"{name:<14}{timings['collect']:>9.2f}s{timings['vectorize']:>10.2f}s")
+    sequential = sum(sum(results[name][3].values()) for name, _, _ in stages)
+    print(f"Stages took {stages_done - start:.2f}s on {workers} workers ({sequential:.2f}s one after another), "
+          f"merge {merged - stages_done:.2f}s, write {written - merged:.2f}s")
+    print(f"Saved {len(counts)} questions across {len(training_data)} subjects to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
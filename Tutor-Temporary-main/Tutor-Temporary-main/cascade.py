@@ -0,0 +1,99 @@
+import logging
+import time
+from collections import namedtuple
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Weight of the newest timing in each stage's running latency estimate
+LATENCY_SMOOTHING = 0.2
+
+Candidate = namedtuple('Candidate', ['answer', 'confidence', 'stage'])
+
+
+class Stage:
+    """One retrieval step: a callable returning an answer or None, its expected cost and how far its answers are trusted"""
+
+    def __init__(self, name, run, cost_ms, confidence, skip_on_error=False):
+        self.name = name
+        self.run = run
+        self.cost_ms = cost_ms
+        self.confidence = confidence
+        # Index stages can fail on odd input; rule stages raising means a bug, so those propagate
+        self.skip_on_error = skip_on_error
+
+        # Running latency estimate, seeded with the declared cost; like the counters, approximate
+        # when sessions share one cascade concurrently
+        self.expected_ms = cost_ms
+        self.runs = 0
+        self.answers = 0
+
+    def record(self, elapsed_ms, answered):
+        self.runs += 1
+        self.answers += answered
+        self.expected_ms += LATENCY_SMOOTHING * (elapsed_ms - self.expected_ms)
+
+
+class RetrievalCascade:
+    """Run stages cheapest first, stop at the first confident answer or, once any answer was found, when the time budget runs out"""
+
+    def __init__(self, stages, exit_confidence=0.5, budget_ms=None, clock=time.perf_counter):
+        # Stable sort: stages with the same cost keep their configured order
+        self.stages = sorted(stages, key=lambda stage: stage.cost_ms)
+        self.exit_confidence = exit_confidence
+        self.budget_ms = budget_ms
+        self.clock = clock
+        self.budget_exhausted = 0
+
+    def run(self, query):
+        """Return (best Candidate or None, [(stage name, milliseconds, outcome), ...], whether the budget cut the run short)"""
+        start = self.clock()
+        best = None
+        trace = []
+        over_budget = False
+
+        for stage in self.stages:
+            # Skip the rest once the next stage is expected to overrun the request's budget. Only once
+            # something answered: the estimates are shared by every session, so one slow run elsewhere
+            # must not turn this request into the canned fallback
+            if self.budget_ms is not None and best is not None:
+                elapsed_ms = (self.clock() - start) * 1000
+                if elapsed_ms + stage.expected_ms > self.budget_ms:
+                    self.budget_exhausted += 1
+                    # Drift back toward the declared cost so one slow run can't lock a stage out for good
+                    stage.expected_ms += LATENCY_SMOOTHING * (stage.cost_ms - stage.expected_ms)
+                    trace.append((stage.name, 0.0, "over budget"))
+                    over_budget = True
+                    break
+
+            stage_start = self.clock()
+            try:
+                answer = stage.run(query)
+                outcome = "miss" if answer is None else "answer"
+            except Exception as e:
+                if not stage.skip_on_error:
+                    raise
+                logger.debug(f"Stage {stage.name} failed: {str(e)}")
+                answer, outcome = None, "error"
+
+            stage_ms = (self.clock() - stage_start) * 1000
+            stage.record(stage_ms, answer is not None)
+            trace.append((stage.name, stage_ms, outcome))
+
+            if answer is None:
+                continue
+
+            # Keep the most trusted answer seen so far; a confident one ends the cascade
+            if best is None or stage.confidence > best.confidence:
+                best = Candidate(answer, stage.confidence, stage.name)
+            if stage.confidence >= self.exit_confidence:
+                break
+
+        return best, trace, over_budget
+
+    def stats(self):
+        """Per stage run and answer counts and current latency estimate"""
+        return {
+            stage.name: {"runs": stage.runs, "answers": stage.answers, "expected_ms": stage.expected_ms}
+            for stage in self.stages
+        }
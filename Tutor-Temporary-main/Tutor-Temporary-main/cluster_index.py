@@ -0,0 +1,113 @@
+import logging
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+
+def spherical_kmeans(X, n_clusters, n_iter=10, seed=42, chunk_size=10000):
+    """Cluster L2-normalized sparse rows by cosine similarity, returning (centroids, labels)"""
+    rng = np.random.default_rng(seed)
+    num_rows = X.shape[0]
+
+    # Start from distinct random rows
+    seeds = rng.choice(num_rows, size=n_clusters, replace=False)
+    centroids = X[seeds].tocsr()
+    labels = np.zeros(num_rows, dtype=np.int32)
+
+    for iteration in range(n_iter):
+        # Assign every row to its most similar centroid, a chunk at a time to bound memory
+        new_labels = np.empty(num_rows, dtype=np.int32)
+        centroids_t = centroids.T.tocsc()
+        for start in range(0, num_rows, chunk_size):
+            sims = (X[start:start + chunk_size] @ centroids_t).toarray()
+            new_labels[start:start + chunk_size] = sims.argmax(axis=1)
+
+        changed = int((new_labels != labels).sum()) if iteration else num_rows
+        labels = new_labels
+
+        # New centroid = normalized sum of its members
+        membership = sp.csr_matrix((np.ones(num_rows), (labels, np.arange(num_rows))), shape=(n_clusters, num_rows))
+        centroids = normalize(membership @ X, norm='l2').tocsr()
+
+        # Re-seed empty clusters with random rows so every centroid stays usable
+        sizes = np.bincount(labels, minlength=n_clusters)
+        empty = np.flatnonzero(sizes == 0)
+        if len(empty):
+            centroids = sp.vstack([centroids[i] if sizes[i] else X[rng.integers(num_rows)] for i in range(n_clusters)]).tocsr()
+
+        logger.debug(f"Spherical k-means iteration {iteration + 1}: {changed} rows changed cluster, {len(empty)} empty clusters")
+        if changed == 0:
+            break
+
+    return centroids, labels
+
+
+class ClusterIndex:
+    """Approximate TF-IDF search that only scores the questions in the nprobe nearest clusters"""
+
+    def __init__(self, vectorizer, X, n_clusters=None, nprobe=8, n_iter=10, seed=42):
+        self.vectorizer = vectorizer
+        self.nprobe = nprobe
+        self.num_docs = X.shape[0]
+
+        matrix = normalize(X, norm='l2').tocsr()
+
+        # Roughly sqrt(n) clusters keeps both the centroid scan and each probe small
+        if n_clusters is None:
+            n_clusters = int(np.sqrt(self.num_docs))
+        n_clusters = max(1, min(n_clusters, self.num_docs))
+
+        centroids, labels = spherical_kmeans(matrix, n_clusters, n_iter=n_iter, seed=seed)
+
+        # Term x cluster layout so scoring centroids only reads the query's terms
+        self.centroid_postings = centroids.T.tocsr()
+
+        # Split the rows by cluster up front so a probe never slices the full matrix
+        sizes = np.bincount(labels, minlength=n_clusters)
+        self.cluster_docs = np.split(np.argsort(labels, kind='stable'), np.cumsum(sizes)[:-1])
+        self.cluster_rows = [matrix[docs] for docs in self.cluster_docs]
+
+        logger.debug(f"Built cluster index with {n_clusters} clusters over {self.num_docs} questions")
+
+    @property
+    def n_clusters(self):
+        return self.centroid_postings.shape[1]
+
+    def search(self, text, k=5, nprobe=None, return_touched=False):
+        """Return up to k (question id, score) pairs from the nearest clusters, best first
+
+        With return_touched, return (pairs, number of documents scored) instead.
+        """
+        results, touched = self.search_many([text], k, nprobe, return_touched=True)
+        return (results[0], touched[0]) if return_touched else results[0]
+
+    def search_many(self, texts, k=5, nprobe=None, return_touched=False):
+        """Run search for every text with a single transform
+
+        With return_touched, return (results, documents scored per text) instead.
+        """
+        nprobe = min(nprobe or self.nprobe, self.n_clusters)
+        query_matrix = self.vectorizer.transform(texts).tocsr()
+        centroid_scores = (query_matrix @ self.centroid_postings).toarray()
+
+        results = []
+        touched = []
+        for row in range(query_matrix.shape[0]):
+            # Probe the clusters whose centroids are closest to the query
+            probes = np.argpartition(-centroid_scores[row], nprobe - 1)[:nprobe]
+            query_vector = query_matrix[row].toarray().ravel()
+
+            # Each cluster's rows are their own small CSR block, so a probe is one mat-vec
+            docs = np.concatenate([self.cluster_docs[c] for c in probes])
+            scores = np.concatenate([self.cluster_rows[c] @ query_vector for c in probes])
+            touched.append(len(docs))
+
+            # Drop questions that share no term with the query, like the exact postings search
+            keep = scores > 0
+            docs, scores = docs[keep], scores[keep]
+            order = np.lexsort((docs, -scores))[:k]
+            results.append([(int(docs[i]), float(scores[i])) for i in order])
+        return (results, touched) if return_touched else results
@@ -1,14 +1,9 @@
 import os
 import pickle
 import json
-import requests
 from sklearn.feature_extraction.text import TfidfVectorizer
-
-print("Creating enhanced history dataset...")
-
-# Create necessary directories
-os.makedirs("model", exist_ok=True)
-os.makedirs("data", exist_ok=True)
+from dataset_fetch import fetch_all
+from incremental_model import update_model
 
 # Ancient history QA pairs
 ancient_history_qa = [
@@ -55,118 +50,135 @@ us_history_qa = [
     ("What was the Civil Rights Movement?", "The Civil Rights Movement was a decades-long struggle by African Americans and their allies to end institutionalized racial discrimination, disenfranchisement, and racial segregation in the United States. While the movement spans from the late 19th century to the present day, its most intense period occurred from the 1950s through the late 1960s. The movement was characterized by nonviolent protest, civil disobedience, litigation, and grassroots organizing, though more militant approaches also emerged. Key events and milestones included: the 1954 Supreme Court decision in Brown v. Board of Education, which declared segregation in public schools unconstitutional; the Montgomery Bus Boycott (1955-1956), sparked by Rosa Parks' refusal to give up her seat to a white passenger; the Little Rock Nine's integration of Central High School (1957); student sit-ins at segregated lunch counters beginning in 1960; the Freedom Rides challenging segregation in interstate transportation (1961); the March on Washington (1963), where Martin Luther King Jr. delivered his 'I Have a Dream' speech; the Civil Rights Act of 1964, outlawing discrimination based on race, color, religion, sex, or national origin; the Voting Rights Act of 1965, prohibiting racial discrimination in voting; and the Fair Housing Act of 1968. Prominent leaders included Martin Luther King Jr., who advocated nonviolent resistance; Malcolm X, who promoted Black nationalism and self-defense; Rosa Parks; John Lewis; Medgar Evers; Bayard Rustin; Ella Baker; Thurgood Marshall; and organizations like the NAACP, SCLC, SNCC, and CORE. The movement achieved significant legal victories and transformed American society, though racial inequality persists in many areas. Its tactics, philosophy, and moral authority have inspired numerous other social justice movements worldwide."),
 ]
 
-# Combined history QA pairs
-history_qa_pairs = ancient_history_qa + medieval_history_qa + modern_history_qa + indian_history_qa + us_history_qa
 
-# Try to download additional data from external sources
-try:
-    print("Attempting to download additional history datasets...")
-    
-    # Try to fetch additional historical content
-    history_urls = [
-        "https://raw.githubusercontent.com/manindersingh030/HistoryGPT-Dataset/main/data-sample.json"
-    ]
-    
-    for url in history_urls:
-        try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if isinstance(data, list):
-                        for item in data[:20]:  # Limit to first 20 items
-                            if 'query' in item and 'response' in item:
-                                q = item.get('query', '')
-                                a = item.get('response', '')
-                                
-                                if len(q) > 10 and len(a) > 20:  # Ensure reasonable length
-                                    history_qa_pairs.append((q, a))
-                    elif isinstance(data, dict) and 'data' in data:
-                        for item in data.get('data', [])[:20]:
-                            if 'question' in item and 'answer' in item:
-                                q = item.get('question', '')
-                                a = item.get('answer', '')
-                                if len(q) > 10 and len(a) > 20:
-                                    history_qa_pairs.append((q, a))
-                    
-                    print(f"Successfully processed data from {url}")
-                except json.JSONDecodeError:
-                    print(f"Could not parse JSON from {url}")
-            else:
-                print(f"Failed to download from {url}, status code: {response.status_code}")
-        except Exception as e:
-            print(f"Error processing {url}: {str(e)}")
-    
-    # Add fallback history topics as a backup
-    history_events = [
-        "French Revolution", "Russian Revolution", "Ancient Greece", "Maya Civilization", 
-        "Ottoman Empire", "Samurai", "Vikings", "Roman Republic", "Ming Dynasty", "Aztec Empire"
-    ]
+def collect_history_pairs():
+    """Return the predefined history QA pairs plus any that the extra sources provide"""
+    # Combined history QA pairs
+    history_qa_pairs = ancient_history_qa + medieval_history_qa + modern_history_qa + indian_history_qa + us_history_qa
+
+    # Try to download additional data from external sources
+    try:
+        print("Attempting to download additional history datasets...")
+        
+        # Try to fetch additional historical content
+        history_urls = [
+            "https://raw.githubusercontent.com/manindersingh030/HistoryGPT-Dataset/main/data-sample.json"
+        ]
+        
+        # Download every source at once over the shared connection pool
+        responses = fetch_all(history_urls)
+        for url in history_urls:
+            try:
+                response = responses[url].result()
+                if response.status_code == 200:
+                    try:
+                        data = response.json()
+                        if isinstance(data, list):
+                            for item in data[:20]:  # Limit to first 20 items
+                                if 'query' in item and 'response' in item:
+                                    q = item.get('query', '')
+                                    a = item.get('response', '')
+                                    
+                                    if len(q) > 10 and len(a) > 20:  # Ensure reasonable length
+                                        history_qa_pairs.append((q, a))
+                        elif isinstance(data, dict) and 'data' in data:
+                            for item in data.get('data', [])[:20]:
+                                if 'question' in item and 'answer' in item:
+                                    q = item.get('question', '')
+                                    a = item.get('answer', '')
+                                    if len(q) > 10 and len(a) > 20:
+                                        history_qa_pairs.append((q, a))
+                        
+                        print(f"Successfully processed data from {url}")
+                    except json.JSONDecodeError:
+                        print(f"Could not parse JSON from {url}")
+                else:
+                    print(f"Failed to download from {url}, status code: {response.status_code}")
+            except Exception as e:
+                print(f"Error processing {url}: {str(e)}")
+        
+        # Add fallback history topics as a backup
+        history_events = [
+            "French Revolution", "Russian Revolution", "Ancient Greece", "Maya Civilization", 
+            "Ottoman Empire", "Samurai", "Vikings", "Roman Republic", "Ming Dynasty", "Aztec Empire"
+        ]
+        
+        for event in history_events:
+            question = f"What was the {event}?"
+            answer = f"The {event} was a significant historical period or entity that played an important role in shaping world history. It involved key figures, social structures, and events that influenced subsequent historical developments and continues to be studied by historians for its impact on human civilization."
+            history_qa_pairs.append((question, answer))
+        
+        print(f"Added {len(history_events)} basic history topic definitions")
+
+    except Exception as e:
+        print(f"Error downloading additional datasets: {str(e)}")
+        print("Using only the predefined QA pairs...")
     
-    for event in history_events:
-        question = f"What was the {event}?"
-        answer = f"The {event} was a significant historical period or entity that played an important role in shaping world history. It involved key figures, social structures, and events that influenced subsequent historical developments and continues to be studied by historians for its impact on human civilization."
-        history_qa_pairs.append((question, answer))
+    return history_qa_pairs
+
+
+def build_history_model(history_qa_pairs):
+    """Fit the history-only model without writing it; returns (vectorizer, X, training_data)"""
+    # Create a history-specific dataset
+    print(f"Creating history dataset with {len(history_qa_pairs)} QA pairs")
+
+    # Prepare the dataset structure
+    history_training_data = {"History": []}
+    for question, answer in history_qa_pairs:
+        history_training_data["History"].append(question)
+        history_training_data["History"].append(answer)
+
+    # Create a TF-IDF vectorizer
+    vectorizer = TfidfVectorizer()
+    all_questions = [q for q in history_training_data["History"][::2]]
+    X = vectorizer.fit_transform(all_questions)
+    return vectorizer, X, history_training_data
+
+
+def create_history_model(history_qa_pairs):
+    """Save the history-only model and return its training data"""
+    vectorizer, X, history_training_data = build_history_model(history_qa_pairs)
+
+    # Save the model components
+    model_path = 'model/history_model.pkl'
+    with open(model_path, 'wb') as f:
+        pickle.dump((vectorizer, X, history_training_data), f)
+
+    print(f"History model successfully created and saved to {model_path}")
+    print(f"Dataset contains {X.shape[0]} questions")
     
-    print(f"Added {len(history_events)} basic history topic definitions")
-
-except Exception as e:
-    print(f"Error downloading additional datasets: {str(e)}")
-    print("Using only the predefined QA pairs...")
-
-# Create a history-specific dataset
-print(f"Creating history dataset with {len(history_qa_pairs)} QA pairs")
-
-# Prepare the dataset structure
-history_training_data = {"History": []}
-for question, answer in history_qa_pairs:
-    history_training_data["History"].append(question)
-    history_training_data["History"].append(answer)
-
-# Create a TF-IDF vectorizer
-vectorizer = TfidfVectorizer()
-all_questions = [q for q in history_training_data["History"][::2]]
-X = vectorizer.fit_transform(all_questions)
-
-# Save the model components
-model_path = 'model/history_model.pkl'
-with open(model_path, 'wb') as f:
-    pickle.dump((vectorizer, X, history_training_data), f)
-
-print(f"History model successfully created and saved to {model_path}")
-print(f"Dataset contains {len(all_questions)} questions")
-
-# Merge with existing AI tutor model
-try:
-    existing_model_path = 'model/large_ai_tutor_model.pkl'
-    if os.path.exists(existing_model_path):
-        print("Found existing large AI tutor model, merging history data...")
-        
-        with open(existing_model_path, 'rb') as f:
-            existing_model_data = pickle.load(f)
-            
-        if isinstance(existing_model_data, tuple) and len(existing_model_data) == 3:
-            combined_vectorizer, combined_X, combined_training_data = existing_model_data
-            
-            # Merge history data with existing data
-            combined_training_data["History"] = history_training_data["History"]
+    return history_training_data
+
+
+def merge_into_large_model(history_training_data):
+    """Add or replace the history subject of the combined model"""
+    # Merge with existing AI tutor model
+    try:
+        existing_model_path = 'model/large_ai_tutor_model.pkl'
+        if os.path.exists(existing_model_path):
+            print("Found existing large AI tutor model, merging history data...")
             
-            # Create a new combined vectorizer and feature matrix
-            combined_questions = []
-            for subject, qa_list in combined_training_data.items():
-                combined_questions.extend(qa_list[::2])
-                
-            new_vectorizer = TfidfVectorizer()
-            new_X = new_vectorizer.fit_transform(combined_questions)
+            # Only the history questions are tokenized; the rest of the model is re-weighted from its stored term counts
+            new_vectorizer, new_X, combined_training_data = update_model(existing_model_path, {"History": history_training_data["History"]})
             
-            # Save the combined model
-            with open(existing_model_path, 'wb') as f:
-                pickle.dump((new_vectorizer, new_X, combined_training_data), f)
-                
             print(f"Combined model successfully updated at {existing_model_path}")
-            print(f"Combined dataset now contains {len(combined_questions)} questions across {len(combined_training_data)} subjects")
-except Exception as e:
-    print(f"Error merging with existing model: {str(e)}")
-    print("History-only model was still created successfully.")
+            print(f"Combined dataset now contains {new_X.shape[0]} questions across {len(combined_training_data)} subjects")
+    except Exception as e:
+        print(f"Error merging with existing model: {str(e)}")
+        print("History-only model was still created successfully.")
+
+
+def main():
+    print("Creating enhanced history dataset...")
+
+    # Create necessary directories
+    os.makedirs("model", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+    
+    history_training_data = create_history_model(collect_history_pairs())
+    merge_into_large_model(history_training_data)
+    print("Done! Run the app.py file to start using the enhanced history model.")
+
 
-print("Done! Run the app.py file to start using the enhanced history model.") 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
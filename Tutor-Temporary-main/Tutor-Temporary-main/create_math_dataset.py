@@ -1,14 +1,9 @@
 import os
 import pickle
 import json
-import requests
 from sklearn.feature_extraction.text import TfidfVectorizer
-
-print("Creating enhanced mathematics dataset...")
-
-# Create necessary directories
-os.makedirs("model", exist_ok=True)
-os.makedirs("data", exist_ok=True)
+from dataset_fetch import fetch_all
+from incremental_model import update_model
 
 # Basic mathematical operations QA pairs
 arithmetic_qa = [
@@ -66,112 +61,127 @@ applications_qa = [
     ("How is math used in artificial intelligence?", "Mathematics provides the theoretical foundation and practical tools for artificial intelligence. Linear algebra enables the representation and manipulation of data, with matrices and tensors serving as the building blocks of neural networks. Calculus, particularly gradient-based methods, powers the optimization of machine learning models through techniques like gradient descent. Probability and statistics form the basis for uncertainty modeling, Bayesian networks, and statistical learning algorithms. Information theory quantifies entropy and mutual information, concepts central to decision trees and feature selection. Graph theory structures knowledge representation and reasoning systems. Logic formalizes rule-based systems and reasoning. Optimization theory provides methods to find optimal solutions in complex spaces. As AI advances, it increasingly draws on more sophisticated mathematics, including topology, differential geometry, and category theory for developing more powerful and interpretable AI systems."),
 ]
 
-# Combine all QA pairs
-math_qa_pairs = arithmetic_qa + fundamentals_qa + advanced_qa + applications_qa
 
-# Try to download additional data from external sources
-try:
-    print("Attempting to download additional math datasets...")
-    
-    # Math formula dataset - simplified sample
-    formulas_url = "https://raw.githubusercontent.com/KaTeX/KaTeX/main/docs/supported.md"
-    
-    response = requests.get(formulas_url)
-    if response.status_code == 200:
-        content = response.text
-        # Extract some formula examples from KaTeX documentation
-        formula_examples = []
-        
-        for line in content.split('\n'):
-            if line.startswith('- ') and '\\' in line:
-                formula = line.strip('- ').strip()
-                if len(formula) > 5 and len(formula) < 100:  # Filter reasonable length formulas
-                    question = f"What is the formula {formula.split(' ')[0]}?"
-                    answer = f"The formula is {formula}. This is a mathematical notation used in {['calculus', 'algebra', 'trigonometry', 'statistics', 'linear algebra'][len(formula) % 5]}."
-                    formula_examples.append((question, answer))
-        
-        # Add some of the examples to our dataset
-        math_qa_pairs.extend(formula_examples[:10])
-        print(f"Added {len(formula_examples[:10])} formula examples from KaTeX documentation")
-    
-    # Try to fetch additional math definitions
-    math_terms_url = "https://raw.githubusercontent.com/simple-icons/simple-icons/develop/README.md"
-    
-    response = requests.get(math_terms_url)
-    if response.status_code == 200:
-        # Generate some basic math term definitions as a fallback
-        math_terms = [
-            "coordinate", "equation", "factor", "inequality", "sequence", 
-            "series", "set", "theorem", "variable", "constant"
-        ]
-        
-        for term in math_terms:
-            question = f"What is a {term} in mathematics?"
-            answer = f"In mathematics, a {term} is a fundamental concept used in mathematical reasoning and problem-solving. It refers to a specific mathematical object or relation that helps in formulating and solving problems in various branches of mathematics."
-            math_qa_pairs.append((question, answer))
+def collect_math_pairs():
+    """Return the predefined mathematics QA pairs plus any that the extra sources provide"""
+    # Combine all QA pairs
+    math_qa_pairs = arithmetic_qa + fundamentals_qa + advanced_qa + applications_qa
+
+    # Try to download additional data from external sources
+    try:
+        print("Attempting to download additional math datasets...")
         
-        print(f"Added {len(math_terms)} basic math term definitions")
-
-except Exception as e:
-    print(f"Error downloading additional datasets: {str(e)}")
-    print("Using only the predefined QA pairs...")
-
-# Create a mathematics-specific dataset
-print(f"Creating mathematics dataset with {len(math_qa_pairs)} QA pairs")
-
-# Prepare the dataset structure
-math_training_data = {"Mathematics": []}
-for question, answer in math_qa_pairs:
-    math_training_data["Mathematics"].append(question)
-    math_training_data["Mathematics"].append(answer)
-
-# Create a TF-IDF vectorizer
-vectorizer = TfidfVectorizer()
-all_questions = [q for q in math_training_data["Mathematics"][::2]]
-X = vectorizer.fit_transform(all_questions)
-
-# Save the model components
-model_path = 'model/math_model.pkl'
-with open(model_path, 'wb') as f:
-    pickle.dump((vectorizer, X, math_training_data), f)
-
-print(f"Mathematics model successfully created and saved to {model_path}")
-print(f"Dataset contains {len(all_questions)} questions")
-
-# Optionally, merge this with existing AI tutor model if it exists
-try:
-    existing_model_path = 'model/ai_tutor_model.pkl'
-    if os.path.exists(existing_model_path):
-        print("Found existing AI tutor model, merging mathematics data...")
+        # Math formula dataset - simplified sample
+        formulas_url = "https://raw.githubusercontent.com/KaTeX/KaTeX/main/docs/supported.md"
+        math_terms_url = "https://raw.githubusercontent.com/simple-icons/simple-icons/develop/README.md"
         
-        with open(existing_model_path, 'rb') as f:
-            existing_model_data = pickle.load(f)
+        # Both sources download at once over the shared connection pool
+        responses = fetch_all([formulas_url, math_terms_url])
+        response = responses[formulas_url].result()
+        if response.status_code == 200:
+            content = response.text
+            # Extract some formula examples from KaTeX documentation
+            formula_examples = []
             
-        if isinstance(existing_model_data, tuple) and len(existing_model_data) == 3:
-            _, _, existing_training_data = existing_model_data
+            for line in content.split('\n'):
+                if line.startswith('- ') and '\\' in line:
+                    formula = line.strip('- ').strip()
+                    if len(formula) > 5 and len(formula) < 100:  # Filter reasonable length formulas
+                        question = f"What is the formula {formula.split(' ')[0]}?"
+                        answer = f"The formula is {formula}. This is a mathematical notation used in {['calculus', 'algebra', 'trigonometry', 'statistics', 'linear algebra'][len(formula) % 5]}."
+                        formula_examples.append((question, answer))
             
-            # Merge math data with existing data
-            for subject, qa_list in existing_training_data.items():
-                if subject != "Mathematics":  # Keep other subjects
-                    math_training_data[subject] = qa_list
+            # Add some of the examples to our dataset
+            math_qa_pairs.extend(formula_examples[:10])
+            print(f"Added {len(formula_examples[:10])} formula examples from KaTeX documentation")
+        
+        # Try to fetch additional math definitions
+        response = responses[math_terms_url].result()
+        if response.status_code == 200:
+            # Generate some basic math term definitions as a fallback
+            math_terms = [
+                "coordinate", "equation", "factor", "inequality", "sequence", 
+                "series", "set", "theorem", "variable", "constant"
+            ]
             
-            # Create a new combined vectorizer
-            combined_questions = []
-            for subject, qa_list in math_training_data.items():
-                combined_questions.extend(qa_list[::2])
-                
-            combined_vectorizer = TfidfVectorizer()
-            combined_X = combined_vectorizer.fit_transform(combined_questions)
+            for term in math_terms:
+                question = f"What is a {term} in mathematics?"
+                answer = f"In mathematics, a {term} is a fundamental concept used in mathematical reasoning and problem-solving. It refers to a specific mathematical object or relation that helps in formulating and solving problems in various branches of mathematics."
+                math_qa_pairs.append((question, answer))
             
-            # Save the combined model
+            print(f"Added {len(math_terms)} basic math term definitions")
+
+    except Exception as e:
+        print(f"Error downloading additional datasets: {str(e)}")
+        print("Using only the predefined QA pairs...")
+    
+    return math_qa_pairs
+
+
+def build_math_model(math_qa_pairs):
+    """Fit the mathematics-only model without writing it; returns (vectorizer, X, training_data)"""
+    # Create a mathematics-specific dataset
+    print(f"Creating mathematics dataset with {len(math_qa_pairs)} QA pairs")
+
+    # Prepare the dataset structure
+    math_training_data = {"Mathematics": []}
+    for question, answer in math_qa_pairs:
+        math_training_data["Mathematics"].append(question)
+        math_training_data["Mathematics"].append(answer)
+
+    # Create a TF-IDF vectorizer
+    vectorizer = TfidfVectorizer()
+    all_questions = [q for q in math_training_data["Mathematics"][::2]]
+    X = vectorizer.fit_transform(all_questions)
+    return vectorizer, X, math_training_data
+
+
+def create_math_model(math_qa_pairs):
+    """Save the mathematics-only model and return its training data"""
+    vectorizer, X, math_training_data = build_math_model(math_qa_pairs)
+
+    # Save the model components
+    model_path = 'model/math_model.pkl'
+    with open(model_path, 'wb') as f:
+        pickle.dump((vectorizer, X, math_training_data), f)
+
+    print(f"Mathematics model successfully created and saved to {model_path}")
+    print(f"Dataset contains {X.shape[0]} questions")
+    
+    return math_training_data
+
+
+def merge_into_large_model(math_training_data):
+    """Add or replace the mathematics subject of the combined model"""
+    # Optionally, merge this with existing AI tutor model if it exists
+    try:
+        existing_model_path = 'model/ai_tutor_model.pkl'
+        if os.path.exists(existing_model_path):
+            print("Found existing AI tutor model, merging mathematics data...")
+            
+            # Only the mathematics questions are tokenized; the rest of the model is re-weighted from its stored term counts
             combined_model_path = 'model/large_ai_tutor_model.pkl'
-            with open(combined_model_path, 'wb') as f:
-                pickle.dump((combined_vectorizer, combined_X, math_training_data), f)
-                
+            combined_vectorizer, combined_X, combined_training_data = update_model(
+                existing_model_path, {"Mathematics": math_training_data["Mathematics"]}, output_path=combined_model_path)
+            
             print(f"Combined model successfully created and saved to {combined_model_path}")
-            print(f"Combined dataset contains {len(combined_questions)} questions across {len(math_training_data)} subjects")
-except Exception as e:
-    print(f"Error merging with existing model: {str(e)}")
-    print("Mathematics-only model was still created successfully.")
+            print(f"Combined dataset contains {combined_X.shape[0]} questions across {len(combined_training_data)} subjects")
+    except Exception as e:
+        print(f"Error merging with existing model: {str(e)}")
+        print("Mathematics-only model was still created successfully.")
+
+
+def main():
+    print("Creating enhanced mathematics dataset...")
+
+    # Create necessary directories
+    os.makedirs("model", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+    
+    math_training_data = create_math_model(collect_math_pairs())
+    merge_into_large_model(math_training_data)
+    print("Done! Run the app.py file to start using the enhanced mathematics model.")
+
 
-print("Done! Run the app.py file to start using the enhanced mathematics model.") 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,9 @@
 import os
 import pickle
 import json
-import requests
 from sklearn.feature_extraction.text import TfidfVectorizer
-
-print("Creating enhanced programming dataset...")
-
-# Create necessary directories
-os.makedirs("model", exist_ok=True)
-os.makedirs("data", exist_ok=True)
+from dataset_fetch import fetch_all
+from incremental_model import update_model
 
 # Python programming QA pairs
 python_qa = [
@@ -66,134 +61,151 @@ software_eng_qa = [
     ("What is SQL?", "SQL (Structured Query Language) is a domain-specific language for managing data in relational database management systems. It allows creating, reading, updating, and deleting data (CRUD operations) through commands like CREATE TABLE, SELECT, INSERT, UPDATE, and DELETE. SQL also enables complex queries with JOINs, aggregations (SUM, COUNT), filtering (WHERE), sorting (ORDER BY), and grouping (GROUP BY). It's used across various database systems like MySQL, PostgreSQL, SQL Server, and Oracle, with minor syntax variations among them."),
 ]
 
-# Combined programming QA pairs
-programming_qa_pairs = python_qa + web_dev_qa + data_science_qa + software_eng_qa
 
-# Try to download additional data from external sources
-try:
-    print("Attempting to download additional programming datasets...")
-    
-    # Try to fetch additional programming content
-    programming_urls = [
-        "https://raw.githubusercontent.com/karpathy/minGPT/master/README.md",
-        "https://raw.githubusercontent.com/tensorflow/tensorflow/master/README.md"
-    ]
-    
-    programming_examples = []
-    for url in programming_urls:
-        try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                content = response.text
-                lines = content.split('\n')
-                
-                # Extract Q&A style content from README files
-                current_question = None
-                answer_lines = []
-                
-                for line in lines:
-                    # Look for potential questions (headers)
-                    if line.startswith('## ') or line.startswith('# '):
-                        # If we already have a question, save it with its answer
-                        if current_question and answer_lines:
-                            answer_text = ' '.join(answer_lines)
-                            if len(answer_text) > 50:  # Only use if answer has substantial content
-                                programming_examples.append((current_question, answer_text))
-                        
-                        # Start a new potential Q&A pair
-                        current_question = line.lstrip('#').strip()
-                        answer_lines = []
-                    elif current_question and line.strip() and not line.startswith('```'):
-                        # Collect non-empty lines that aren't code blocks as part of the answer
-                        answer_lines.append(line.strip())
-                
-                # Add the last Q&A pair if there is one
-                if current_question and answer_lines:
-                    answer_text = ' '.join(answer_lines)
-                    if len(answer_text) > 50:
-                        programming_examples.append((current_question, answer_text))
-                
-                print(f"Extracted {len(programming_examples)} Q&A pairs from {url}")
-        except Exception as e:
-            print(f"Error processing {url}: {str(e)}")
-    
-    # Add some of the examples to our dataset (limit to avoid very long answers)
-    for q, a in programming_examples[:5]:
-        # Truncate very long answers
-        if len(a) > 500:
-            a = a[:500] + "..."
-        programming_qa_pairs.append((q, a))
-    
-    # Add fallback programming topics as a backup
-    programming_concepts = [
-        "API", "framework", "IDE", "compiler", "interpreter", 
-        "debugger", "algorithm", "data structure", "database", "git"
-    ]
+def collect_programming_pairs():
+    """Return the predefined programming QA pairs plus any that the extra sources provide"""
+    # Combined programming QA pairs
+    programming_qa_pairs = python_qa + web_dev_qa + data_science_qa + software_eng_qa
+
+    # Try to download additional data from external sources
+    try:
+        print("Attempting to download additional programming datasets...")
+        
+        # Try to fetch additional programming content
+        programming_urls = [
+            "https://raw.githubusercontent.com/karpathy/minGPT/master/README.md",
+            "https://raw.githubusercontent.com/tensorflow/tensorflow/master/README.md"
+        ]
+        
+        programming_examples = []
+        # Download every source at once over the shared connection pool
+        responses = fetch_all(programming_urls)
+        for url in programming_urls:
+            try:
+                response = responses[url].result()
+                if response.status_code == 200:
+                    content = response.text
+                    lines = content.split('\n')
+                    
+                    # Extract Q&A style content from README files
+                    current_question = None
+                    answer_lines = []
+                    
+                    for line in lines:
+                        # Look for potential questions (headers)
+                        if line.startswith('## ') or line.startswith('# '):
+                            # If we already have a question, save it with its answer
+                            if current_question and answer_lines:
+                                answer_text = ' '.join(answer_lines)
+                                if len(answer_text) > 50:  # Only use if answer has substantial content
+                                    programming_examples.append((current_question, answer_text))
+                            
+                            # Start a new potential Q&A pair
+                            current_question = line.lstrip('#').strip()
+                            answer_lines = []
+                        elif current_question and line.strip() and not line.startswith('```'):
+                            # Collect non-empty lines that aren't code blocks as part of the answer
+                            answer_lines.append(line.strip())
+                    
+                    # Add the last Q&A pair if there is one
+                    if current_question and answer_lines:
+                        answer_text = ' '.join(answer_lines)
+                        if len(answer_text) > 50:
+                            programming_examples.append((current_question, answer_text))
+                    
+                    print(f"Extracted {len(programming_examples)} Q&A pairs from {url}")
+            except Exception as e:
+                print(f"Error processing {url}: {str(e)}")
+        
+        # Add some of the examples to our dataset (limit to avoid very long answers)
+        for q, a in programming_examples[:5]:
+            # Truncate very long answers
+            if len(a) > 500:
+                a = a[:500] + "..."
+            programming_qa_pairs.append((q, a))
+        
+        # Add fallback programming topics as a backup
+        programming_concepts = [
+            "API", "framework", "IDE", "compiler", "interpreter", 
+            "debugger", "algorithm", "data structure", "database", "git"
+        ]
+        
+        for concept in programming_concepts:
+            question = f"What is a {concept} in programming?"
+            answer = f"In programming, a {concept} is a tool or concept that helps developers create, test, and maintain software. It's an essential part of modern software development practices and workflows."
+            programming_qa_pairs.append((question, answer))
+        
+        print(f"Added {len(programming_concepts)} basic programming concept definitions")
+
+    except Exception as e:
+        print(f"Error downloading additional datasets: {str(e)}")
+        print("Using only the predefined QA pairs...")
     
-    for concept in programming_concepts:
-        question = f"What is a {concept} in programming?"
-        answer = f"In programming, a {concept} is a tool or concept that helps developers create, test, and maintain software. It's an essential part of modern software development practices and workflows."
-        programming_qa_pairs.append((question, answer))
+    return programming_qa_pairs
+
+
+def build_programming_model(programming_qa_pairs):
+    """Fit the programming-only model without writing it; returns (vectorizer, X, training_data)"""
+    # Create a programming-specific dataset
+    print(f"Creating programming dataset with {len(programming_qa_pairs)} QA pairs")
+
+    # Prepare the dataset structure
+    programming_training_data = {"Programming": []}
+    for question, answer in programming_qa_pairs:
+        programming_training_data["Programming"].append(question)
+        programming_training_data["Programming"].append(answer)
+
+    # Create a TF-IDF vectorizer
+    vectorizer = TfidfVectorizer()
+    all_questions = [q for q in programming_training_data["Programming"][::2]]
+    X = vectorizer.fit_transform(all_questions)
+    return vectorizer, X, programming_training_data
+
+
+def create_programming_model(programming_qa_pairs):
+    """Save the programming-only model and return its training data"""
+    vectorizer, X, programming_training_data = build_programming_model(programming_qa_pairs)
+
+    # Save the model components
+    model_path = 'model/programming_model.pkl'
+    with open(model_path, 'wb') as f:
+        pickle.dump((vectorizer, X, programming_training_data), f)
+
+    print(f"Programming model successfully created and saved to {model_path}")
+    print(f"Dataset contains {X.shape[0]} questions")
     
-    print(f"Added {len(programming_concepts)} basic programming concept definitions")
-
-except Exception as e:
-    print(f"Error downloading additional datasets: {str(e)}")
-    print("Using only the predefined QA pairs...")
-
-# Create a programming-specific dataset
-print(f"Creating programming dataset with {len(programming_qa_pairs)} QA pairs")
-
-# Prepare the dataset structure
-programming_training_data = {"Programming": []}
-for question, answer in programming_qa_pairs:
-    programming_training_data["Programming"].append(question)
-    programming_training_data["Programming"].append(answer)
-
-# Create a TF-IDF vectorizer
-vectorizer = TfidfVectorizer()
-all_questions = [q for q in programming_training_data["Programming"][::2]]
-X = vectorizer.fit_transform(all_questions)
-
-# Save the model components
-model_path = 'model/programming_model.pkl'
-with open(model_path, 'wb') as f:
-    pickle.dump((vectorizer, X, programming_training_data), f)
-
-print(f"Programming model successfully created and saved to {model_path}")
-print(f"Dataset contains {len(all_questions)} questions")
-
-# Merge with existing AI tutor model
-try:
-    existing_model_path = 'model/large_ai_tutor_model.pkl'
-    if os.path.exists(existing_model_path):
-        print("Found existing large AI tutor model, merging programming data...")
-        
-        with open(existing_model_path, 'rb') as f:
-            existing_model_data = pickle.load(f)
-            
-        if isinstance(existing_model_data, tuple) and len(existing_model_data) == 3:
-            combined_vectorizer, combined_X, combined_training_data = existing_model_data
-            
-            # Merge programming data with existing data
-            combined_training_data["Programming"] = programming_training_data["Programming"]
+    return programming_training_data
+
+
+def merge_into_large_model(programming_training_data):
+    """Add or replace the programming subject of the combined model"""
+    # Merge with existing AI tutor model
+    try:
+        existing_model_path = 'model/large_ai_tutor_model.pkl'
+        if os.path.exists(existing_model_path):
+            print("Found existing large AI tutor model, merging programming data...")
             
-            # Create a new combined vectorizer and feature matrix
-            combined_questions = []
-            for subject, qa_list in combined_training_data.items():
-                combined_questions.extend(qa_list[::2])
-                
-            new_vectorizer = TfidfVectorizer()
-            new_X = new_vectorizer.fit_transform(combined_questions)
+            # Only the programming questions are tokenized; the rest of the model is re-weighted from its stored term counts
+            new_vectorizer, new_X, combined_training_data = update_model(existing_model_path, {"Programming": programming_training_data["Programming"]})
             
-            # Save the combined model
-            with open(existing_model_path, 'wb') as f:
-                pickle.dump((new_vectorizer, new_X, combined_training_data), f)
-                
             print(f"Combined model successfully updated at {existing_model_path}")
-            print(f"Combined dataset now contains {len(combined_questions)} questions across {len(combined_training_data)} subjects")
-except Exception as e:
-    print(f"Error merging with existing model: {str(e)}")
-    print("Programming-only model was still created successfully.")
+            print(f"Combined dataset now contains {new_X.shape[0]} questions across {len(combined_training_data)} subjects")
+    except Exception as e:
+        print(f"Error merging with existing model: {str(e)}")
+        print("Programming-only model was still created successfully.")
+
+
+def main():
+    print("Creating enhanced programming dataset...")
+
+    # Create necessary directories
+    os.makedirs("model", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+    
+    programming_training_data = create_programming_model(collect_programming_pairs())
+    merge_into_large_model(programming_training_data)
+    print("Done! Run the app.py file to start using the enhanced programming model.")
+
 
-print("Done! Run the app.py file to start using the enhanced programming model.") 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
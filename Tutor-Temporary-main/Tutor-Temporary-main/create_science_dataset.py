@@ -1,14 +1,9 @@
 import os
 import pickle
 import json
-import requests
 from sklearn.feature_extraction.text import TfidfVectorizer
-
-print("Creating enhanced science dataset...")
-
-# Create necessary directories
-os.makedirs("model", exist_ok=True)
-os.makedirs("data", exist_ok=True)
+from dataset_fetch import fetch_all
+from incremental_model import update_model
 
 # Basic biology concepts
 biology_qa = [
@@ -66,150 +61,149 @@ earth_science_qa = [
     ("What is a hurricane?", "A hurricane is a type of tropical cyclone, which is a rotating low-pressure weather system with organized thunderstorms but no fronts (boundaries between air masses). Hurricanes form over warm ocean waters (at least 26°C or 79°F) near the equator. As warm, moist air rises from the ocean surface, it creates an area of low pressure below. Air from surrounding areas fills the low pressure, warms, and rises, creating a cycle that fuels the storm. When wind speeds reach 74 mph (119 km/h) or higher, the storm is classified as a hurricane in the Atlantic and Northeast Pacific. These powerful storms are characterized by a well-defined center (eye), a circular rotation, and strong winds. Hurricanes can cause severe damage through high winds, heavy rainfall, storm surges, and flooding. They are called typhoons in the Northwest Pacific and cyclones in the South Pacific and Indian Ocean."),
 ]
 
-# Combined science QA pairs
-science_qa_pairs = biology_qa + chemistry_qa + physics_qa + earth_science_qa
 
-# Try to download additional data from external sources
-try:
-    print("Attempting to download additional science datasets...")
-    
-    # Try to fetch additional science content
-    science_urls = [
-        "https://raw.githubusercontent.com/allenai/sciq/master/sciq_sample.json",
-        "https://raw.githubusercontent.com/wiki/google-research/bert/squad-sample.json"
-    ]
-    
-    for url in science_urls:
-        try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if isinstance(data, list):
-                        for item in data[:20]:  # Limit to first 20 items
-                            if 'question' in item and ('answer' in item or 'correct_answer' in item):
-                                q = item.get('question', '')
-                                a = item.get('answer', item.get('correct_answer', ''))
-                                
-                                if len(q) > 10 and len(a) > 20:  # Ensure reasonable length
-                                    science_qa_pairs.append((q, a))
-                    elif isinstance(data, dict) and 'data' in data:
-                        for item in data.get('data', [])[:20]:
-                            for paragraph in item.get('paragraphs', [])[:5]:
-                                for qa in paragraph.get('qas', [])[:2]:
-                                    question = qa.get('question', '')
-                                    if 'answers' in qa and qa['answers']:
-                                        answer = qa['answers'][0].get('text', '')
-                                        if len(question) > 10 and len(answer) > 20:
-                                            science_qa_pairs.append((question, answer))
-                    
-                    print(f"Successfully processed data from {url}")
-                except json.JSONDecodeError:
-                    print(f"Could not parse JSON from {url}")
-            else:
-                print(f"Failed to download from {url}, status code: {response.status_code}")
-        except Exception as e:
-            print(f"Error processing {url}: {str(e)}")
-    
-    # Add fallback science topics as a backup
-    science_topics = [
-        "atom", "molecule", "cell", "gene", "solar system", 
-        "chemical reaction", "force", "energy", "ecosystem", "climate"
-    ]
+def collect_science_pairs():
+    """Return the predefined science QA pairs plus any that the extra sources provide"""
+    # Combined science QA pairs
+    science_qa_pairs = biology_qa + chemistry_qa + physics_qa + earth_science_qa
+
+    # Try to download additional data from external sources
+    try:
+        print("Attempting to download additional science datasets...")
+        
+        # Try to fetch additional science content
+        science_urls = [
+            "https://raw.githubusercontent.com/allenai/sciq/master/sciq_sample.json",
+            "https://raw.githubusercontent.com/wiki/google-research/bert/squad-sample.json"
+        ]
+        
+        # Download every source at once over the shared connection pool
+        responses = fetch_all(science_urls)
+        for url in science_urls:
+            try:
+                response = responses[url].result()
+                if response.status_code == 200:
+                    try:
+                        data = response.json()
+                        if isinstance(data, list):
+                            for item in data[:20]:  # Limit to first 20 items
+                                if 'question' in item and ('answer' in item or 'correct_answer' in item):
+                                    q = item.get('question', '')
+                                    a = item.get('answer', item.get('correct_answer', ''))
+                                    
+                                    if len(q) > 10 and len(a) > 20:  # Ensure reasonable length
+                                        science_qa_pairs.append((q, a))
+                        elif isinstance(data, dict) and 'data' in data:
+                            for item in data.get('data', [])[:20]:
+                                for paragraph in item.get('paragraphs', [])[:5]:
+                                    for qa in paragraph.get('qas', [])[:2]:
+                                        question = qa.get('question', '')
+                                        if 'answers' in qa and qa['answers']:
+                                            answer = qa['answers'][0].get('text', '')
+                                            if len(question) > 10 and len(answer) > 20:
+                                                science_qa_pairs.append((question, answer))
+                        
+                        print(f"Successfully processed data from {url}")
+                    except json.JSONDecodeError:
+                        print(f"Could not parse JSON from {url}")
+                else:
+                    print(f"Failed to download from {url}, status code: {response.status_code}")
+            except Exception as e:
+                print(f"Error processing {url}: {str(e)}")
+        
+        # Add fallback science topics as a backup
+        science_topics = [
+            "atom", "molecule", "cell", "gene", "solar system", 
+            "chemical reaction", "force", "energy", "ecosystem", "climate"
+        ]
+        
+        for topic in science_topics:
+            question = f"What is a {topic} in science?"
+            answer = f"In science, a {topic} is a fundamental concept that helps explain natural phenomena and the physical world. It is studied across various scientific disciplines and contributes to our understanding of how the universe works."
+            science_qa_pairs.append((question, answer))
+        
+        print(f"Added {len(science_topics)} basic science topic definitions")
+
+    except Exception as e:
+        print(f"Error downloading additional datasets: {str(e)}")
+        print("Using only the predefined QA pairs...")
     
-    for topic in science_topics:
-        question = f"What is a {topic} in science?"
-        answer = f"In science, a {topic} is a fundamental concept that helps explain natural phenomena and the physical world. It is studied across various scientific disciplines and contributes to our understanding of how the universe works."
-        science_qa_pairs.append((question, answer))
+    return science_qa_pairs
+
+
+def build_science_model(science_qa_pairs):
+    """Fit the science-only model without writing it; returns (vectorizer, X, training_data)"""
+    # Create a science-specific dataset
+    print(f"Creating science dataset with {len(science_qa_pairs)} QA pairs")
+
+    # Prepare the dataset structure
+    science_training_data = {"Science": []}
+    for question, answer in science_qa_pairs:
+        science_training_data["Science"].append(question)
+        science_training_data["Science"].append(answer)
+
+    # Create a TF-IDF vectorizer
+    vectorizer = TfidfVectorizer()
+    all_questions = [q for q in science_training_data["Science"][::2]]
+    X = vectorizer.fit_transform(all_questions)
+    return vectorizer, X, science_training_data
+
+
+def create_science_model(science_qa_pairs):
+    """Save the science-only model and return its training data"""
+    vectorizer, X, science_training_data = build_science_model(science_qa_pairs)
+
+    # Save the model components
+    model_path = 'model/science_model.pkl'
+    with open(model_path, 'wb') as f:
+        pickle.dump((vectorizer, X, science_training_data), f)
+
+    print(f"Science model successfully created and saved to {model_path}")
+    print(f"Dataset contains {X.shape[0]} questions")
     
-    print(f"Added {len(science_topics)} basic science topic definitions")
-
-except Exception as e:
-    print(f"Error downloading additional datasets: {str(e)}")
-    print("Using only the predefined QA pairs...")
-
-# Create a science-specific dataset
-print(f"Creating science dataset with {len(science_qa_pairs)} QA pairs")
-
-# Prepare the dataset structure
-science_training_data = {"Science": []}
-for question, answer in science_qa_pairs:
-    science_training_data["Science"].append(question)
-    science_training_data["Science"].append(answer)
-
-# Create a TF-IDF vectorizer
-vectorizer = TfidfVectorizer()
-all_questions = [q for q in science_training_data["Science"][::2]]
-X = vectorizer.fit_transform(all_questions)
-
-# Save the model components
-model_path = 'model/science_model.pkl'
-with open(model_path, 'wb') as f:
-    pickle.dump((vectorizer, X, science_training_data), f)
-
-print(f"Science model successfully created and saved to {model_path}")
-print(f"Dataset contains {len(all_questions)} questions")
-
-# Optionally, merge this with existing AI tutor model if it exists
-try:
-    existing_model_path = 'model/large_ai_tutor_model.pkl'
-    if os.path.exists(existing_model_path):
-        print("Found existing large AI tutor model, merging science data...")
-        
-        with open(existing_model_path, 'rb') as f:
-            existing_model_data = pickle.load(f)
-            
-        if isinstance(existing_model_data, tuple) and len(existing_model_data) == 3:
-            combined_vectorizer, combined_X, combined_training_data = existing_model_data
-            
-            # Merge science data with existing data
-            combined_training_data["Science"] = science_training_data["Science"]
+    return science_training_data
+
+
+def merge_into_large_model(science_training_data):
+    """Add or replace the science subject of the combined model"""
+    # Optionally, merge this with existing AI tutor model if it exists
+    try:
+        existing_model_path = 'model/large_ai_tutor_model.pkl'
+        if os.path.exists(existing_model_path):
+            print("Found existing large AI tutor model, merging science data...")
             
-            # Create a new combined vectorizer and feature matrix
-            combined_questions = []
-            for subject, qa_list in combined_training_data.items():
-                combined_questions.extend(qa_list[::2])
-                
-            new_vectorizer = TfidfVectorizer()
-            new_X = new_vectorizer.fit_transform(combined_questions)
+            # Only the science questions are tokenized; the rest of the model is re-weighted from its stored term counts
+            new_vectorizer, new_X, combined_training_data = update_model(existing_model_path, {"Science": science_training_data["Science"]})
             
-            # Save the combined model
-            with open(existing_model_path, 'wb') as f:
-                pickle.dump((new_vectorizer, new_X, combined_training_data), f)
-                
             print(f"Combined model successfully updated at {existing_model_path}")
-            print(f"Combined dataset now contains {len(combined_questions)} questions across {len(combined_training_data)} subjects")
-    else:
-        print("Large AI tutor model not found. Creating new combined model...")
-        # Try to find standard AI tutor model
-        standard_model_path = 'model/ai_tutor_model.pkl'
-        if os.path.exists(standard_model_path):
-            with open(standard_model_path, 'rb') as f:
-                standard_model_data = pickle.load(f)
+            print(f"Combined dataset now contains {new_X.shape[0]} questions across {len(combined_training_data)} subjects")
+        else:
+            print("Large AI tutor model not found. Creating new combined model...")
+            # Try to find standard AI tutor model
+            standard_model_path = 'model/ai_tutor_model.pkl'
+            if os.path.exists(standard_model_path):
+                # Counted in full the first time; later runs only tokenize the science questions
+                new_vectorizer, new_X, combined_training_data = update_model(
+                    standard_model_path, {"Science": science_training_data["Science"]}, output_path=existing_model_path)
                 
-            if isinstance(standard_model_data, tuple) and len(standard_model_data) == 3:
-                _, _, standard_training_data = standard_model_data
-                
-                # Create combined data
-                combined_training_data = standard_training_data.copy()
-                combined_training_data["Science"] = science_training_data["Science"]
-                
-                # Create vectorizer and matrix
-                combined_questions = []
-                for subject, qa_list in combined_training_data.items():
-                    combined_questions.extend(qa_list[::2])
-                    
-                new_vectorizer = TfidfVectorizer()
-                new_X = new_vectorizer.fit_transform(combined_questions)
-                
-                # Save as large model
-                with open(existing_model_path, 'wb') as f:
-                    pickle.dump((new_vectorizer, new_X, combined_training_data), f)
-                    
                 print(f"New combined model created at {existing_model_path}")
-                print(f"Combined dataset contains {len(combined_questions)} questions across {len(combined_training_data)} subjects")
-except Exception as e:
-    print(f"Error merging with existing model: {str(e)}")
-    print("Science-only model was still created successfully.")
+                print(f"Combined dataset contains {new_X.shape[0]} questions across {len(combined_training_data)} subjects")
+    except Exception as e:
+        print(f"Error merging with existing model: {str(e)}")
+        print("Science-only model was still created successfully.")
+
+
+def main():
+    print("Creating enhanced science dataset...")
+
+    # Create necessary directories
+    os.makedirs("model", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+    
+    science_training_data = create_science_model(collect_science_pairs())
+    merge_into_large_model(science_training_data)
+    print("Done! Run the app.py file to start using the enhanced science model.")
+
 
-print("Done! Run the app.py file to start using the enhanced science model.") 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Downloads in flight at once, across all hosts
+MAX_WORKERS = 16
+
+# Downloads in flight at once to any one host
+PER_HOST_LIMIT = 4
+
+# Attempts after the first one, for connection errors, timeouts and the statuses below
+MAX_RETRIES = 2
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Backoff before retry n is uniform in [0, min(BACKOFF_MAX, BACKOFF_BASE * 2**n)] seconds ("full jitter")
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+
+# (connect, read) timeouts in seconds
+TIMEOUT = (3.05, 10)
+
+
+def pooled_session(pool_size=MAX_WORKERS):
+    """A requests.Session that keeps up to pool_size connections per host open for reuse"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class Fetcher:
+    """Concurrent GETs over one pooled session, with jittered retries and a cap on requests per host"""
+
+    def __init__(self, session=None, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT, retries=MAX_RETRIES,
+                 backoff=BACKOFF_BASE, timeout=TIMEOUT):
+        self.session = session or pooled_session(max_workers)
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._executor = None
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.attempts = 0
+        self.retried = 0
+        self.failures = 0
+
+    def _slots(self, url):
+        """The semaphore bounding requests in flight to url's host"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    def _delay(self, attempt, response=None):
+        """Seconds to wait before retry number attempt, honouring a numeric Retry-After up to the cap"""
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+        return random.uniform(0, min(BACKOFF_MAX, self.backoff * 2 ** attempt))
+
+    def get(self, url):
+        """GET url, retrying transient failures; returns the last response or raises the last error"""
+        for attempt in range(self.retries + 1):
+            response, error = None, None
+            with self._slots(url):
+                with self._lock:
+                    self.attempts += 1
+                try:
+                    response = self.session.get(url, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    error = e
+
+            if error is None and (response.status_code not in RETRY_STATUSES or attempt == self.retries):
+                return response
+            if attempt == self.retries:
+                break
+
+            # Waiting happens outside the host slot so other downloads to the host can use it
+            delay = self._delay(attempt, response)
+            logger.debug(f"Retrying {url} in {delay:.2f}s after {error or response.status_code}")
+            with self._lock:
+                self.retried += 1
+            time.sleep(delay)
+
+        with self._lock:
+            self.failures += 1
+        raise error
+
+    def fetch_all(self, urls):
+        """Start downloading every url at once; returns {url: Future} whose result() is the response or raises"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='fetch')
+        return {url: self._executor.submit(self.get, url) for url in dict.fromkeys(urls)}
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
+
+    def stats(self):
+        """Return the attempt, retry and failure counters"""
+        with self._lock:
+            return {"attempts": self.attempts, "retries": self.retried, "failures": self.failures}
+
+
+_default_fetcher = None
+_default_lock = threading.Lock()
+
+
+def default_fetcher():
+    """The process-wide Fetcher, so every dataset script shares one connection pool"""
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = Fetcher()
+        return _default_fetcher
+
+
+def fetch_all(urls):
+    """Download urls concurrently with the shared Fetcher; returns {url: Future}"""
+    return default_fetcher().fetch_all(urls)
@@ -1,8 +1,8 @@
-import requests
 import os
 import json
 import pickle
 from sklearn.feature_extraction.text import TfidfVectorizer
+from dataset_fetch import fetch_all
 
 # Create necessary directories
 os.makedirs("model", exist_ok=True)
@@ -16,6 +16,7 @@ def download_datasets():
     # Educational QA dataset URLs - these are small datasets available without authentication
     math_dataset_url = "https://raw.githubusercontent.com/cognitivefactory/courseware-nlp-training/main/data/datasets/math-qa-sample.json"
     science_dataset_url = "https://raw.githubusercontent.com/cognitivefactory/courseware-nlp-training/main/data/datasets/science-qa-sample.json"
+    bio_dataset_url = "https://raw.githubusercontent.com/cognitivefactory/courseware-nlp-training/main/data/datasets/bio-qa-sample.json"
     
     # Create a combined training dataset
     training_data = {
@@ -79,8 +80,11 @@ def download_datasets():
     try:
         print("Attempting to download additional educational datasets...")
         
+        # All three sources download at once over the shared connection pool
+        responses = fetch_all([math_dataset_url, science_dataset_url, bio_dataset_url])
+        
         # Math dataset
-        response = requests.get(math_dataset_url)
+        response = responses[math_dataset_url].result()
         if response.status_code == 200:
             math_data = response.json()
             # Process the data and add to training data
@@ -91,7 +95,7 @@ def download_datasets():
             print(f"Added {min(20, len(math_data))} mathematics Q&A pairs from online dataset")
         
         # Science dataset
-        response = requests.get(science_dataset_url)
+        response = responses[science_dataset_url].result()
         if response.status_code == 200:
             science_data = response.json()
             # Process the data and add to training data
@@ -102,9 +106,8 @@ def download_datasets():
             print(f"Added {min(20, len(science_data))} science Q&A pairs from online dataset")
             
             # Try to fetch additional biology Q&A
-            bio_dataset_url = "https://raw.githubusercontent.com/cognitivefactory/courseware-nlp-training/main/data/datasets/bio-qa-sample.json"
             try:
-                bio_response = requests.get(bio_dataset_url)
+                bio_response = responses[bio_dataset_url].result()
                 if bio_response.status_code == 200:
                     bio_data = bio_response.json()
                     for item in bio_data[:15]:
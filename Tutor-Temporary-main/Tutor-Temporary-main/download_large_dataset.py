@@ -1,15 +1,9 @@
-import requests
 import os
 import json
 import pickle
 import time
 from sklearn.feature_extraction.text import TfidfVectorizer
-
-# Create necessary directories
-os.makedirs("model", exist_ok=True)
-os.makedirs("data", exist_ok=True)
-
-print("Downloading larger educational datasets...")
+from dataset_fetch import fetch_all
 
 # URLs for larger educational datasets
 DATASET_URLS = {
@@ -57,6 +51,9 @@ def download_large_datasets():
     # Keep track of how many items were added
     added_counts = {subject: len(questions)//2 for subject, questions in combined_data.items()}
     
+    # Download every source at once over the shared connection pool; each is processed when its turn comes
+    responses = fetch_all([url for urls in DATASET_URLS.values() for url in urls])
+    
     # Process each subject and URL
     for subject, urls in DATASET_URLS.items():
         if subject not in combined_data:
@@ -65,7 +62,7 @@ def download_large_datasets():
         for url in urls:
             print(f"Downloading data from {url}...")
             try:
-                response = requests.get(url, timeout=10)
+                response = responses[url].result()
                 if response.status_code == 200:
                     # Different handling based on file extension or content
                     if url.endswith('.json'):
@@ -175,6 +172,12 @@ def download_large_datasets():
     return combined_data
 
 def create_enhanced_model():
+    # Create necessary directories
+    os.makedirs("model", exist_ok=True)
+    os.makedirs("data", exist_ok=True)
+    
+    print("Downloading larger educational datasets...")
+    
     # Download the enhanced dataset
     training_data = download_large_datasets()
     
@@ -0,0 +1,153 @@
+from collections import defaultdict
+from text_normalizer import STOP_WORDS, clean_text, normalize_corpus
+
+# Entry tags: who-questions resolve against biographical entries, what-questions against definitional ones
+BIOGRAPHICAL = 'biographical'
+DEFINITIONAL = 'definitional'
+
+# Stored question openings that name an entity, and the tag they give it
+QUESTION_PREFIXES = (
+    ('who is ', BIOGRAPHICAL), ('who was ', BIOGRAPHICAL),
+    ('what is ', DEFINITIONAL), ('what are ', DEFINITIONAL),
+    ('what was ', DEFINITIONAL), ('what were ', DEFINITIONAL),
+)
+
+# Answer phrases that mark a life story or a definition, for pairs whose question names no entity
+BIOGRAPHICAL_INDICATORS = ("born", "died", "lived", "known for")
+DEFINITIONAL_INDICATORS = ("is a", "are a", "refers to", "defined as")
+
+# Verbs ending the subject phrase an answer opens with ("Abraham Lincoln was ...")
+LEAD_VERBS = frozenset(['is', 'are', 'was', 'were', 'refers'])
+
+# An answer's subject phrase must end within this many words to count as its entity
+LEAD_WORDS = 10
+
+# Leading words dropped from every entity name
+ARTICLES = frozenset(['a', 'an', 'the'])
+
+# Priority of each kind of key, lowest first: the entity a question names, the one its answer
+# opens with, a single word of a person's name
+QUESTION_RANK, ANSWER_RANK, NAME_WORD_RANK = 0, 1, 2
+
+
+def entity_key(cleaned_text):
+    """Normalized entity name: cleaned words without leading articles"""
+    words = cleaned_text.split()
+    while words and words[0] in ARTICLES:
+        words = words[1:]
+    return ' '.join(words)
+
+
+def name_words(key):
+    """Words of a person's name that can find them on their own ("gandhi" for "mahatma gandhi")"""
+    return [word for word in key.split() if len(word) >= 3 and word not in STOP_WORDS]
+
+
+def answer_lead(cleaned_answer):
+    """Entity an answer opens with, or an empty string when it doesn't open with one"""
+    words = cleaned_answer.split()[:LEAD_WORDS]
+    for position, word in enumerate(words):
+        if word in LEAD_VERBS:
+            return entity_key(' '.join(words[:position]))
+    return ''
+
+
+def entity_keys(cleaned_question, cleaned_answer, answer_lower):
+    """Yield (rank, tag, key) for every entity name a QA pair can be looked up by"""
+    question_tag = None
+    for prefix, tag in QUESTION_PREFIXES:
+        if cleaned_question.startswith(prefix):
+            question_tag = tag
+            key = entity_key(cleaned_question[len(prefix):])
+            yield QUESTION_RANK, tag, key
+            # "a variable in programming" is also the entry for plain "variable"
+            if tag == DEFINITIONAL and ' in ' in key:
+                yield ANSWER_RANK, tag, key.split(' in ')[0]
+            if tag == BIOGRAPHICAL:
+                for word in name_words(key):
+                    yield NAME_WORD_RANK, tag, word
+            break
+
+    lead = answer_lead(cleaned_answer)
+    if not lead:
+        return
+    # The question decides the tag; otherwise the answer's own wording does
+    tag = question_tag
+    if tag is None and any(indicator in answer_lower for indicator in BIOGRAPHICAL_INDICATORS):
+        tag = BIOGRAPHICAL
+    if tag is None and any(indicator in answer_lower for indicator in DEFINITIONAL_INDICATORS):
+        tag = DEFINITIONAL
+    if tag is None:
+        return
+    yield ANSWER_RANK, tag, lead
+    if tag == BIOGRAPHICAL:
+        for word in name_words(lead):
+            yield NAME_WORD_RANK, tag, word
+
+
+class EntityIndex:
+    """Normalized people and concept names -> QA pair ids, tagged biographical or definitional"""
+
+    def __init__(self, data):
+        # Per pair id, in subject then question order
+        self.subjects = []
+        self.questions = []
+        # Per pair id, every word of the person names it is stored under
+        self.person_words = []
+        ranked = defaultdict(dict)
+
+        for subject, qa_pairs in data.items():
+            questions = list(qa_pairs)
+            answers = [qa_pairs[q] for q in questions]
+            cleaned_questions = normalize_corpus(questions, clean_text)
+            cleaned_answers = normalize_corpus(answers, clean_text)
+            for question, answer, cleaned_question, cleaned_answer in zip(questions, answers, cleaned_questions, cleaned_answers):
+                pair_id = len(self.questions)
+                self.subjects.append(subject)
+                self.questions.append(question)
+                self.person_words.append(set())
+                for rank, tag, key in entity_keys(cleaned_question, cleaned_answer, answer.lower()):
+                    if not key:
+                        continue
+                    if tag == BIOGRAPHICAL:
+                        self.person_words[pair_id].update(key.split())
+                    # A pair reachable through several routes keeps its best rank under each key
+                    entries = ranked[(tag, key)]
+                    entries[pair_id] = min(rank, entries.get(pair_id, rank))
+
+        # (tag, key) -> pair ids, best rank first, then corpus order
+        self.postings = {
+            tag_key: [pair_id for pair_id, _ in sorted(entries.items(), key=lambda item: (item[1], item[0]))]
+            for tag_key, entries in ranked.items()
+        }
+
+    def __len__(self):
+        return len(self.postings)
+
+    def lookup(self, entity, tag, subject=None):
+        """Return the pair id describing the entity, preferring pairs in subject, or None
+
+        The whole name is one dictionary probe; a person not found by full name is looked up by a
+        word of it, so "who was lincoln" and "who was abraham lincoln" both resolve. That person's
+        stored names must then cover every name word asked about, so "the president after lincoln"
+        does not resolve to Lincoln.
+        """
+        key = entity_key(clean_text(entity))
+        if not key:
+            return None
+        probes = [(key, ())]
+        if tag == BIOGRAPHICAL:
+            asked = name_words(key)
+            if asked and asked != [key]:
+                probes.append((asked[0], asked))
+
+        fallback = None
+        for probe, required in probes:
+            for pair_id in self.postings.get((tag, probe), ()):
+                if not self.person_words[pair_id].issuperset(required):
+                    continue
+                if self.subjects[pair_id] == subject:
+                    return pair_id
+                if fallback is None:
+                    fallback = pair_id
+        return fallback
@@ -0,0 +1,55 @@
+from text_normalizer import canonical_text, normalize_corpus
+
+
+class ExactMatchIndex:
+    """Hash lookup from a stored question, or its canonical form, to the id of the first question with that form"""
+
+    def __init__(self, questions):
+        # Same-form duplicates keep the first id, like the linear scans they replace
+        self.exact_ids = {}
+        for question_id, question in enumerate(questions):
+            self.exact_ids.setdefault(question, question_id)
+
+        # Punctuation- and whitespace-insensitive form, so "What is X?" finds "what is x"
+        self.canonical_ids = {}
+        for question_id, canonical in enumerate(normalize_corpus(questions, canonical_text)):
+            self.canonical_ids.setdefault(canonical, question_id)
+
+        # Counters for stats(); approximate under concurrent use
+        self.lookups = 0
+        self.exact_hits = 0
+        self.canonical_hits = 0
+
+    def __len__(self):
+        return len(self.exact_ids)
+
+    def lookup(self, text):
+        """Return the id of the question matching text exactly, then canonically, or None"""
+        self.lookups += 1
+
+        question_id = self.exact_ids.get(text)
+        if question_id is not None:
+            self.exact_hits += 1
+            return question_id
+
+        question_id = self.canonical_ids.get(canonical_text(text))
+        if question_id is not None:
+            self.canonical_hits += 1
+        return question_id
+
+    def stats(self):
+        """Return the lookup counters and the share of lookups answered by the index"""
+        return exact_match_stats([self])
+
+
+def exact_match_stats(indexes):
+    """Sum the counters of several indexes, e.g. one per subject"""
+    lookups = sum(index.lookups for index in indexes)
+    exact_hits = sum(index.exact_hits for index in indexes)
+    canonical_hits = sum(index.canonical_hits for index in indexes)
+    return {
+        "lookups": lookups,
+        "exact_hits": exact_hits,
+        "canonical_hits": canonical_hits,
+        "hit_rate": (exact_hits + canonical_hits) / lookups if lookups else 0.0,
+    }
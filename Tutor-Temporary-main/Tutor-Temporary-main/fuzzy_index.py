@@ -0,0 +1,130 @@
+import logging
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from inverted_index import InvertedIndex
+from text_normalizer import WORD_RE, STOP_WORDS
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Character n-grams inside word boundaries, so a typo only breaks the n-grams around it
+FUZZY_NGRAM_RANGE = (3, 5)
+
+# Stored n-gram weights are capped at this multiple of the word-level matrix's nonzeros...
+FUZZY_MEMORY_RATIO = 2.0
+
+# ...but every question keeps at least this many, or short questions become unmatchable
+FUZZY_MIN_NGRAMS = 16
+
+# Minimum character n-gram cosine for a fuzzy match to be used
+FUZZY_THRESHOLD = 0.4
+
+# Share of the query's distinct n-grams the matched question must contain. The cosine alone can't
+# reject an unrelated query: n-grams the index doesn't know drop out of the query before it is
+# normalized, so one word resembling a stored one scores as if it were the whole query
+FUZZY_MIN_SHARED = 0.15
+
+
+def strip_stop_words(text):
+    """Lowercase and drop stop words so shared filler like "what is a" can't carry a fuzzy match"""
+    return ' '.join(word for word in WORD_RE.findall(text.lower()) if word not in STOP_WORDS)
+
+
+def prune_rows(X, budget):
+    """Keep each row's highest weights, with one per-row cap chosen so the total fits the budget"""
+    X = X.tocsr()
+    if X.nnz <= budget:
+        return X
+
+    row_nnz = np.diff(X.indptr)
+
+    # Largest cap k with sum(min(row_nnz, k)) <= budget
+    low, high = 0, int(row_nnz.max())
+    while low < high:
+        k = (low + high + 1) // 2
+        if np.minimum(row_nnz, k).sum() <= budget:
+            low = k
+        else:
+            high = k - 1
+    cap = max(low, 1)
+
+    # Rank every entry within its row by descending weight and drop those past the cap
+    rows = np.repeat(np.arange(X.shape[0]), row_nnz)
+    order = np.lexsort((-X.data, rows))
+    ranks = np.empty(X.nnz, dtype=np.int64)
+    ranks[order] = np.arange(X.nnz) - np.repeat(X.indptr[:-1], row_nnz)
+    X.data[ranks >= cap] = 0
+    X.eliminate_zeros()
+    return X
+
+
+class PrunedPostings(InvertedIndex):
+    """Postings over rows that were L2-normalized before pruning"""
+
+    def _posting_weights(self, X):
+        # Keeping the pre-pruning scale means pruning can only lower a score, never inflate it
+        return X
+
+
+class CharNgramIndex:
+    """Character n-gram TF-IDF search that still finds questions when the query has typos"""
+
+    def __init__(self, questions, answers=None, max_nnz=None, ngram_range=FUZZY_NGRAM_RANGE, stored=None):
+        if stored is not None:
+            # (vectorizer, postings) saved by model_artifact.py, which can't store the preprocessor
+            self.vectorizer, postings = stored
+            self.vectorizer.preprocessor = strip_stop_words
+            self.postings = PrunedPostings(self.vectorizer, None, questions, answers, postings=postings)
+            self.analyzer = self.vectorizer.build_analyzer()
+            return
+
+        vectorizer = TfidfVectorizer(analyzer='char_wb', ngram_range=ngram_range, preprocessor=strip_stop_words)
+        X = vectorizer.fit_transform(questions)
+        full_nnz = X.nnz
+
+        if max_nnz is not None:
+            X = prune_rows(X, max(max_nnz, FUZZY_MIN_NGRAMS * X.shape[0]))
+
+            # Forget n-grams no stored row kept, so the vocabulary shrinks along with the matrix
+            used = np.flatnonzero(np.bincount(X.indices, minlength=X.shape[1]))
+            terms = vectorizer.get_feature_names_out()[used]
+            pruned = TfidfVectorizer(analyzer='char_wb', ngram_range=ngram_range, preprocessor=strip_stop_words,
+                                     vocabulary={term: i for i, term in enumerate(terms)})
+            pruned.idf_ = vectorizer.idf_[used]
+            vectorizer, X = pruned, X[:, used]
+
+        self.vectorizer = vectorizer
+        self.postings = PrunedPostings(vectorizer, X, questions, answers)
+        self.analyzer = vectorizer.build_analyzer()
+        logger.debug(f"Built character n-gram index with {X.nnz} of {full_nnz} weights and {X.shape[1]} n-grams")
+
+    def __len__(self):
+        return len(self.postings)
+
+    @property
+    def nnz(self):
+        return self.postings.postings.nnz
+
+    def best_matches(self, texts):
+        """Return (index, score) of the closest question by character n-grams for each text
+
+        A question sharing less than FUZZY_MIN_SHARED of a text's n-grams is no match, (0, 0.0).
+        """
+        results = []
+        for text, matches in zip(texts, self.postings.search_many(texts, 1)):
+            if matches and self.shared_ngrams(text, matches[0][0]) >= FUZZY_MIN_SHARED:
+                results.append(matches[0])
+            else:
+                results.append((0, 0.0))
+        return results
+
+    def shared_ngrams(self, text, question_id):
+        """Share of the text's distinct n-grams that the stored question contains"""
+        ngrams = set(self.analyzer(text))
+        if not ngrams:
+            return 0.0
+        vocabulary = self.vectorizer.vocabulary_
+        terms = [vocabulary[ngram] for ngram in ngrams if ngram in vocabulary]
+        # Each postings row lists a question at most once, so matching entries count shared n-grams
+        shared = np.count_nonzero(self.postings.postings[terms].indices == question_id) if terms else 0
+        return shared / len(ngrams)
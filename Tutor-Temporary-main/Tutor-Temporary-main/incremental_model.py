@@ -0,0 +1,316 @@
+import argparse
+import json
+import logging
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+from model_artifact import vectorizer_params
+from qa_store import iter_training_pairs
+from response_cache import model_file_version
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Settings that prune the vocabulary by corpus-wide statistics, which an append-only vocabulary can't honour
+PRUNING_DEFAULTS = {'max_df': 1.0, 'min_df': 1, 'max_features': None}
+
+
+def counts_path(model_path):
+    """Where the term counts of a pickled model live: next to it, same name, .counts.npz"""
+    return os.path.splitext(model_path)[0] + '.counts.npz'
+
+
+def subject_questions(qa_list):
+    """The questions of one subject's QA list, one per model row, paired exactly as model_rows pairs them"""
+    # A trailing question without an answer has no row, so it must not be counted either
+    return [question for _, pairs in iter_training_pairs({None: qa_list}) for question, _ in pairs]
+
+
+def write_model_atomically(path, vectorizer, X, training_data):
+    """Pickle (vectorizer, X, training_data) to a temporary file and rename it over path, so no reader sees half a model"""
+    directory = os.path.dirname(path) or '.'
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((vectorizer, X, training_data), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class IncrementalTfidf:
+    """Raw term counts and document frequencies of a model, so subjects can change without refitting the rest
+
+    Term ids only ever grow: a new word gets the next column and a word that drops out of the
+    corpus keeps its column with a document frequency of 0 and an IDF of 0, so it never counts.
+    """
+
+    def __init__(self, params, terms=(), df=None, blocks=None):
+        self.params = params
+        self.terms = list(terms)
+        self.vocabulary = {term: i for i, term in enumerate(self.terms)}
+        self.df = np.zeros(len(self.terms), dtype=np.int64) if df is None else np.asarray(df, dtype=np.int64)
+        # Subject -> questions x terms count matrix, in model row order
+        self.blocks = dict(blocks or {})
+        self._analyzer = self._vectorizer().build_analyzer()
+
+    @classmethod
+    def fit(cls, training_data, vectorizer=None):
+        """Count every subject of training_data once, with the settings of vectorizer (default TfidfVectorizer)"""
+        vectorizer = vectorizer or TfidfVectorizer()
+        for name, default in PRUNING_DEFAULTS.items():
+            if getattr(vectorizer, name) != default:
+                raise ValueError(f"Vectorizers with {name}={getattr(vectorizer, name)!r} can't be updated incrementally")
+
+        model = cls(vectorizer_params(vectorizer))
+        for subject, qa_list in training_data.items():
+            model.set_subject(subject, qa_list)
+        return model
+
+    @classmethod
+    def combine(cls, parts):
+        """Join counts made separately, e.g. one subject per worker process; later parts replace earlier subjects"""
+        parts = list(parts)
+        if not parts:
+            return cls.fit({})
+        model = cls(parts[0].params)
+        for part in parts:
+            if part.params != model.params:
+                raise ValueError("Counts made with different vectorizer settings can't be combined")
+            # Where each of the part's terms lands in the combined vocabulary
+            mapping = np.array([model._term_id(term) for term in part.terms], dtype=np.int32)
+            for subject, block in part.blocks.items():
+                remapped = csr_matrix((block.data, mapping[block.indices], block.indptr), shape=(block.shape[0], len(model.terms)))
+                remapped.sort_indices()
+                model._set_block(subject, remapped)
+        return model
+
+    def __getstate__(self):
+        # The analyzer is rebuilt from the settings, so counts pickle cleanly to and from worker processes
+        state = dict(self.__dict__)
+        del state['_analyzer']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._analyzer = self._vectorizer().build_analyzer()
+
+    def __len__(self):
+        return sum(block.shape[0] for block in self.blocks.values())
+
+    def _vectorizer(self, vocabulary=None):
+        params = dict(self.params)
+        params['ngram_range'] = tuple(params['ngram_range'])
+        return TfidfVectorizer(vocabulary=vocabulary, **params)
+
+    def _term_id(self, term):
+        """The id of a term, giving a new term the next free id"""
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            term_id = self.vocabulary[term] = len(self.terms)
+            self.terms.append(term)
+        return term_id
+
+    def _count(self, questions):
+        """Count the terms of each question"""
+        indices, indptr = [], [0]
+        for question in questions:
+            indices.extend(self._term_id(term) for term in self._analyzer(question))
+            indptr.append(len(indices))
+
+        block = csr_matrix((np.ones(len(indices), dtype=np.int32), indices, indptr), shape=(len(questions), len(self.terms)))
+        # Repeated terms of a question become one entry, with sorted ids
+        block.sum_duplicates()
+        return block
+
+    def _add_df(self, block, sign):
+        """Add (sign=1) or remove (sign=-1) the document frequencies of a block's rows"""
+        if len(self.df) < len(self.terms):
+            self.df = np.concatenate([self.df, np.zeros(len(self.terms) - len(self.df), dtype=np.int64)])
+        # Each row lists a term at most once, so counting ids counts documents
+        self.df += sign * np.bincount(block.indices, minlength=len(self.terms))
+
+    def set_subject(self, subject, qa_list):
+        """Add a subject or replace its questions; only the subject's own questions are tokenized"""
+        self._set_block(subject, self._count(subject_questions(qa_list)))
+
+    def _set_block(self, subject, block):
+        old = self.blocks.get(subject)
+        if old is not None:
+            self._add_df(old, -1)
+        self._add_df(block, 1)
+        # Replacing keeps the subject's place in the row order, as assigning into training_data does
+        self.blocks[subject] = block
+
+    def append_pairs(self, subject, qa_list):
+        """Add question/answer pairs at the end of a subject's rows"""
+        block = self._count(subject_questions(qa_list))
+        self._add_df(block, 1)
+        old = self.blocks.get(subject)
+        self.blocks[subject] = block if old is None else vstack([self._padded(old), block], format='csr')
+
+    def remove_subject(self, subject):
+        old = self.blocks.pop(subject, None)
+        if old is not None:
+            self._add_df(old, -1)
+
+    def _padded(self, block):
+        """A block widened to the current vocabulary; its entries are unchanged"""
+        return csr_matrix((block.data, block.indices, block.indptr), shape=(block.shape[0], len(self.terms)))
+
+    def idf(self):
+        """IDF of every term as TfidfTransformer computes it, 0 for terms no question uses any more"""
+        n = len(self)
+        df = self.df.astype(np.float64)
+        present = self.df > 0
+        idf = np.zeros(len(self.terms))
+        if self.params['smooth_idf']:
+            idf[present] = np.log((1 + n) / (1 + df[present])) + 1
+        else:
+            idf[present] = np.log(n / df[present]) + 1
+        return idf
+
+    def vectorizer(self):
+        """A TfidfVectorizer over the append-only vocabulary that transforms queries like a full refit would"""
+        vectorizer = self._vectorizer(dict(self.vocabulary))
+        if self.params['use_idf']:
+            vectorizer.idf_ = self.idf()
+        return vectorizer
+
+    def matrix(self):
+        """The TF-IDF matrix of every question, weighted from the stored counts without tokenizing anything"""
+        if not self.blocks:
+            return csr_matrix((0, len(self.terms)))
+        X = vstack([self._padded(block) for block in self.blocks.values()], format='csr').astype(np.float64)
+
+        # Same steps, in the same order, as TfidfVectorizer.fit_transform
+        if self.params['binary']:
+            X.data[:] = 1
+        if self.params['sublinear_tf']:
+            np.log(X.data, X.data)
+            X.data += 1
+        if self.params['use_idf']:
+            X.data *= self.idf()[X.indices]
+        if self.params['norm']:
+            X = normalize(X, norm=self.params['norm'], copy=False)
+        return X
+
+    def save(self, path, model_version=None):
+        subjects = list(self.blocks)
+        blocks = [self.blocks[subject] for subject in subjects]
+        stacked = vstack([self._padded(block) for block in blocks], format='csr') if blocks else csr_matrix((0, len(self.terms)))
+        np.savez(path, terms=np.array(self.terms, dtype=str), df=self.df,
+                 data=stacked.data, indices=stacked.indices, indptr=stacked.indptr,
+                 subjects=np.array(subjects, dtype=str), rows=np.array([block.shape[0] for block in blocks], dtype=np.int64),
+                 params=np.array(json.dumps(self.params)), model_version=np.array(model_version or ''))
+
+    @classmethod
+    def load(cls, path):
+        """Return (counts, model_version) from a file written by save()"""
+        with np.load(path) as saved:
+            terms = saved['terms'].tolist()
+            stacked = csr_matrix((saved['data'], saved['indices'], saved['indptr']), shape=(len(saved['indptr']) - 1, len(terms)))
+            starts = np.concatenate([[0], np.cumsum(saved['rows'])])
+            blocks = {subject: stacked[starts[i]:starts[i + 1]] for i, subject in enumerate(saved['subjects'].tolist())}
+            model = cls(json.loads(str(saved['params'])), terms, saved['df'], blocks)
+            return model, str(saved['model_version']) or None
+
+
+def load_counts(model_path):
+    """The stored counts of model_path, or None when they are missing or belong to another version of it"""
+    path = counts_path(model_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        counts, model_version = IncrementalTfidf.load(path)
+    except Exception as e:
+        logger.debug(f"Could not load term counts from {path}: {str(e)}")
+        return None
+    if model_version != model_file_version(model_path):
+        logger.debug(f"Term counts {path} belong to a different model file; recounting")
+        return None
+    return counts
+
+
+def update_model(model_path, subjects, output_path=None, append=False):
+    """Add or replace subjects of a saved (vectorizer, X, training_data) model and save it with its counts
+
+    subjects maps a subject to its alternating question/answer list. With append, the pairs are added
+    to the end of the subject instead of replacing it. Only the new questions are tokenized, unless the
+    model has no current counts yet, in which case it is counted once in full.
+    """
+    output_path = output_path or model_path
+    with open(model_path, 'rb') as f:
+        model_data = pickle.load(f)
+    if not (isinstance(model_data, tuple) and len(model_data) == 3):
+        raise ValueError(f"{model_path} is not a (vectorizer, X, training_data) model")
+    vectorizer, _, training_data = model_data
+
+    counts = load_counts(model_path)
+    if counts is None:
+        counts = IncrementalTfidf.fit(training_data, vectorizer)
+
+    for subject, qa_list in subjects.items():
+        if append:
+            counts.append_pairs(subject, qa_list)
+            training_data[subject] = list(training_data.get(subject, [])) + list(qa_list)
+        else:
+            counts.set_subject(subject, qa_list)
+            training_data[subject] = qa_list
+
+    vectorizer, X = counts.vectorizer(), counts.matrix()
+    write_model_atomically(output_path, vectorizer, X, training_data)
+    counts.save(counts_path(output_path), model_file_version(output_path))
+    return vectorizer, X, training_data
+
+
+def refit_difference(vectorizer, X, training_data):
+    """Largest absolute difference between X and a full TfidfVectorizer refit, compared term by term"""
+    questions = [q for qa_list in training_data.values() for q in subject_questions(qa_list)]
+    refit = TfidfVectorizer(**{name: getattr(vectorizer, name) for name in vectorizer_params(vectorizer)})
+    refit_X = refit.fit_transform(questions)
+
+    # The refit sorts its vocabulary; pick the same terms out of the append-only columns
+    columns = [vectorizer.vocabulary[term] for term in refit.get_feature_names_out()]
+    aligned = X.tocsc()[:, columns]
+    if abs(aligned).sum() < abs(X).sum() - 1e-9:
+        # Some weight sits on a term the refit doesn't have at all
+        return float('inf')
+    return abs(aligned - refit_X).max() if refit_X.nnz else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add or replace a subject of a pickled (vectorizer, X, training_data) model without refitting it")
+    parser.add_argument("--model", default="model/large_ai_tutor_model.pkl", help="saved (vectorizer, X, training_data) model")
+    parser.add_argument("--subject", required=True, help="subject to add or replace")
+    parser.add_argument("--pairs", required=True, help="JSON file with a list of [question, answer] pairs")
+    parser.add_argument("--append", action="store_true", help="add the pairs to the subject instead of replacing it")
+    parser.add_argument("--output", help="where to save the updated model (default: overwrite --model)")
+    parser.add_argument("--check", action="store_true", help="compare the result against a full refit")
+    args = parser.parse_args()
+
+    with open(args.pairs) as f:
+        qa_list = [text for pair in json.load(f) for text in pair]
+
+    start = time.perf_counter()
+    vectorizer, X, training_data = update_model(args.model, {args.subject: qa_list}, args.output, args.append)
+    print(f"Updated {args.subject} with {len(qa_list) // 2} QA pairs in {time.perf_counter() - start:.2f}s; "
+          f"model has {X.shape[0]} questions and {len(vectorizer.vocabulary)} terms")
+
+    if args.check:
+        start = time.perf_counter()
+        difference = refit_difference(vectorizer, X, training_data)
+        print(f"Largest difference from a full refit: {difference:.2e} (refit and compare took {time.perf_counter() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
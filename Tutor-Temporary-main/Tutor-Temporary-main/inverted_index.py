@@ -0,0 +1,104 @@
+import logging
+import numpy as np
+from sklearn.preprocessing import normalize
+from qa_store import as_sequence, iter_training_pairs
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+
+def model_rows(training_data):
+    """Return (questions, answers, subjects) in the row order of a saved model's X"""
+    questions, answers, subjects = [], [], []
+
+    # X rows follow the order the model scripts fit them in: subject by subject, pair by pair
+    for subject, pairs in iter_training_pairs(training_data):
+        for question, answer in pairs:
+            questions.append(question)
+            answers.append(answer)
+            subjects.append(subject)
+    return questions, answers, subjects
+
+
+class InvertedIndex:
+    """Postings lists (term id -> question ids and weights) over a TF-IDF matrix"""
+
+    def __init__(self, vectorizer, X, questions, answers=None, subjects=None, postings=None):
+        self.vectorizer = vectorizer
+        self.questions = as_sequence(questions)
+        self.answers = as_sequence(answers) if answers is not None else None
+
+        # Term x question matrix: row t holds the postings list of term t. A saved index passes
+        # its postings in, already weighted and sorted, so they stay memory-mapped
+        if postings is None:
+            postings = self._posting_weights(X).T.tocsr()
+            postings.sort_indices()
+        self.postings = postings
+        self.num_docs = postings.shape[1]
+
+        # Optional per-question subject labels so one index can serve every subject
+        self.subject_names = []
+        self.subject_ids = None
+        if subjects is not None:
+            self.subject_names = sorted(set(subjects))
+            lookup = {name: i for i, name in enumerate(self.subject_names)}
+            self.subject_ids = np.array([lookup[s] for s in subjects], dtype=np.int32)
+
+    def __len__(self):
+        return self.num_docs
+
+    def _posting_weights(self, X):
+        """Per question term weights; rows are L2-normalized so summing posting weights gives the cosine"""
+        return normalize(X, norm='l2')
+
+    def query_matrix(self, texts):
+        """Turn query texts into rows over the same vocabulary as the postings"""
+        return self.vectorizer.transform(texts)
+
+    def score_matrix(self, query_matrix):
+        """Score a batch of query rows with one sparse product that only reads their terms' postings"""
+        return (query_matrix @ self.postings).tocsr()
+
+    def search(self, text, k=5, subject=None, return_touched=False):
+        """Return up to k (question id, score) pairs, best first, ties broken by lowest id
+
+        With return_touched, return (pairs, number of documents scored) instead.
+        """
+        results, touched = self.search_many([text], k, subject, return_touched=True)
+        return (results[0], touched[0]) if return_touched else results[0]
+
+    def search_many(self, texts, k=5, subject=None, return_touched=False):
+        """Run search for every text with a single transform and a single sparse product
+
+        With return_touched, return (results, documents scored per text) instead; the counts go
+        back to the caller because the index is shared by every session.
+        """
+        scores = self.score_matrix(self.query_matrix(texts))
+        results = []
+        touched = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            touched.append(int(end - start))
+            results.append(self._top_k(scores.indices[start:end], scores.data[start:end], k, subject))
+        return (results, touched) if return_touched else results
+
+    def _top_k(self, docs, scores, k, subject):
+        """Pick the k best scored documents, optionally restricted to one subject"""
+        # Restrict to one subject when the index spans several
+        if subject is not None and self.subject_ids is not None and len(docs):
+            if subject not in self.subject_names:
+                return []
+            keep = self.subject_ids[docs] == self.subject_names.index(subject)
+            docs, scores = docs[keep], scores[keep]
+
+        if not len(docs) or k <= 0:
+            return []
+
+        # Bounded selection: keep everything tied with the k-th best score, then order exactly
+        if len(docs) > k:
+            kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+            keep = scores >= kth_score
+            docs, scores = docs[keep], scores[keep]
+
+        order = np.lexsort((docs, -scores))[:k]
+        return [(int(docs[i]), float(scores[i])) for i in order]
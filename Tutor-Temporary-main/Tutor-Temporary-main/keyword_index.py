@@ -0,0 +1,66 @@
+from collections import defaultdict
+import numpy as np
+from text_normalizer import WORD_RE
+
+# Relevance weights of a keyword found in the question and in the answer
+QUESTION_WEIGHT = 3
+ANSWER_WEIGHT = 2
+
+# Answers this many words long or more get the full length bonus of 1
+LENGTH_BONUS_WORDS = 50
+
+
+def relevance_weight(in_question, in_answer, answer):
+    """Relevance of a QA pair to one keyword: question hits count more, longer answers get up to 1 extra"""
+    score = QUESTION_WEIGHT * in_question + ANSWER_WEIGHT * in_answer
+    return score + min(len(answer.split()) / LENGTH_BONUS_WORDS, 1)
+
+
+class KeywordIndex:
+    """Token postings over questions and answers with each (token, pair) relevance precomputed"""
+
+    def __init__(self, qa_pairs):
+        self.questions = []
+        self.answers = []
+        postings = defaultdict(lambda: ([], []))
+
+        for pair_id, (question, answer) in enumerate(qa_pairs):
+            self.questions.append(question)
+            self.answers.append(answer)
+            question_tokens = set(WORD_RE.findall(question.lower()))
+            answer_tokens = set(WORD_RE.findall(answer.lower()))
+            for token in question_tokens | answer_tokens:
+                ids, weights = postings[token]
+                ids.append(pair_id)
+                weights.append(relevance_weight(token in question_tokens, token in answer_tokens, answer))
+
+        # Ids ascend within every list because pairs were added in order
+        self.postings = {token: (np.array(ids, dtype=np.int32), np.array(weights, dtype=np.float64))
+                         for token, (ids, weights) in postings.items()}
+
+    def __len__(self):
+        return len(self.answers)
+
+    def rank(self, keywords, limit=2):
+        """Return up to limit (pair id, relevance) hits for the keywords, best first
+
+        Every (pair, keyword) hit counts on its own, so a pair matching several keywords can fill
+        several places. Ties go to the earlier pair, then the earlier keyword.
+        """
+        pair_ids, keyword_positions, scores = [], [], []
+        for position, keyword in enumerate(keywords):
+            posting = self.postings.get(keyword)
+            if posting is None:
+                continue
+            pair_ids.append(posting[0])
+            keyword_positions.append(np.full(len(posting[0]), position, dtype=np.int32))
+            scores.append(posting[1])
+
+        if not pair_ids:
+            return []
+
+        pair_ids = np.concatenate(pair_ids)
+        keyword_positions = np.concatenate(keyword_positions)
+        scores = np.concatenate(scores)
+        order = np.lexsort((keyword_positions, pair_ids, -scores))[:limit]
+        return [(int(pair_ids[i]), float(scores[i])) for i in order]
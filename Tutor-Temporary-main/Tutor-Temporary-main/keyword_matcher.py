@@ -0,0 +1,112 @@
+from collections import deque
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton that finds every keyword occurring in a text in one pass"""
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+
+        # Trie of keyword characters: goto[state][char] -> next state
+        self.goto = [{}]
+        self.outputs = [set()]
+        for keyword_id, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.outputs.append(set())
+                state = next_state
+            self.outputs[state].add(keyword_id)
+
+        # Failure links, built breadth first so a state's fallback is always finished before it
+        self.fail = [0] * len(self.goto)
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                # A state also reports every keyword that ends at its fallback
+                self.outputs[next_state] |= self.outputs[self.fail[next_state]]
+
+        # Freeze outputs so matching never copies them
+        self.outputs = [frozenset(ids) for ids in self.outputs]
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def find_ids(self, text):
+        """Return the set of keyword ids that occur anywhere in text (substring semantics, like `in`)"""
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
+
+    def find(self, text):
+        """Return the keywords that occur anywhere in text"""
+        return {self.keywords[i] for i in self.find_ids(text)}
+
+
+class RuleMatcher:
+    """Ordered keyword rules for one subject, compiled into a single automaton
+
+    A rule is (groups, answer): it fires when every group has at least one of its terms in the
+    question. When several rules fire, the one listed first wins, exactly like checking them in order.
+    """
+
+    def __init__(self, rules):
+        self.rules = [(tuple(tuple(group) for group in groups), answer) for groups, answer in rules]
+
+        # Every distinct term gets one automaton keyword; each term knows the rules it can trigger
+        term_ids = {}
+        self.term_rules = []
+        for rule_id, (groups, _) in enumerate(self.rules):
+            for group in groups:
+                for term in group:
+                    if term not in term_ids:
+                        term_ids[term] = len(term_ids)
+                        self.term_rules.append([])
+                    if rule_id not in self.term_rules[term_ids[term]]:
+                        self.term_rules[term_ids[term]].append(rule_id)
+        self.automaton = KeywordAutomaton(term_ids)
+
+        # Groups as term id sets, so checking a rule is a few set intersections
+        self.rule_groups = [[frozenset(term_ids[term] for term in group) for group in groups] for groups, _ in self.rules]
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, text):
+        """Return (rule id, answer) of the first rule satisfied by text, or None"""
+        present = self.automaton.find_ids(text)
+        if not present:
+            return None
+
+        # Only rules touched by a present term can fire; try them in table order
+        candidates = sorted({rule_id for term_id in present for rule_id in self.term_rules[term_id]})
+        for rule_id in candidates:
+            if all(group & present for group in self.rule_groups[rule_id]):
+                return rule_id, self.rules[rule_id][1]
+        return None
+
+    def first_term(self, rule_id):
+        """The first term of a rule, used to label matches in logs"""
+        return self.rules[rule_id][0][0][0]
+
+
+def compile_rule_table(table):
+    """Compile a {subject: [(groups, answer), ...]} table into one RuleMatcher per subject"""
+    return {subject: RuleMatcher(rules) for subject, rules in table.items()}
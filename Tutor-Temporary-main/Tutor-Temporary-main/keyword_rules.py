@@ -0,0 +1,52 @@
+from keyword_matcher import compile_rule_table
+
+# Rule tables for the keyword stages of app.AITutor.get_response.
+# A rule is (groups, answer) and fires when every group has at least one of its terms in the
+# lowercased question; within a subject the first listed rule that fires wins.
+
+QUADRATIC_FORMULA_ANSWER = "The quadratic formula is used to solve equations in the form ax² + bx + c = 0. The formula is: x = (-b ± √(b² - 4ac)) / 2a, where a, b, and c are coefficients in the quadratic equation. The discriminant (b² - 4ac) determines the number of solutions: if positive, there are two real solutions; if zero, there is one real solution; if negative, there are two complex solutions."
+
+FORMULA_ANSWER = "A formula in mathematics is a fact or rule written with mathematical symbols. It typically uses an equals sign (=) to show that two expressions have the same value. Formulas express relationships between various quantities and provide a concise way to solve problems. Common mathematical formulas include the quadratic formula (x = (-b ± √(b² - 4ac)) / 2a), the area of a circle (A = πr²), the Pythagorean theorem (a² + b² = c²), and many others specific to different branches of mathematics."
+
+GRAPH_ANSWER = "In mathematics, a graph is a structure used to model pairwise relations between objects. Graphs consist of vertices (also called nodes or points) which are connected by edges (also called links or lines). Graphs can be used to model many types of relations and processes in physical, biological, social, and information systems. In mathematics, graphs are used in the study of graph theory."
+
+# Checked before arithmetic handling
+SPECIAL_CASE_RULES = {
+    "Mathematics": [
+        ((("quadratic",), ("formula", "equation")), QUADRATIC_FORMULA_ANSWER),
+        ((("formula", "fromula"),), FORMULA_ANSWER),
+    ],
+}
+
+# Direct keyword answers, in priority order
+SUBJECT_KEYWORDS = {
+    "Mathematics": {
+        "pythagorean": "The Pythagorean theorem states that in a right-angled triangle, the square of the length of the hypotenuse is equal to the sum of the squares of the other two sides. It is represented by the equation: a² + b² = c², where c is the length of the hypotenuse and a and b are the lengths of the other two sides.",
+        "quadratic": "Quadratic equations can be solved using the quadratic formula: x = (-b ± √(b² - 4ac)) / 2a, where ax² + bx + c = 0. Alternatively, you can solve by factoring, completing the square, or graphing, depending on the specific equation.",
+        "matrices": "Matrices are rectangular arrays of numbers, symbols, or expressions arranged in rows and columns. They are used in linear algebra for representing linear transformations and solving systems of linear equations.",
+        "matrix": "Matrices are rectangular arrays of numbers, symbols, or expressions arranged in rows and columns. They are used in linear algebra for representing linear transformations and solving systems of linear equations.",
+        "calculus": "Calculus is a branch of mathematics that focuses on the study of continuous change. It has two main branches: differential calculus (concerning rates of change and slopes of curves) and integral calculus (concerning accumulation of quantities and areas under curves).",
+        "algebra": "Algebra is a branch of mathematics that uses symbols and letters to represent numbers and quantities in formulas and equations. It introduces the concept of variables and provides tools for solving equations.",
+        "equation": "Equations are mathematical statements that assert the equality of two expressions. They typically contain variables and state that the expressions on either side of the equals sign have the same value.",
+        "trigonometry": "Trigonometry is a branch of mathematics that studies the relationships between the sides and angles of triangles. It defines trigonometric functions such as sine, cosine, and tangent, which relate the angles of a triangle to the lengths of its sides.",
+        "geometry": "Geometry is a branch of mathematics concerned with questions of shape, size, relative position of figures, and the properties of space. It includes the study of points, lines, angles, surfaces, and solids.",
+    },
+    "Science": {
+        "photosynthesis": "Photosynthesis is the process by which green plants, algae, and some bacteria convert light energy, usually from the sun, into chemical energy in the form of glucose or other sugars. Plants take in carbon dioxide and water, and with the energy from sunlight, convert them into glucose and oxygen.",
+        "states of matter": "The four primary states of matter are solid, liquid, gas, and plasma. Each state has unique properties based on the arrangement and energy of their particles. Solids have fixed shape and volume, liquids have fixed volume but take the shape of their container, gases expand to fill their container, and plasma is an ionized gas that conducts electricity.",
+        "scientific method": "The scientific method is a systematic approach to research that involves making observations, formulating a hypothesis, testing the hypothesis through experiments, analyzing data, and drawing conclusions. It is the foundation of scientific inquiry and ensures that findings are based on evidence rather than assumptions.",
+        "cellular respiration": "Cellular respiration is the process by which cells convert nutrients into energy in the form of ATP. It involves three main stages: glycolysis, the Krebs cycle (citric acid cycle), and the electron transport chain. This process requires oxygen and produces carbon dioxide as a waste product.",
+        "biology": "Biology is the scientific study of living organisms and their interactions with each other and their environments. It encompasses various specialized fields such as molecular biology, cellular biology, genetics, ecology, evolutionary biology, and physiology.",
+        "chemistry": "Chemistry is the scientific discipline that studies the composition, structure, properties, and changes of matter. It examines atoms, the elements, how they bond to form molecules and compounds, and how substances interact with energy.",
+        "physics": "Physics is the natural science that studies matter, its motion and behavior through space and time, and the related entities of energy and force. It is one of the most fundamental scientific disciplines, with its main goal being to understand how the universe behaves.",
+        "ecology": "Ecology is the branch of biology that studies the relationships between living organisms, including humans, and their physical environment. It examines how organisms interact with each other and with their environment, including the distribution and abundance of organisms.",
+    },
+}
+
+# Checked after arithmetic handling; the graph special case goes ahead of the plain keywords
+KEYWORD_RULES = {subject: [(((keyword,),), answer) for keyword, answer in keywords.items()] for subject, keywords in SUBJECT_KEYWORDS.items()}
+KEYWORD_RULES["Mathematics"].insert(0, ((("graph",),), GRAPH_ANSWER))
+
+# Compiled once at import: one automaton per subject and stage
+SPECIAL_CASE_MATCHERS = compile_rule_table(SPECIAL_CASE_RULES)
+KEYWORD_MATCHERS = compile_rule_table(KEYWORD_RULES)
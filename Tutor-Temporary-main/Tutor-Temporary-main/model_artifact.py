@@ -0,0 +1,240 @@
+import argparse
+import json
+import logging
+import os
+import pickle
+import time
+import numpy as np
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import TfidfVectorizer
+from inverted_index import model_rows
+from qa_store import TextColumn, iter_training_pairs
+from subject_index import SubjectIndex
+import text_normalizer
+from response_cache import model_file_version
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Vectorizer settings that change how a query is transformed; anything else is only used while fitting
+VECTORIZER_PARAMS = ('analyzer', 'binary', 'lowercase', 'ngram_range', 'norm', 'smooth_idf',
+                     'stop_words', 'strip_accents', 'sublinear_tf', 'token_pattern', 'use_idf')
+
+
+def artifact_path(model_path):
+    """Where the memory-mapped artifact of a pickled model lives: next to it, same name, .mmap"""
+    return os.path.splitext(model_path)[0] + '.mmap'
+
+
+def vectorizer_params(vectorizer, drop_preprocessor=False):
+    """The query-time settings of a fitted TfidfVectorizer, checked to be storable as JSON"""
+    params = {name: getattr(vectorizer, name) for name in VECTORIZER_PARAMS}
+    if callable(params['analyzer']) or (vectorizer.preprocessor is not None and not drop_preprocessor) or vectorizer.tokenizer is not None:
+        raise ValueError("Vectorizers with custom analyzers, preprocessors or tokenizers can't be stored as an artifact")
+    if params['stop_words'] is not None and not isinstance(params['stop_words'], str):
+        params['stop_words'] = sorted(params['stop_words'])
+    params['ngram_range'] = list(params['ngram_range'])
+    return params
+
+
+def vocabulary_arrays(vectorizer):
+    """The vocabulary as (sorted terms, matrix column of each term)"""
+    # Vectorizers built around a fixed vocabulary only get vocabulary_ once they first transform
+    vocabulary = getattr(vectorizer, 'vocabulary_', None) or vectorizer.vocabulary
+    terms = sorted(vocabulary)
+    return np.array(terms, dtype=str), np.array([vocabulary[term] for term in terms], dtype=np.int64)
+
+
+def stored_vectorizer(terms, columns, idf, params):
+    """Rebuild a fitted TfidfVectorizer from vocabulary_arrays, its idf and vectorizer_params"""
+    params = dict(params)
+    params['ngram_range'] = tuple(params['ngram_range'])
+    vectorizer = TfidfVectorizer(vocabulary=dict(zip(terms.tolist(), columns.tolist())), **params)
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+def write_index(directory, vectorizer, postings, rows=None):
+    """Write a fitted vectorizer, the postings searched through it and optionally its rows, as .npy arrays plus JSON
+
+    A vectorizer with a custom preprocessor is stored without it; the index class that reads it sets it again.
+    """
+    os.makedirs(directory, exist_ok=True)
+    terms, columns = vocabulary_arrays(vectorizer)
+    arrays = {
+        'postings_data': postings.data, 'postings_indices': postings.indices, 'postings_indptr': postings.indptr,
+        'idf': vectorizer.idf_, 'terms': terms, 'columns': columns,
+    }
+    # Saved in their fitted entry order, so scores over the stored rows round exactly like fitted ones
+    if rows is not None:
+        arrays.update({'rows_data': rows.data, 'rows_indices': rows.indices, 'rows_indptr': rows.indptr})
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), array)
+
+    with open(os.path.join(directory, 'index.json'), 'w') as f:
+        json.dump({
+            "shape": [postings.shape[1], postings.shape[0]],
+            "rows": rows is not None,
+            "vectorizer": vectorizer_params(vectorizer, drop_preprocessor=True),
+        }, f, indent=2)
+
+
+def read_index(directory, mmap=True):
+    """Open a write_index directory and return (vectorizer, postings, rows or None), the matrices wrapping the mapped arrays"""
+    with open(os.path.join(directory, 'index.json')) as f:
+        manifest = json.load(f)
+
+    names = ['postings_data', 'postings_indices', 'postings_indptr', 'idf', 'terms', 'columns']
+    if manifest['rows']:
+        names += ['rows_data', 'rows_indices', 'rows_indptr']
+    mmap_mode = 'r' if mmap else None
+    arrays = {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode) for name in names}
+
+    num_rows, num_terms = manifest['shape']
+    postings = csr_matrix((arrays['postings_data'], arrays['postings_indices'], arrays['postings_indptr']), shape=(num_terms, num_rows), copy=False)
+    rows = None
+    if manifest['rows']:
+        rows = csr_matrix((arrays['rows_data'], arrays['rows_indices'], arrays['rows_indptr']), shape=(num_rows, num_terms), copy=False)
+    return stored_vectorizer(arrays['terms'], arrays['columns'], arrays['idf'], manifest['vectorizer']), postings, rows
+
+
+def write_subject_index(index, directory):
+    """Save a SubjectIndex's word-level and character n-gram parts so read_subject_index can map them back"""
+    write_index(os.path.join(directory, 'words'), index.vectorizer, index.postings.postings, index.matrix)
+    if index.fuzzy is not None:
+        write_index(os.path.join(directory, 'fuzzy'), index.fuzzy.vectorizer, index.fuzzy.postings.postings)
+
+
+def read_subject_index(directory, mmap=True):
+    """The stored form SubjectIndex takes: {'words': (vectorizer, rows, postings), 'fuzzy': (vectorizer, postings)}"""
+    vectorizer, postings, rows = read_index(os.path.join(directory, 'words'), mmap)
+    stored = {'words': (vectorizer, rows, postings)}
+    if os.path.exists(os.path.join(directory, 'fuzzy', 'index.json')):
+        vectorizer, postings, _ = read_index(os.path.join(directory, 'fuzzy'), mmap)
+        stored['fuzzy'] = (vectorizer, postings)
+    return stored
+
+
+def write_artifact(vectorizer, X, training_data, directory, model_version=None):
+    """Write (vectorizer, X, training_data) as .npy arrays, a UTF-8 text blob and a JSON manifest"""
+    os.makedirs(directory, exist_ok=True)
+    # Drop the old manifest first; it is written again last, so a half-written artifact never looks complete
+    manifest_path = os.path.join(directory, 'artifact.json')
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    X = csr_matrix(X)
+    X.sort_indices()
+
+    # Vocabulary as a sorted array; columns[i] is the matrix column of terms[i]
+    terms, columns = vocabulary_arrays(vectorizer)
+
+    # Questions and answers interleaved in X row order, so each subject's slice is its training_data list
+    questions, answers, subjects = model_rows(training_data)
+    texts = [text for pair in zip(questions, answers) for text in pair]
+    blob, offsets = TextColumn.encode(texts)
+    subject_names = list(training_data)
+    subject_offsets = np.searchsorted([subject_names.index(s) for s in subjects], np.arange(len(subject_names) + 1))
+
+    arrays = {
+        'X_data': X.data, 'X_indices': X.indices, 'X_indptr': X.indptr,
+        'idf': vectorizer.idf_, 'terms': terms, 'columns': columns,
+        'texts': blob, 'text_offsets': offsets, 'subject_offsets': subject_offsets.astype(np.int64),
+    }
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), array)
+
+    # The per-subject indexes the app's search stages score with, built here so every reader maps them instead
+    indexes = {}
+    for subject_id, (subject, pairs) in enumerate(iter_training_pairs(training_data)):
+        # A stemming analyzer can't be stored; readers fit their indexes instead
+        if not pairs or text_normalizer.STEMMING:
+            continue
+        try:
+            index = SubjectIndex([q for q, _ in pairs], [a for _, a in pairs], ranking='tfidf')
+        except ValueError:
+            # Every question is made of stop words; readers skip the subject just as they would when fitting
+            continue
+        indexes[subject] = f'index_{subject_id:03d}'
+        write_subject_index(index, os.path.join(directory, indexes[subject]))
+
+    with open(manifest_path, 'w') as f:
+        json.dump({
+            "model_version": model_version,
+            "shape": list(X.shape),
+            "subjects": subject_names,
+            "vectorizer": vectorizer_params(vectorizer),
+            "indexes": indexes,
+        }, f, indent=2)
+
+
+def read_artifact(directory, mmap=True):
+    """Open an artifact and return (vectorizer, X, training_data, manifest); arrays stay on disk when mmap is set"""
+    with open(os.path.join(directory, 'artifact.json')) as f:
+        manifest = json.load(f)
+
+    mmap_mode = 'r' if mmap else None
+    arrays = {}
+    for name in ('X_data', 'X_indices', 'X_indptr', 'idf', 'terms', 'columns', 'texts', 'text_offsets', 'subject_offsets'):
+        arrays[name] = np.load(os.path.join(directory, f'{name}.npy'), mmap_mode=mmap_mode)
+
+    # The matrix wraps the mapped arrays without copying them
+    X = csr_matrix((arrays['X_data'], arrays['X_indices'], arrays['X_indptr']), shape=tuple(manifest['shape']), copy=False)
+
+    vectorizer = stored_vectorizer(arrays['terms'], arrays['columns'], arrays['idf'], manifest['vectorizer'])
+
+    # Each subject is a slice of the interleaved text column, already in question/answer order
+    texts = TextColumn(arrays['texts'], arrays['text_offsets'])
+    subject_offsets = arrays['subject_offsets']
+    training_data = {
+        subject: texts[2 * subject_offsets[i]:2 * subject_offsets[i + 1]]
+        for i, subject in enumerate(manifest['subjects'])
+    }
+    return vectorizer, X, training_data, manifest
+
+
+def read_subject_indexes(directory, mmap=True):
+    """{subject: stored SubjectIndex} of the search indexes saved in an artifact; empty for older artifacts"""
+    with open(os.path.join(directory, 'artifact.json')) as f:
+        manifest = json.load(f)
+    return {subject: read_subject_index(os.path.join(directory, name), mmap) for subject, name in manifest.get('indexes', {}).items()}
+
+
+def load_model_artifact(model_path, directory=None):
+    """Return (vectorizer, X, training_data) from the artifact converted from model_path, or None when missing or stale"""
+    directory = directory or artifact_path(model_path)
+    if not os.path.exists(os.path.join(directory, 'artifact.json')):
+        return None
+    try:
+        vectorizer, X, training_data, manifest = read_artifact(directory)
+    except Exception as e:
+        logger.debug(f"Could not open model artifact {directory}: {str(e)}")
+        return None
+    # With the pickle deleted the artifact is the model; otherwise it must come from the current pickle
+    if os.path.exists(model_path) and manifest.get('model_version') != model_file_version(model_path):
+        logger.debug(f"Model artifact {directory} was converted from a different model file; rerun model_artifact.py")
+        return None
+    return vectorizer, X, training_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a pickled (vectorizer, X, training_data) model into a memory-mapped artifact")
+    parser.add_argument("--model", default="model/large_ai_tutor_model.pkl", help="saved (vectorizer, X, training_data) model")
+    parser.add_argument("--output", help="artifact directory (default: next to the model, .mmap)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.model, 'rb') as f:
+        vectorizer, X, training_data = pickle.load(f)
+    output = args.output or artifact_path(args.model)
+    write_artifact(vectorizer, X, training_data, output, model_file_version(args.model))
+    print(f"Converted {X.shape[0]} questions and {len(vectorizer.vocabulary_)} terms in "
+          f"{time.perf_counter() - start:.1f}s, saved to {output}")
+
+    start = time.perf_counter()
+    read_artifact(output)
+    print(f"Artifact opens in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from inverted_index import model_rows
+from model_artifact import read_artifact, read_subject_indexes, vectorizer_params, write_artifact
+from response_cache import model_file_version
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Bumped whenever the manifest or shard layout changes
+SHARD_FORMAT_VERSION = 1
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def shard_path(model_path):
+    """Where the sharded form of a pickled model lives: next to it, same name, .shards"""
+    return os.path.splitext(model_path)[0] + '.shards'
+
+
+def directory_hash(directory):
+    """SHA-256 over the relative paths and contents of the files under a directory, in path order"""
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(os.path.relpath(os.path.join(root, name), directory) for name in names)
+
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(path.replace(os.sep, '/').encode('utf-8'))
+        with open(os.path.join(directory, path), 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash(entries):
+    """Hash of the shard checksums in manifest order; it changes whenever any shard does, whatever the file times say"""
+    return hashlib.sha256(''.join(entry["sha256"] for entry in entries).encode('ascii')).hexdigest()
+
+
+def subject_vectorizer(vectorizer, X):
+    """Return (vectorizer, X) restricted to the terms X uses, so a shard only carries its own vocabulary"""
+    used = np.flatnonzero(np.bincount(X.indices, minlength=X.shape[1]))
+    terms = vectorizer.get_feature_names_out()[used]
+    params = vectorizer_params(vectorizer)
+    params['ngram_range'] = tuple(params['ngram_range'])
+    pruned = TfidfVectorizer(vocabulary={term: i for i, term in enumerate(terms)}, **params)
+    pruned.idf_ = vectorizer.idf_[used]
+    return pruned, X[:, used]
+
+
+def write_shards(vectorizer, X, training_data, directory, model_version=None):
+    """Split (vectorizer, X, training_data) into one artifact per subject plus a manifest listing them"""
+    os.makedirs(directory, exist_ok=True)
+    # Drop the old manifest first; it is written again last, so a half-written model never looks complete
+    manifest_path = os.path.join(directory, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+    _, _, subjects = model_rows(training_data)
+    X = X.tocsr()
+    entries = []
+    start = 0
+    for shard_id, subject in enumerate(training_data):
+        count = subjects.count(subject)
+        # A subject without questions has no rows and no terms to fit a shard vectorizer on
+        if count == 0:
+            logger.debug(f"Skipping subject {subject} with no questions")
+            continue
+        shard = f'shard_{shard_id:03d}'
+        shard_vectorizer, shard_X = subject_vectorizer(vectorizer, X[start:start + count])
+        write_artifact(shard_vectorizer, shard_X, {subject: training_data[subject]}, os.path.join(directory, shard), model_version)
+        entries.append({
+            "name": subject,
+            "shard": shard,
+            "questions": count,
+            "sha256": directory_hash(os.path.join(directory, shard)),
+        })
+        start += count
+
+    with open(manifest_path, 'w') as f:
+        json.dump({
+            "format_version": SHARD_FORMAT_VERSION,
+            "model_version": model_version,
+            "content_hash": content_hash(entries),
+            "subjects": entries,
+        }, f, indent=2)
+
+
+class ShardedModel:
+    """A model directory whose per-subject shards are opened the first time each subject is asked for"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get("format_version") != SHARD_FORMAT_VERSION:
+            raise ValueError(f"Unsupported shard format {self.manifest.get('format_version')} in {directory}")
+
+        self.entries = {entry["name"]: entry for entry in self.manifest["subjects"]}
+        self.model_version = self.manifest.get("model_version")
+        self.content_hash = self.manifest.get("content_hash")
+        # A manifest whose entries were edited after writing no longer matches its own hash
+        if self.content_hash != content_hash(self.manifest["subjects"]):
+            raise ValueError(f"Manifest content hash does not match its shard checksums in {directory}")
+        # Subject -> (vectorizer, X, qa_list) of the shards opened so far
+        self._loaded = {}
+        # Subject -> stored search indexes of those shards, None for shards written without them
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, subject):
+        return subject in self.entries
+
+    def subjects(self):
+        return list(self.entries)
+
+    def question_counts(self):
+        """Questions per subject, in the model's row order, without opening any shard"""
+        return {name: entry["questions"] for name, entry in self.entries.items()}
+
+    def loaded_subjects(self):
+        return list(self._loaded)
+
+    def load(self, subject):
+        """Return (vectorizer, X, qa_list) of a subject's shard, opening it on first use
+
+        The shard's files are checked against the manifest checksum before they are read, and a
+        shard that changed since model_shards.py wrote it raises ValueError instead of loading.
+        """
+        shard = self._loaded.get(subject)
+        if shard is not None:
+            return shard
+
+        with self._lock:
+            if subject not in self._loaded:
+                start = time.perf_counter()
+                shard_directory = os.path.join(self.directory, self.entries[subject]["shard"])
+                if directory_hash(shard_directory) != self.entries[subject]["sha256"]:
+                    raise ValueError(f"Shard for {subject} in {self.directory} does not match its manifest checksum; rerun model_shards.py")
+                vectorizer, X, training_data, _ = read_artifact(shard_directory)
+                self._indexes[subject] = read_subject_indexes(shard_directory).get(subject)
+                self._loaded[subject] = (vectorizer, X, training_data[subject])
+                logger.debug(f"Opened shard for {subject} with {X.shape[0]} questions in {(time.perf_counter() - start) * 1000:.1f}ms")
+            return self._loaded[subject]
+
+    def stored_index(self, subject):
+        """The subject's search indexes saved in its shard, in the form SubjectIndex takes, or None if it has none"""
+        self.load(subject)
+        return self._indexes[subject]
+
+
+def load_sharded_model(model_path, directory=None):
+    """Open the sharded form of model_path, or None when it is missing or stale; no shard is read yet"""
+    directory = directory or shard_path(model_path)
+    if not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        return None
+    try:
+        model = ShardedModel(directory)
+    except Exception as e:
+        logger.debug(f"Could not open sharded model {directory}: {str(e)}")
+        return None
+    # With the pickle deleted the shards are the model; otherwise they must come from the current pickle
+    if os.path.exists(model_path) and model.model_version != model_file_version(model_path):
+        logger.debug(f"Sharded model {directory} was built from a different model file; rerun model_shards.py")
+        return None
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a pickled (vectorizer, X, training_data) model into lazily loaded per-subject shards")
+    parser.add_argument("--model", default="model/large_ai_tutor_model.pkl", help="saved (vectorizer, X, training_data) model")
+    parser.add_argument("--output", help="model directory (default: next to the model, .shards)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.model, 'rb') as f:
+        vectorizer, X, training_data = pickle.load(f)
+    output = args.output or shard_path(args.model)
+    write_shards(vectorizer, X, training_data, output, model_file_version(args.model))
+
+    model = ShardedModel(output)
+    print(f"Wrote {len(model.entries)} subject shards in {time.perf_counter() - start:.1f}s to {output} "
+          f"(content hash {model.content_hash[:12]})")
+
+
+if __name__ == "__main__":
+    main()
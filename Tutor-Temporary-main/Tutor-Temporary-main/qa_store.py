@@ -0,0 +1,254 @@
+from bisect import bisect_right
+from collections.abc import Sequence
+import numpy as np
+
+
+class TextColumn(Sequence):
+    """Read-only sequence of strings stored as one UTF-8 blob plus an offsets array, decoded on access"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        # offsets[i]:offsets[i+1] is the byte range of string i
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            # Contiguous slices are views over the same blob
+            return TextColumn(self.blob, self.offsets[start:max(start, stop) + 1])
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("text index out of range")
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    @property
+    def nbytes(self):
+        return self.blob.nbytes + self.offsets.nbytes
+
+    @staticmethod
+    def encode(texts):
+        """Return (blob, offsets) for a list of strings"""
+        encoded = [text.encode('utf-8') for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+class InternedStrings(Sequence):
+    """Interned strings in one or more UTF-8 blobs; appending adds a blob instead of copying the old ones"""
+
+    def __init__(self, segments):
+        self.segments = list(segments)
+        # Id of the first string of each segment
+        self.starts = [0]
+        for segment in self.segments:
+            self.starts.append(self.starts[-1] + len(segment))
+
+    def __len__(self):
+        return self.starts[-1]
+
+    def __getitem__(self, i):
+        segment = bisect_right(self.starts, i) - 1
+        return self.segments[segment][i - self.starts[segment]]
+
+    @property
+    def nbytes(self):
+        return sum(segment.nbytes for segment in self.segments)
+
+
+class StringColumn(Sequence):
+    """Read-only view of interned strings picked out by an id array"""
+
+    def __init__(self, strings, ids):
+        self.strings = strings
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return StringColumn(self.strings, self.ids[i])
+        return self.strings[int(self.ids[i])]
+
+
+class QAPairs(Sequence):
+    """Read-only (question, answer) view of one subject's rows"""
+
+    def __init__(self, questions, answers):
+        self.questions = questions
+        self.answers = answers
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return QAPairs(self.questions[i], self.answers[i])
+        return self.questions[i], self.answers[i]
+
+
+def as_sequence(values):
+    """values itself when it is already a read-only or list sequence, else a list of it"""
+    if isinstance(values, Sequence) and not isinstance(values, str):
+        return values
+    return list(values)
+
+
+def split_pairs(qa_pairs):
+    """(questions, answers) of a sequence of pairs; QAPairs views are split without copying"""
+    if isinstance(qa_pairs, QAPairs):
+        return qa_pairs.questions, qa_pairs.answers
+    return [q for q, _ in qa_pairs], [a for _, a in qa_pairs]
+
+
+def iter_training_pairs(training_data):
+    """Yield (subject, [(q, a), ...]) for training data in any of the stored layouts"""
+    if not isinstance(training_data, dict):
+        return
+
+    for subject, qa_list in training_data.items():
+        # Lists, or read-only sequences such as the text columns of a memory-mapped artifact
+        if isinstance(qa_list, str) or not isinstance(qa_list, Sequence):
+            continue
+
+        # The fallback model stores tuples, the saved models alternate question and answer
+        if qa_list and isinstance(qa_list[0], tuple):
+            yield subject, [(q, a) for q, a in qa_list]
+        else:
+            yield subject, [(qa_list[i], qa_list[i+1]) for i in range(0, len(qa_list) - 1, 2)]
+
+
+def qa_dictionaries(model_data):
+    """subject -> {question: answer} of aimodel data, of training data or of a saved (vectorizer, X, training_data) model
+
+    Returns None for anything else.
+    """
+    if isinstance(model_data, tuple) and len(model_data) == 3:
+        model_data = model_data[2]
+    if not isinstance(model_data, dict):
+        return None
+    if all(isinstance(qa_pairs, dict) for qa_pairs in model_data.values()):
+        return model_data
+    return {subject: dict(pairs) for subject, pairs in iter_training_pairs(model_data)}
+
+
+class QAStore:
+    """Columnar QA pairs: question and answer string ids per row, rows grouped by subject, strings kept once in UTF-8 blobs
+
+    Immutable: adding subjects returns a new store, so readers on other threads never see a partial update.
+    """
+
+    def __init__(self, strings, question_ids, answer_ids, subject_names, subject_offsets):
+        self.strings = strings
+        self.question_ids = question_ids
+        self.answer_ids = answer_ids
+        self.subject_names = list(subject_names)
+        # Rows subject_offsets[i]:subject_offsets[i+1] belong to subject_names[i]
+        self.subject_offsets = subject_offsets
+        self._subject_rows = {name: (int(subject_offsets[i]), int(subject_offsets[i + 1]))
+                              for i, name in enumerate(self.subject_names)}
+
+    @classmethod
+    def empty(cls):
+        return cls.from_pairs({})
+
+    @classmethod
+    def from_pairs(cls, pairs_by_subject):
+        """Build a store from {subject: [(q, a), ...]} or (subject, pairs) items"""
+        items = pairs_by_subject.items() if isinstance(pairs_by_subject, dict) else pairs_by_subject
+
+        # Each distinct string is stored once, however many rows share it
+        interned = {}
+        question_ids, answer_ids = [], []
+        subject_names, subject_offsets = [], [0]
+        for subject, pairs in items:
+            for question, answer in pairs:
+                question_ids.append(interned.setdefault(question, len(interned)))
+                answer_ids.append(interned.setdefault(answer, len(interned)))
+            subject_names.append(subject)
+            subject_offsets.append(len(question_ids))
+
+        strings = InternedStrings([TextColumn(*TextColumn.encode(list(interned)))])
+        return cls(strings, np.array(question_ids, dtype=np.int32), np.array(answer_ids, dtype=np.int32),
+                   subject_names, np.array(subject_offsets, dtype=np.int64))
+
+    @classmethod
+    def from_text_columns(cls, columns):
+        """Build a store over {subject: TextColumn of alternating question and answer} without copying any text"""
+        segments, question_ids, subject_offsets = [], [], [0]
+        string_count = 0
+        for column in columns.values():
+            rows = len(column) // 2
+            question_ids.append(string_count + 2 * np.arange(rows, dtype=np.int32))
+            segments.append(column)
+            string_count += len(column)
+            subject_offsets.append(subject_offsets[-1] + rows)
+
+        question_ids = np.concatenate(question_ids) if question_ids else np.zeros(0, dtype=np.int32)
+        return cls(InternedStrings(segments), question_ids, question_ids + 1,
+                   list(columns), np.array(subject_offsets, dtype=np.int64))
+
+    @classmethod
+    def from_training_data(cls, training_data):
+        """Build a store from training data in any of the stored layouts"""
+        # Memory-mapped artifacts already hold each subject as one text column; keep them on disk
+        if isinstance(training_data, dict) and training_data and all(isinstance(v, TextColumn) for v in training_data.values()):
+            return cls.from_text_columns(training_data)
+        return cls.from_pairs(iter_training_pairs(training_data))
+
+    def extended(self, other):
+        """Return a new store with the subjects of another store appended after this one's"""
+        string_count = len(self.strings)
+        # The existing blobs are shared with the new store, so earlier views stay valid and nothing is copied
+        return QAStore(
+            InternedStrings(self.strings.segments + other.strings.segments),
+            np.concatenate([self.question_ids, other.question_ids + string_count]),
+            np.concatenate([self.answer_ids, other.answer_ids + string_count]),
+            self.subject_names + other.subject_names,
+            np.concatenate([self.subject_offsets, other.subject_offsets[1:] + self.subject_offsets[-1]]),
+        )
+
+    def __len__(self):
+        return len(self.question_ids)
+
+    def __contains__(self, subject):
+        return subject in self._subject_rows
+
+    def subjects(self):
+        return list(self.subject_names)
+
+    def subject_range(self, subject):
+        """(first row, end row) of a subject"""
+        return self._subject_rows[subject]
+
+    def questions(self, subject=None):
+        """Questions of a subject, or of every row, as a read-only sequence"""
+        start, stop = self._subject_rows[subject] if subject is not None else (0, len(self))
+        return StringColumn(self.strings, self.question_ids[start:stop])
+
+    def answers(self, subject=None):
+        """Answers of a subject, or of every row, as a read-only sequence"""
+        start, stop = self._subject_rows[subject] if subject is not None else (0, len(self))
+        return StringColumn(self.strings, self.answer_ids[start:stop])
+
+    def pairs(self, subject):
+        """(question, answer) view of a subject's rows, or None for an unknown subject"""
+        if subject not in self._subject_rows:
+            return None
+        return QAPairs(self.questions(subject), self.answers(subject))
+
+    def row_subjects(self):
+        """Subject name of every row"""
+        counts = np.diff(self.subject_offsets)
+        return [name for name, count in zip(self.subject_names, counts) for _ in range(count)]
+
+    @property
+    def nbytes(self):
+        return self.strings.nbytes + self.question_ids.nbytes + self.answer_ids.nbytes + self.subject_offsets.nbytes
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+# Most recent answers remembered per user and subject
+REPETITION_WINDOW = 20
+
+# Remembered answers across all users and subjects; the least recently active histories go first
+MAX_TRACKED_ENTRIES = 50000
+
+# History key for callers that don't identify the user
+ANONYMOUS_USER = ''
+
+
+class RepetitionTracker:
+    """Thread-safe, bounded memory of the answers each user recently got in each subject"""
+
+    def __init__(self, window=REPETITION_WINDOW, max_entries=MAX_TRACKED_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        # (user, subject) -> OrderedDict(answer key -> answer), both least recently used first
+        self._histories = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats()
+        self.lookups = 0
+        self.repeats = 0
+        self.records = 0
+        self.window_evictions = 0
+        self.capacity_evictions = 0
+
+    def get(self, user, subject, key):
+        """Return the answer recorded under key in the user's recent history for subject, or None"""
+        with self._lock:
+            self.lookups += 1
+            history = self._histories.get((user, subject))
+            if history is None or key not in history:
+                return None
+            self.repeats += 1
+            return history[key]
+
+    def record(self, user, subject, key, answer):
+        """Remember that the user got answer for key, forgetting the oldest answers past the bounds"""
+        if self.window <= 0 or self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self.records += 1
+            history_key = (user, subject)
+            history = self._histories.get(history_key)
+            if history is None:
+                history = self._histories[history_key] = OrderedDict()
+            self._histories.move_to_end(history_key)
+
+            if key not in history:
+                self._size += 1
+            history[key] = answer
+            history.move_to_end(key)
+
+            # Ring-buffer behaviour within one history
+            while len(history) > self.window:
+                history.popitem(last=False)
+                self._size -= 1
+                self.window_evictions += 1
+
+            # Global cap: drop whole histories of the least recently active users
+            while self._size > self.max_entries:
+                _, oldest = self._histories.popitem(last=False)
+                self._size -= len(oldest)
+                self.capacity_evictions += len(oldest)
+
+    def clear(self, user=None):
+        """Forget every history, or only the given user's"""
+        with self._lock:
+            for history_key in list(self._histories):
+                if user is None or history_key[0] == user:
+                    self._size -= len(self._histories.pop(history_key))
+
+    def __len__(self):
+        return self._size
+
+    def stats(self):
+        """Return the tracker's size, bounds and eviction counters"""
+        with self._lock:
+            evictions = self.window_evictions + self.capacity_evictions
+            return {
+                "size": self._size,
+                "histories": len(self._histories),
+                "window": self.window,
+                "max_entries": self.max_entries,
+                "lookups": self.lookups,
+                "repeats": self.repeats,
+                "records": self.records,
+                "window_evictions": self.window_evictions,
+                "capacity_evictions": self.capacity_evictions,
+                "eviction_rate": evictions / self.records if self.records else 0.0,
+            }
@@ -0,0 +1,166 @@
+import argparse
+import json
+import logging
+import os
+import pickle
+import time
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+from inverted_index import model_rows
+from response_cache import model_file_version
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Where the offline build writes the index and where AITutor looks for it
+SEMANTIC_INDEX_DIR = 'model/semantic'
+
+# Number of latent dimensions kept by the LSA projection
+SEMANTIC_COMPONENTS = 128
+
+# Minimum latent-space cosine for a semantic match to be used
+SEMANTIC_THRESHOLD = 0.6
+
+# Weight of the answer text when embedding a question, relative to the question itself
+ANSWER_WEIGHT = 0.5
+
+
+class SemanticIndex:
+    """Dense LSA embeddings of every question, searched with one matrix-vector product"""
+
+    def __init__(self, vectorizer, projection, embeddings, subject_ids=None, subject_names=None):
+        self.vectorizer = vectorizer
+        # Vocabulary x components, so projecting a sparse query only reads its terms' rows
+        self.projection = projection
+        # Questions x components, L2-normalized float32
+        self.embeddings = embeddings
+        self.subject_ids = subject_ids
+        self.subject_names = list(subject_names or [])
+
+    def __len__(self):
+        return self.embeddings.shape[0]
+
+    @classmethod
+    def fit(cls, questions, answers, subjects=None, n_components=SEMANTIC_COMPONENTS, seed=42):
+        """Fit the vectorizer and LSA projection on the questions and their answers"""
+        # Answers supply the co-occurrences that tie "plants make food" to photosynthesis
+        vectorizer = TfidfVectorizer(stop_words='english', sublinear_tf=True)
+        vectorizer.fit(list(questions) + list(answers))
+        pairs = normalize(vectorizer.transform(questions) + ANSWER_WEIGHT * vectorizer.transform(answers))
+
+        n_components = max(1, min(n_components, pairs.shape[0] - 1, pairs.shape[1] - 1))
+        svd = TruncatedSVD(n_components=n_components, random_state=seed)
+        embeddings = normalize(svd.fit_transform(pairs)).astype(np.float32)
+        projection = np.ascontiguousarray(svd.components_.T, dtype=np.float32)
+
+        subject_ids, subject_names = None, None
+        if subjects is not None:
+            subject_names = sorted(set(subjects))
+            lookup = {name: i for i, name in enumerate(subject_names)}
+            subject_ids = np.array([lookup[s] for s in subjects], dtype=np.int32)
+
+        return cls(vectorizer, projection, embeddings, subject_ids, subject_names)
+
+    def save(self, directory=SEMANTIC_INDEX_DIR, model_version=None):
+        """Write the index as plain .npy arrays plus a pickled vectorizer and a JSON manifest"""
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'embeddings.npy'), self.embeddings)
+        np.save(os.path.join(directory, 'projection.npy'), self.projection)
+        if self.subject_ids is not None:
+            np.save(os.path.join(directory, 'subjects.npy'), self.subject_ids)
+        with open(os.path.join(directory, 'vectorizer.pkl'), 'wb') as f:
+            pickle.dump(self.vectorizer, f)
+        with open(os.path.join(directory, 'index.json'), 'w') as f:
+            json.dump({
+                "model_version": model_version,
+                "questions": len(self),
+                "components": self.projection.shape[1],
+                "subjects": self.subject_names,
+            }, f, indent=2)
+
+    @classmethod
+    def load(cls, directory=SEMANTIC_INDEX_DIR, mmap=True):
+        """Load a saved index; arrays are memory-mapped so every worker shares one copy in the page cache"""
+        with open(os.path.join(directory, 'index.json')) as f:
+            manifest = json.load(f)
+        with open(os.path.join(directory, 'vectorizer.pkl'), 'rb') as f:
+            vectorizer = pickle.load(f)
+
+        mmap_mode = 'r' if mmap else None
+        embeddings = np.load(os.path.join(directory, 'embeddings.npy'), mmap_mode=mmap_mode)
+        projection = np.load(os.path.join(directory, 'projection.npy'), mmap_mode=mmap_mode)
+        subjects_path = os.path.join(directory, 'subjects.npy')
+        subject_ids = np.load(subjects_path, mmap_mode=mmap_mode) if os.path.exists(subjects_path) else None
+
+        index = cls(vectorizer, projection, embeddings, subject_ids, manifest.get("subjects"))
+        index.model_version = manifest.get("model_version")
+        return index
+
+    def embed(self, texts):
+        """Project texts into the latent space, one L2-normalized row each"""
+        query_matrix = self.vectorizer.transform(texts)
+        return normalize(np.asarray(query_matrix @ self.projection))
+
+    def search(self, text, k=5, subject=None):
+        """Return up to k (question id, score) pairs, best first, ties broken by lowest id"""
+        scores = self.embeddings @ self.embed([text])[0]
+
+        # Restrict to one subject when the index spans several
+        if subject is not None and self.subject_ids is not None:
+            if subject not in self.subject_names:
+                return []
+            docs = np.flatnonzero(self.subject_ids == self.subject_names.index(subject))
+            scores = scores[docs]
+        else:
+            docs = np.arange(len(scores))
+
+        if not len(docs) or k <= 0:
+            return []
+
+        # Bounded selection: keep everything tied with the k-th best score, then order exactly
+        if len(docs) > k:
+            kth_score = np.partition(scores, len(scores) - k)[len(scores) - k]
+            keep = scores >= kth_score
+            docs, scores = docs[keep], scores[keep]
+
+        order = np.lexsort((docs, -scores))[:k]
+        return [(int(docs[i]), float(scores[i])) for i in order]
+
+
+def load_semantic_index(model_path, directory=SEMANTIC_INDEX_DIR):
+    """Load the semantic index built from model_path, or None when it is missing or stale"""
+    if not model_path or not os.path.exists(os.path.join(directory, 'index.json')):
+        return None
+    try:
+        index = SemanticIndex.load(directory)
+    except Exception as e:
+        logger.debug(f"Could not load semantic index from {directory}: {str(e)}")
+        return None
+    if index.model_version != model_file_version(model_path):
+        logger.debug(f"Semantic index in {directory} was built from a different model file; rebuild it with semantic_index.py")
+        return None
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the LSA semantic index for a saved AI Tutor model")
+    parser.add_argument("--model", default="model/large_ai_tutor_model.pkl", help="saved (vectorizer, X, training_data) model")
+    parser.add_argument("--output", default=SEMANTIC_INDEX_DIR, help="directory to write the index to")
+    parser.add_argument("--components", type=int, default=SEMANTIC_COMPONENTS, help="latent dimensions")
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        _, _, training_data = pickle.load(f)
+    questions, answers, subjects = model_rows(training_data)
+
+    start = time.perf_counter()
+    index = SemanticIndex.fit(questions, answers, subjects, n_components=args.components)
+    index.save(args.output, model_file_version(args.model))
+    print(f"Embedded {len(index)} questions in {index.projection.shape[1]} dimensions in "
+          f"{time.perf_counter() - start:.1f}s, saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import logging
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+from inverted_index import InvertedIndex
+from cluster_index import ClusterIndex
+from bm25 import BM25Index
+from fuzzy_index import CharNgramIndex, FUZZY_MEMORY_RATIO
+from qa_store import as_sequence, iter_training_pairs, split_pairs
+import text_normalizer
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Subjects with at least this many questions use the approximate cluster index (None keeps search exact).
+# Left unset: a short query touches few postings, so exact search is already cheap. On 50k synthetic
+# questions nprobe=8 took 1.5 ms/query against 1.1 ms exact, at 0.92 recall@1, and scoring the probes
+# with a sparse query instead of a dense one was slower still. Rerun benchmark_search.py clusters
+# before setting it for a much larger corpus
+APPROXIMATE_MIN_QUESTIONS = None
+
+# Clusters probed per query by the approximate index: higher means better recall but slower queries
+APPROXIMATE_NPROBE = 8
+
+# How the exact postings rank questions: 'tfidf' (cosine) or 'bm25'. The approximate index always uses cosine.
+RANKING = 'tfidf'
+
+RANKERS = {
+    'tfidf': InvertedIndex,
+    'bm25': BM25Index,
+}
+
+# Build a character n-gram index per subject as a second stage for misspelled questions
+FUZZY_SEARCH = True
+
+
+def fit_subject_matrix(questions):
+    """Fit the TF-IDF a SubjectIndex scores with; returns (vectorizer, L2-normalized rows)"""
+    # Rows are L2-normalized so a dot product is the cosine
+    if text_normalizer.STEMMING:
+        vectorizer = TfidfVectorizer(analyzer=text_normalizer.stemmed_terms)
+    else:
+        vectorizer = TfidfVectorizer(stop_words='english')
+    return vectorizer, normalize(vectorizer.fit_transform(questions), norm='l2').tocsr()
+
+
+class SubjectIndex:
+    """TF-IDF index over the questions of a single subject, fitted once
+
+    stored is the {'words': (vectorizer, rows, postings), 'fuzzy': (vectorizer, postings)} saved by
+    model_artifact.py; it is used in place of fitting, and with cosine ranking its postings are
+    searched as they are, without a copy.
+    """
+
+    def __init__(self, questions, answers, approximate=False, nprobe=None, ranking=None, fuzzy=None, stored=None):
+        # Columns of a QAStore are kept as views rather than copied into lists
+        self.questions = as_sequence(questions)
+        self.answers = as_sequence(answers)
+
+        stored = stored or {}
+        if 'words' in stored:
+            self.vectorizer, self.matrix, stored_postings = stored['words']
+        else:
+            self.vectorizer, self.matrix = fit_subject_matrix(self.questions)
+            stored_postings = None
+
+        # Postings over the same matrix so queries only touch questions that share a term
+        self.ranking = ranking or RANKING
+        if self.ranking not in RANKERS:
+            raise ValueError(f"Unknown ranking '{self.ranking}', expected one of {sorted(RANKERS)}")
+        if self.ranking == 'tfidf' and stored_postings is not None:
+            self.postings = InvertedIndex(self.vectorizer, self.matrix, self.questions, self.answers, postings=stored_postings)
+        else:
+            self.postings = RANKERS[self.ranking](self.vectorizer, self.matrix, self.questions, self.answers)
+
+        # Very large subjects can trade a little recall for probing only the nearest clusters
+        self.clusters = ClusterIndex(self.vectorizer, self.matrix, nprobe=nprobe or APPROXIMATE_NPROBE) if approximate else None
+
+        # Typo-tolerant second stage, pruned to a fixed multiple of the word-level matrix size
+        if fuzzy is None:
+            fuzzy = FUZZY_SEARCH
+        self.fuzzy = None
+        if fuzzy:
+            self.fuzzy = CharNgramIndex(self.questions, self.answers, max_nnz=int(FUZZY_MEMORY_RATIO * self.matrix.nnz), stored=stored.get('fuzzy'))
+
+    def __len__(self):
+        return len(self.questions)
+
+    def scores(self, text):
+        """Return the cosine similarity of the text against every question"""
+        # transform() already L2-normalizes the query row
+        query_vector = self.vectorizer.transform([text])
+        return (self.matrix @ query_vector.T).toarray().ravel()
+
+    def top_k(self, text, k=5):
+        """Return up to k (index, score) pairs for questions sharing a term with the text"""
+        if self.clusters is not None:
+            return self.clusters.search(text, k)
+        return self.postings.search(text, k)
+
+    def best_match(self, text):
+        """Return (index, score) of the most similar question"""
+        return self.best_matches([text])[0]
+
+    def best_matches(self, texts):
+        """Return (index, score) of the most similar question for each text in one batch"""
+        engine = self.clusters if self.clusters is not None else self.postings
+        # Nothing sharing a term with a query is the same as argmax over all-zero scores
+        return [matches[0] if matches else (0, 0.0) for matches in engine.search_many(texts, 1)]
+
+    def fuzzy_matches(self, texts):
+        """Return (index, score) of the closest question by character n-grams, or (0, 0.0) without a fuzzy index"""
+        if self.fuzzy is None:
+            return [(0, 0.0)] * len(texts)
+        return self.fuzzy.best_matches(texts)
+
+
+def qa_pairs_by_subject(training_data):
+    """Turn training data in any of the stored layouts into {subject: [(q, a), ...]}"""
+    return dict(iter_training_pairs(training_data))
+
+
+def build_subject_indexes(training_data_dict, approximate_min_questions=None, ranking=None, stored=None):
+    """Build one SubjectIndex per subject from {subject: [(q, a), ...]} or {subject: QAStore pairs}
+
+    stored maps subjects to the indexes saved for them by model_artifact.py; those subjects are
+    not fitted again.
+    """
+    # Saved indexes hold unstemmed words, so they are only used while stemming is off
+    stored = stored if stored and not text_normalizer.STEMMING else {}
+    if approximate_min_questions is None:
+        approximate_min_questions = APPROXIMATE_MIN_QUESTIONS
+
+    # Checked up front: SubjectIndex's ValueError would otherwise be mistaken for an empty vocabulary
+    ranking = ranking or RANKING
+    if ranking not in RANKERS:
+        raise ValueError(f"Unknown ranking '{ranking}', expected one of {sorted(RANKERS)}")
+
+    indexes = {}
+    for subject, qa_pairs in training_data_dict.items():
+        if not qa_pairs:
+            continue
+        approximate = approximate_min_questions is not None and len(qa_pairs) >= approximate_min_questions
+        try:
+            questions, answers = split_pairs(qa_pairs)
+            subject_stored = stored.get(subject)
+            if subject_stored is not None and subject_stored['words'][1].shape[0] != len(questions):
+                logger.debug(f"Ignoring stored index for {subject} with {subject_stored['words'][1].shape[0]} rows for {len(questions)} questions")
+                subject_stored = None
+            indexes[subject] = SubjectIndex(questions, answers, approximate=approximate, ranking=ranking, stored=subject_stored)
+            logger.debug(f"Built {indexes[subject].ranking} index for {subject} with {len(qa_pairs)} questions")
+        except ValueError as e:
+            # Raised when every question is made of stop words (empty vocabulary)
+            logger.debug(f"Could not build TF-IDF index for {subject}: {str(e)}")
+    return indexes
@@ -0,0 +1,72 @@
+import logging
+from collections import defaultdict
+import numpy as np
+
+# Share the debug logger configured by app.py
+logger = logging.getLogger('debug')
+
+# Length of the character n-grams the postings are keyed on
+GRAM_SIZE = 3
+
+# Posting lists longer than this multiple of the current candidates are not worth intersecting
+INTERSECT_RATIO = 16
+
+
+def char_grams(text, size=GRAM_SIZE):
+    """Distinct character n-grams of text"""
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+class SubstringIndex:
+    """Character trigram postings for `pattern in text` lookups over a fixed list of texts"""
+
+    def __init__(self, texts):
+        self.texts = list(texts)
+
+        # Trigram -> sorted array of the ids of the texts containing it
+        postings = defaultdict(list)
+        for text_id, text in enumerate(self.texts):
+            for gram in char_grams(text):
+                postings[gram].append(text_id)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        logger.debug(f"Built substring index with {len(self.postings)} trigrams over {len(self.texts)} texts")
+
+    def __len__(self):
+        return len(self.texts)
+
+    def candidates(self, pattern):
+        """Ids, ascending, of texts that may contain pattern (a superset of the true matches)"""
+        if len(pattern) < GRAM_SIZE:
+            # Too short to have a trigram: every text is a candidate
+            return np.arange(len(self.texts), dtype=np.int32)
+
+        grams = char_grams(pattern)
+        if any(gram not in self.postings for gram in grams):
+            return np.empty(0, dtype=np.int32)
+
+        # Intersect the rarest lists first so the running set shrinks fastest. A list much longer
+        # than the running set barely filters it, so stop there and let verification finish the job.
+        lists = sorted((self.postings[gram] for gram in grams), key=len)
+        ids = lists[0]
+
+        # Even the rarest trigram is common: an in-order scan of its list will hit early anyway
+        if len(ids) * INTERSECT_RATIO > len(self.texts):
+            return ids
+
+        for other in lists[1:]:
+            if len(other) > INTERSECT_RATIO * len(ids):
+                break
+            ids = np.intersect1d(ids, other, assume_unique=True)
+            if not len(ids):
+                break
+        return ids
+
+    def first_containing(self, pattern):
+        """Return the lowest id whose text contains pattern, or None - the same answer as a linear scan"""
+        ids = self.candidates(pattern)
+
+        # Trigrams can co-occur without being adjacent, so each candidate is checked for real
+        for text_id in ids:
+            if pattern in self.texts[text_id]:
+                return int(text_id)
+        return None
@@ -0,0 +1,22 @@
+import pickle
+import sys
+from sklearn.feature_extraction.text import TfidfVectorizer
+import answer_graph
+from qa_store import qa_dictionaries
+
+
+def test_graph_built_from_a_saved_model_tuple(tmp_path, monkeypatch):
+    training_data = {"Science": ["What is DNA?", "DNA carries the genetic information of cells",
+                                 "What is RNA?", "RNA carries the genetic information of cells too"]}
+    vectorizer = TfidfVectorizer()
+    X = vectorizer.fit_transform(training_data["Science"][::2])
+    path = str(tmp_path / "ai_tutor_model.pkl")
+    with open(path, 'wb') as f:
+        pickle.dump((vectorizer, X, training_data), f)
+
+    monkeypatch.setattr(sys, "argv", ["answer_graph.py", "--model", path])
+    answer_graph.main()
+
+    graph = answer_graph.load_answer_graph(path, qa_dictionaries((vectorizer, X, training_data)))
+    assert graph is not None
+    assert graph.alternatives("Science", 0) == [1]
@@ -0,0 +1,22 @@
+from cascade import RetrievalCascade, Stage
+
+
+def test_slow_estimate_does_not_skip_a_stage_before_any_answer():
+    tfidf = Stage("tfidf", lambda query: "answer", cost_ms=1.0, confidence=1.0)
+    # A slow run in another session pushed the shared estimate past the whole budget
+    tfidf.expected_ms = 500.0
+    cascade = RetrievalCascade([Stage("exact", lambda query: None, 0.1, 1.0), tfidf], budget_ms=250)
+
+    best, trace, over_budget = cascade.run({})
+    assert best.answer == "answer" and not over_budget
+    assert [outcome for _, _, outcome in trace] == ["miss", "answer"]
+
+
+def test_budget_still_ends_the_search_for_a_better_answer():
+    semantic = Stage("semantic", lambda query: "better", cost_ms=3.0, confidence=1.0)
+    semantic.expected_ms = 500.0
+    cascade = RetrievalCascade([Stage("fuzzy", lambda query: "rough", 2.0, 0.4), semantic], budget_ms=250)
+
+    best, trace, over_budget = cascade.run({})
+    assert best.answer == "rough" and over_budget
+    assert trace[-1] == ("semantic", 0.0, "over budget")
@@ -0,0 +1,20 @@
+from entity_index import BIOGRAPHICAL, EntityIndex
+
+DATA = {
+    "History": {
+        "Who was Abraham Lincoln?": "Abraham Lincoln was the 16th President of the United States.",
+        "Who was Winston Churchill?": "Winston Churchill was a British Prime Minister.",
+    },
+}
+
+
+def test_person_found_by_full_name_or_one_name_word():
+    index = EntityIndex(DATA)
+    assert index.lookup("abraham lincoln", BIOGRAPHICAL, "History") == 0
+    assert index.lookup("lincoln", BIOGRAPHICAL, "History") == 0
+
+
+def test_name_word_must_cover_the_asked_entity():
+    index = EntityIndex(DATA)
+    assert index.lookup("the president after lincoln", BIOGRAPHICAL, "History") is None
+    assert index.lookup("churchill and lincoln", BIOGRAPHICAL, "History") is None
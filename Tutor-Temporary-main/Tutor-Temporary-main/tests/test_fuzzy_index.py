@@ -0,0 +1,16 @@
+from subject_index import SubjectIndex
+
+QUESTIONS = ["What is the Pythagorean theorem?", "How do you solve a quadratic equation?", "What are matrices?",
+             "What is calculus?", "What is algebra?", "What are equations?", "What is trigonometry?", "What is geometry?"]
+ANSWERS = [f"Answer {i}" for i in range(len(QUESTIONS))]
+
+
+def test_misspelled_question_still_matches():
+    index = SubjectIndex(QUESTIONS, ANSWERS)
+    [(question_id, score)] = index.fuzzy_matches(["what is a matrx"])
+    assert QUESTIONS[question_id] == "What are matrices?" and score > 0
+
+
+def test_unrelated_words_are_not_a_fuzzy_match():
+    index = SubjectIndex(QUESTIONS, ANSWERS)
+    assert index.fuzzy_matches(["industrial matter crusades renaissance ecology"]) == [(0, 0.0)]
@@ -0,0 +1,23 @@
+import os
+import pickle
+from sklearn.feature_extraction.text import TfidfVectorizer
+from incremental_model import IncrementalTfidf, update_model
+from inverted_index import model_rows
+
+
+def test_trailing_unpaired_question_gets_no_row(tmp_path):
+    training_data = {"Mathematics": ["What is algebra?", "Symbols for numbers.", "What is geometry?"]}
+    vectorizer = TfidfVectorizer()
+    X = vectorizer.fit_transform(["What is algebra?"])
+    path = str(tmp_path / "model.pkl")
+    with open(path, 'wb') as f:
+        pickle.dump((vectorizer, X, training_data), f)
+
+    counts = IncrementalTfidf.fit(training_data)
+    questions, _, _ = model_rows(training_data)
+    assert counts.matrix().shape[0] == len(questions) == 1
+
+    _, X, training_data = update_model(path, {"Science": ["What is DNA?", "Genetic material.", "What is RNA?"]})
+    assert X.shape[0] == len(model_rows(training_data)[0]) == 2
+    # The model was replaced in one rename, leaving no temporary file behind
+    assert sorted(os.listdir(tmp_path)) == ["model.counts.npz", "model.pkl"]
@@ -0,0 +1,39 @@
+from sklearn.feature_extraction.text import TfidfVectorizer
+from model_shards import ShardedModel, write_shards
+from subject_index import SubjectIndex
+
+
+def test_empty_subject_is_skipped(tmp_path):
+    training_data = {
+        "Mathematics": ["What is algebra?", "Algebra uses symbols for numbers.", "What is geometry?", "Geometry studies shapes."],
+        "Programming": [],
+    }
+    vectorizer = TfidfVectorizer()
+    X = vectorizer.fit_transform(training_data["Mathematics"][::2])
+
+    write_shards(vectorizer, X, training_data, str(tmp_path))
+    model = ShardedModel(str(tmp_path))
+
+    assert model.subjects() == ["Mathematics"]
+    assert "Programming" not in model
+    _, shard_X, qa_list = model.load("Mathematics")
+    assert shard_X.shape[0] == 2
+    assert list(qa_list) == training_data["Mathematics"]
+
+
+def test_shard_serves_its_stored_subject_index(tmp_path):
+    training_data = {
+        "Mathematics": ["What is algebra?", "Algebra uses symbols for numbers.", "What is geometry?", "Geometry studies shapes."],
+    }
+    vectorizer = TfidfVectorizer()
+    X = vectorizer.fit_transform(training_data["Mathematics"][::2])
+
+    write_shards(vectorizer, X, training_data, str(tmp_path))
+    model = ShardedModel(str(tmp_path))
+    stored = model.stored_index("Mathematics")
+
+    questions, answers = training_data["Mathematics"][::2], training_data["Mathematics"][1::2]
+    fitted = SubjectIndex(questions, answers, ranking='tfidf')
+    mapped = SubjectIndex(questions, answers, ranking='tfidf', stored=stored)
+    assert mapped.best_match("tell me about geometry") == fitted.best_match("tell me about geometry")
+    assert mapped.fuzzy_matches(["algebr"]) == fitted.fuzzy_matches(["algebr"])
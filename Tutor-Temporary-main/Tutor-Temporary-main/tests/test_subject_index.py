@@ -0,0 +1,13 @@
+import text_normalizer
+from subject_index import SubjectIndex
+
+QUESTIONS = ["What is Newton's law of motion?", "What is the periodic table?"]
+ANSWERS = ["Force equals mass times acceleration.", "A table of the chemical elements."]
+
+
+def test_stemming_matches_other_word_forms(monkeypatch):
+    assert SubjectIndex(QUESTIONS, ANSWERS).best_match("newtons laws") == (0, 0.0)
+
+    monkeypatch.setattr(text_normalizer, "STEMMING", True)
+    index_position, score = SubjectIndex(QUESTIONS, ANSWERS).best_match("newtons laws")
+    assert index_position == 0 and score > 0
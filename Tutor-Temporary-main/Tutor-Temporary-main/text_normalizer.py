@@ -0,0 +1,90 @@
+import re
+from functools import lru_cache
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+# Precompiled once for every engine
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+WHITESPACE_RE = re.compile(r'\s+')
+WORD_RE = re.compile(r'\w+')
+
+# Question words dropped before keyword search in aimodel.AITutor._generate_response
+QUESTION_WORDS = frozenset(['what', 'is', 'are', 'how', 'why', 'when', 'where', 'who', 'which', 'the', 'a', 'an', 'in', 'on', 'at', 'to', 'for', 'with'])
+
+# Full English stop word list used for indexing
+STOP_WORDS = frozenset(ENGLISH_STOP_WORDS)
+
+# Suffixes stripped by the light stemmer, longest first
+STEM_SUFFIXES = ('ational', 'ization', 'fulness', 'ousness', 'iveness', 'ations', 'ation', 'ments',
+                 'ment', 'ness', 'ings', 'ing', 'ies', 'ied', 'ers', 'est', 'ed', 'es', 'er', 'ly', 's')
+
+# Stem the words the per-subject TF-IDF indexes and their queries use. Off by default: the light
+# stemmer is inconsistent ('tables' -> 'tabl' but 'table' stays), and stemmed indexes can't be
+# stored in the model artifact, so every subject is fitted at load time while it is on
+STEMMING = False
+
+# Size of the per-query memo tables
+QUERY_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def normalize_question(text):
+    """Lowercase and trim, the form the app.py matching stages compare"""
+    return text.strip().lower()
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def clean_text(text):
+    """Lowercase and drop punctuation, the form aimodel.py stores its questions in"""
+    return PUNCTUATION_RE.sub('', text.lower()).strip()
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def canonical_text(text):
+    """Punctuation- and whitespace-insensitive form for exact lookups"""
+    return WHITESPACE_RE.sub(' ', PUNCTUATION_RE.sub(' ', text.lower())).strip()
+
+
+def stem(word):
+    """Strip one common English suffix, keeping at least three characters of the word"""
+    for suffix in STEM_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def tokenize(text, remove_stop_words=False, stemming=False):
+    """Split text into lowercase word tokens, optionally without stop words and stemmed"""
+    tokens = WORD_RE.findall(text.lower())
+    if remove_stop_words:
+        tokens = [t for t in tokens if t not in STOP_WORDS]
+    if stemming:
+        tokens = [stem(t) for t in tokens]
+    return tuple(tokens)
+
+
+def stemmed_terms(text):
+    """Vectorizer analyzer for STEMMING: stop words dropped, every other word stemmed
+
+    A vectorizer fitted with it runs the same analyzer on queries, so stored questions and
+    queries are always stemmed alike.
+    """
+    return tokenize(text, remove_stop_words=True, stemming=True)
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def content_words(text, stop_words=QUESTION_WORDS):
+    """Whitespace-split words of already cleaned text, minus the given stop words"""
+    return tuple(w for w in text.split() if w not in stop_words)
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def word_set(text):
+    """Set of whitespace-separated words, as the overlap scores in aimodel.py use"""
+    return frozenset(text.split())
+
+
+def normalize_corpus(texts, normalizer=normalize_question):
+    """Normalize a whole column of stored text once at load time, bypassing the query memo"""
+    function = getattr(normalizer, '__wrapped__', normalizer)
+    return [function(text) for text in texts]
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+class TokenSetIndex:
+    """Whitespace token sets of a list of texts as sorted integer id arrays, with postings per token"""
+
+    def __init__(self, texts):
+        self.vocabulary = {}
+        self.token_ids = []
+        for text in texts:
+            ids = {self.vocabulary.setdefault(token, len(self.vocabulary)) for token in text.split()}
+            self.token_ids.append(np.array(sorted(ids), dtype=np.int32))
+        self.sizes = np.array([len(ids) for ids in self.token_ids], dtype=np.int64)
+
+        # Token id -> ascending ids of the texts containing it
+        postings = [[] for _ in range(len(self.vocabulary))]
+        for text_id, ids in enumerate(self.token_ids):
+            for token_id in ids:
+                postings[token_id].append(text_id)
+        self.postings = [np.array(text_ids, dtype=np.int32) for text_ids in postings]
+
+    def __len__(self):
+        return len(self.token_ids)
+
+    def common_counts(self, tokens):
+        """Return (text ids, number of the given distinct tokens each contains) for texts sharing any"""
+        known = [self.vocabulary[token] for token in set(tokens) if token in self.vocabulary]
+        if not known:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate([self.postings[token_id] for token_id in known]), return_counts=True)
+
+    def best_jaccard(self, tokens, min_common=2, min_score=0.5):
+        """Return (text id, score) of the first text with the highest token Jaccard above min_score, or None
+
+        Texts sharing fewer than min_common tokens are never scored, so rare-word queries only
+        touch a few short postings lists.
+        """
+        query_size = len(set(tokens))
+        text_ids, common = self.common_counts(tokens)
+        keep = common >= min_common
+        text_ids, common = text_ids[keep], common[keep]
+        if not len(text_ids):
+            return None
+
+        scores = common / (self.sizes[text_ids] + query_size - common)
+        best = scores.max()
+        if not best > min_score:
+            return None
+        # text_ids ascend, so the first maximum is the earliest text, as in a linear scan
+        return int(text_ids[np.argmax(scores)]), float(best)